@@ -1,16 +1,118 @@
 from pydantic_settings import BaseSettings
 from pydantic import ConfigDict
-from typing import List
+from typing import Dict, List
 
 class Settings(BaseSettings):
     model_config = ConfigDict(env_file=".env", extra="ignore")
     
     MAX_FILE_SIZE_MB: int = 10
+    MAX_BATCH_SIZE_MB: int = 20
     MAX_FILES_PER_BATCH: int = 300
     ALLOWED_EXTENSIONS: str = "jpg,jpeg,png,pdf"
     TEMP_STORAGE_PATH: str = "./storage"
     OUTPUT_CSV_PATH: str = "./output"
-    
+
+    # Storage lifecycle - TTL and LRU eviction under a disk quota
+    STORAGE_QUOTA_MB: int = 5120
+    BATCH_TTL_HOURS: int = 24
+    ARTIFACT_TTL_MINUTES: int = 60
+    UPLOAD_TTL_HOURS: int = 6  # Idle resumable sessions and unfinished upload files
+    LIFECYCLE_SWEEP_SECONDS: int = 300
+
+    # Upload probe - images outside these bounds are rejected before any API call
+    MAX_IMAGE_MEGAPIXELS: int = 50
+    MIN_IMAGE_DIMENSION: int = 200
+
+    # Resumable (chunked) uploads
+    RESUMABLE_MAX_BATCH_SIZE_MB: int = 1024
+    RESUMABLE_MAX_CHUNK_MB: int = 8
+
+    # Archive (ZIP/tar) uploads - zip-bomb limits. MAX_ENTRIES counts every entry, directories and
+    # skipped files included; MAX_RATIO is bytes extracted so far over the archive's size, for either format
+    ARCHIVE_EXTENSIONS: str = "zip,tar,tgz,tar.gz"
+    ARCHIVE_MAX_TOTAL_MB: int = 1024
+    ARCHIVE_MAX_RATIO: int = 100
+    ARCHIVE_MAX_ENTRIES: int = 1000
+
+    # Pipeline engine - workers per stage and bounded queue size between stages
+    PIPELINE_QUEUE_SIZE: int = 50
+    PIPELINE_INGEST_WORKERS: int = 2
+    PIPELINE_PREPROCESS_WORKERS: int = 2
+    # Validate/extract workers only bound the adaptive concurrency limit below, so keep them at its max
+    PIPELINE_VALIDATE_WORKERS: int = 20
+    PIPELINE_EXTRACT_WORKERS: int = 20
+    PIPELINE_POSTPROCESS_WORKERS: int = 2
+    PIPELINE_PERSIST_WORKERS: int = 2
+    # Extra workers per stage that only take interactive (single scan) work
+    PIPELINE_RESERVED_INTERACTIVE_WORKERS: int = 1
+
+    # "embedded" runs the pipeline in the API process; "enqueue" only records jobs in the job store
+    # for `python -m app.worker` processes to claim (needs a shared STATE_BACKEND). The job store and
+    # the uploads it points at sit in TEMP_STORAGE_PATH, so workers run on the API's host
+    PIPELINE_MODE: str = "embedded"
+    WORKER_POLL_SECONDS: float = 0.5
+    # A worker that hasn't heartbeat its files for this long is presumed dead and its files are reclaimed
+    WORKER_LEASE_SECONDS: int = 30
+
+    # Adaptive concurrency for Gemini calls - AIMD between the min and max limits: +1 after a
+    # healthy window of calls, x DECREASE_FACTOR on a 429 or timeout
+    CONCURRENCY_INITIAL_LIMIT: int = 5
+    CONCURRENCY_MIN_LIMIT: int = 1
+    CONCURRENCY_MAX_LIMIT: int = 20
+    CONCURRENCY_DECREASE_FACTOR: float = 0.5
+    # A window is unhealthy if its median latency exceeds this multiple of the best seen, or too many calls fail
+    CONCURRENCY_LATENCY_TOLERANCE: float = 2.0
+    CONCURRENCY_MAX_ERROR_RATE: float = 0.1
+
+    # Admission control - work is turned away (429 + Retry-After) while the backlog would take
+    # longer than MAX_WAIT_SECONDS to drain at the measured service rate, or exceeds MAX_BACKLOG_FILES.
+    # Interactive uploads are checked against the interactive backlog only
+    ADMISSION_MAX_WAIT_SECONDS: int = 1800
+    ADMISSION_MAX_BACKLOG_FILES: int = 3000
+    ADMISSION_RATE_WINDOW_SECONDS: int = 300
+
+    # Fair-share scheduling - "team=weight,..." for teams in the events table (others get 1.0)
+    TEAM_WEIGHTS: str = ""
+
+    # Shared API state (batches, statuses, queues, WebSocket fan-out) so several uvicorn workers agree:
+    # "memory" for a single worker, "sqlite" for workers on one host, "redis" for REDIS_URL
+    # (any Redis-protocol server; fakeredis:// runs an in-process stand-in). Pipeline jobs are not
+    # part of it - the job store is per host (see PIPELINE_MODE)
+    STATE_BACKEND: str = "memory"
+    STATE_SQLITE_PATH: str = ""
+    REDIS_URL: str = "redis://localhost:6379/0"
+    STATE_POLL_SECONDS: float = 0.2
+
+    # Image transforms (decode, OCR enhancement) run in a process pool, started on first use. Each process
+    # has its own: 0 splits the host's cores between the WEB_CONCURRENCY API workers. Set it explicitly
+    # when workers are started another way, or when app.worker processes share the host
+    IMAGE_POOL_WORKERS: int = 0
+
+    # OCR enhancement runs only the steps a photo needs, judged from a thumbnail: brighten below the mean
+    # luminance, stretch contrast below the 1st-99th percentile spread, sharpen below the Laplacian
+    # variance. Off, every photo gets the full chain
+    OCR_ADAPTIVE_ENHANCEMENT: bool = True
+    OCR_DARK_LUMINANCE: float = 115
+    OCR_LOW_CONTRAST_SPREAD: int = 150
+    OCR_SHARP_LAPLACIAN_VARIANCE: float = 300
+
+    # Upload quality gate - photos that look too blurry, dark, washed out or glared to read are flagged
+    # over WebSocket as they arrive so they can be reshot. QUALITY_GATE_ACTION "defer" processes them
+    # after everything else, "skip" marks them invalid without spending any API calls
+    QUALITY_GATE_ENABLED: bool = True
+    QUALITY_GATE_ACTION: str = "defer"
+    QUALITY_MIN_SHARPNESS: float = 15
+    QUALITY_MIN_HIGHLIGHTS: int = 60
+    QUALITY_MAX_DARKEST: int = 200
+    QUALITY_MAX_GLARE: float = 0.15
+
+    # PDF rendering - card text is the same size on a card-sized page as on an A4 sheet of ten cards,
+    # so every page renders at the DPI one card needs: a card page comes out around 0.3MP, an A4 sheet
+    # around 3.9MP. The page budget only reins in pages larger than A2, never below MIN_DPI
+    PDF_CARD_DPI: int = 200
+    PDF_MAX_PAGE_PIXELS: int = 16_000_000
+    PDF_MIN_DPI: int = 100
+
     # Gemini AI settings
     GEMINI_API_KEY: str = ""
     GEMINI_MODEL: str = "gemini-2.0-flash-exp"
@@ -44,5 +146,17 @@ class Settings(BaseSettings):
     @property
     def allowed_extensions_list(self) -> List[str]:
         return self.ALLOWED_EXTENSIONS.split(",")
+    
+    @property
+    def archive_extensions_list(self) -> List[str]:
+        return self.ARCHIVE_EXTENSIONS.split(",")
+    
+    @property
+    def team_weights_map(self) -> Dict[str, float]:
+        weights = {}
+        for entry in filter(None, self.TEAM_WEIGHTS.split(",")):
+            team, _, weight = entry.partition("=")
+            weights[team.strip()] = float(weight)
+        return weights
 
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,165 @@
+import asyncio
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+
+# Call outcomes - throttling and timeouts mean we are past what the quota allows
+OK = "ok"
+THROTTLED = "throttled"
+TIMEOUT = "timeout"
+ERROR = "error"
+# A call abandoned because its file was cancelled - says nothing about the quota
+CANCELLED = "cancelled"
+
+# Failure reported during the current task's slot (set by the services, read when the slot is released)
+slot_outcome: ContextVar[Optional[str]] = ContextVar("slot_outcome", default=None)
+
+def classify_error(error: Exception) -> str:
+    """Map an API exception to the outcome the limiter reacts to"""
+    message = str(error).lower()
+    if "429" in message or "quota" in message or "resource exhausted" in message or "rate limit" in message:
+        return THROTTLED
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)) or "timeout" in message or "deadline" in message:
+        return TIMEOUT
+    return ERROR
+
+class AdaptiveLimiter:
+    """Concurrency limit for Gemini calls, tuned by AIMD (additive increase, multiplicative decrease).
+
+    Every `window` finished calls the limiter reviews them: if few failed, the median latency
+    stayed within latency_tolerance x the best latency seen, and the limit was actually reached,
+    it grows by one. A 429 or timeout cuts it by decrease_factor straight away, at most once per
+    typical call duration so one burst of rejections counts as a single signal.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, decrease_factor: float,
+                 latency_tolerance: float, max_error_rate: float, window: int = 10):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.max_error_rate = max_error_rate
+        self.window = window
+
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+        self.latency_ewma: Optional[float] = None
+        self.best_latency: Optional[float] = None
+        self._window_latencies: List[float] = []
+        self._window_errors = 0
+        self._window_saturated = False
+        self._last_decrease = 0.0
+
+        self.calls = {OK: 0, THROTTLED: 0, TIMEOUT: 0, ERROR: 0}
+        self.decisions: Deque[Dict] = deque(maxlen=50)
+
+    def locked(self) -> bool:
+        return self.in_flight >= int(self.limit)
+
+    async def acquire(self) -> None:
+        if not self._waiters and not self.locked():
+            self._grant()
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as we were cancelled - pass the slot on
+                self.release()
+            elif future in self._waiters:
+                self._waiters.remove(future)
+            raise
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def record_success(self, latency: float) -> None:
+        self.calls[OK] += 1
+        self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+        # The best latency drifts up slowly so one unusually fast call doesn't set the bar forever
+        self.best_latency = latency if self.best_latency is None else min(latency, self.best_latency * 1.02)
+        self._window_latencies.append(latency)
+        self._review_window()
+
+    def record_failure(self, outcome: str) -> None:
+        self.calls[outcome] = self.calls.get(outcome, 0) + 1
+        if outcome in (THROTTLED, TIMEOUT):
+            self._decrease(outcome)
+        else:
+            self._window_errors += 1
+            self._review_window()
+
+    def snapshot(self) -> Dict:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "min_limit": self.minimum,
+            "max_limit": self.maximum,
+            "latency_ewma_seconds": round(self.latency_ewma, 2) if self.latency_ewma is not None else None,
+            "best_latency_seconds": round(self.best_latency, 2) if self.best_latency is not None else None,
+            "calls": dict(self.calls),
+            "decisions": list(self.decisions)
+        }
+
+    def _grant(self) -> None:
+        self.in_flight += 1
+        if self.locked():
+            self._window_saturated = True
+
+    def _wake(self) -> None:
+        while self._waiters and not self.locked():
+            future = self._waiters.popleft()
+            if not future.done():
+                self._grant()
+                future.set_result(None)
+
+    def _review_window(self) -> None:
+        samples = len(self._window_latencies) + self._window_errors
+        if samples < self.window:
+            return
+
+        error_rate = self._window_errors / samples
+        latencies = sorted(self._window_latencies)
+        median = latencies[len(latencies) // 2] if latencies else None
+
+        if error_rate > self.max_error_rate:
+            self._decide("hold", f"error rate {error_rate:.0%}")
+        elif median is not None and median > self.best_latency * self.latency_tolerance:
+            self._decide("hold", f"median latency {median:.2f}s vs best {self.best_latency:.2f}s")
+        # An unsaturated window says nothing about whether a higher limit would be healthy
+        elif self._window_saturated and self.limit < self.maximum:
+            self.limit = min(self.limit + 1, self.maximum)
+            self._decide("increase", f"healthy window, median latency {median:.2f}s")
+            self._wake()
+        self._reset_window()
+
+    def _decrease(self, outcome: str) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < max(self.latency_ewma or 1.0, 1.0):
+            return
+        self._last_decrease = now
+        self.limit = max(self.limit * self.decrease_factor, float(self.minimum))
+        self._decide("decrease", outcome)
+        self._reset_window()
+
+    def _decide(self, action: str, reason: str) -> None:
+        self.decisions.append({
+            "at": datetime.now().isoformat(),
+            "action": action,
+            "limit": int(self.limit),
+            "reason": reason
+        })
+
+    def _reset_window(self) -> None:
+        self._window_latencies = []
+        self._window_errors = 0
+        self._window_saturated = self.locked()
@@ -0,0 +1,102 @@
+import math
+from datetime import datetime, timedelta
+from typing import Dict
+from fastapi import HTTPException
+from app.config import settings
+from app.core.fair_scheduler import INTERACTIVE
+from app.core.job_store import job_store
+from app.core.resource_manager import resource_manager
+
+# Each file holds a Gemini slot twice - once to validate, once to extract
+SLOT_HOLDS_PER_FILE = 2
+
+# Finished files needed in the window before the measured rate is trusted over the model
+MIN_RATE_SAMPLES = 10
+
+class AdmissionController:
+    """Decides whether new work is accepted, from queue depth and the measured service rate.
+
+    The backlog and the service rate (files finished per second over the last
+    ADMISSION_RATE_WINDOW_SECONDS) come from the job store, so they cover every API worker and
+    pipeline worker. The measured rate only shows what the system can do while it has a backlog;
+    otherwise (or before enough files have finished) the rate is modeled from the current
+    concurrency limit and the average time a file holds a slot.
+
+    Bulk work is accepted while the backlog, including it, drains within ADMISSION_MAX_WAIT_SECONDS
+    and stays under ADMISSION_MAX_BACKLOG_FILES. Interactive scans are served ahead of bulk work,
+    so they are held to the same limits against the interactive backlog alone: a booth scan still
+    goes in behind a deep bulk backlog, but a flood of interactive work is turned away too.
+    """
+
+    def capacity(self) -> Dict:
+        """Current throughput, backlog and how long the backlog takes to drain"""
+        from app.services.pipeline_engine import FINISHED_STATES
+
+        window = settings.ADMISSION_RATE_WINDOW_SECONDS
+        now = datetime.now()
+        finished, first_at = job_store.finished_since(now - timedelta(seconds=window))
+        # Over the span files were actually finishing, so a burst after an idle spell isn't diluted
+        measured_rate = finished / max((now - first_at).total_seconds(), 1.0) if first_at else 0.0
+        modeled_rate = int(resource_manager.file_limiter.limit) / (SLOT_HOLDS_PER_FILE * max(resource_manager.avg_slot_seconds, 0.1))
+        backlog = job_store.count_unfinished(FINISHED_STATES)
+        service_rate = measured_rate if backlog and finished >= MIN_RATE_SAMPLES else modeled_rate
+
+        return {
+            "backlog_files": backlog,
+            "service_rate_files_per_second": round(service_rate, 3),
+            "measured_rate_files_per_second": round(measured_rate, 3),
+            "modeled_rate_files_per_second": round(modeled_rate, 3),
+            "finished_last_window": finished,
+            "window_seconds": window,
+            "drain_seconds": round(backlog / service_rate, 1),
+            "admission_limit_files": self._admission_limit(service_rate),
+            "max_wait_seconds": settings.ADMISSION_MAX_WAIT_SECONDS,
+            "max_backlog_files": settings.ADMISSION_MAX_BACKLOG_FILES
+        }
+
+    def check(self, incoming: int, priority: str) -> Dict:
+        """Admission decision for incoming new files, with the predicted time until they are done"""
+        from app.services.pipeline_engine import FINISHED_STATES
+
+        capacity = self.capacity()
+        backlog, rate = capacity["backlog_files"], capacity["service_rate_files_per_second"]
+        limit = capacity["admission_limit_files"]
+        if priority == INTERACTIVE:
+            # Bulk files don't hold interactive ones up, so only interactive work ahead counts
+            backlog = job_store.count_unfinished(FINISHED_STATES, INTERACTIVE)
+
+        # An empty pipeline takes any batch, or one bigger than the limit could never get in
+        admitted = incoming == 0 or backlog == 0 or backlog + incoming <= limit
+        predicted = (backlog + incoming) / rate
+        decision = {
+            "admitted": admitted,
+            "backlog_files": backlog,
+            "service_rate_files_per_second": rate,
+            "predicted_completion_seconds": round(predicted, 1),
+            "predicted_completion_at": (datetime.now() + timedelta(seconds=predicted)).isoformat(),
+            "retry_after_seconds": None
+        }
+        if not admitted:
+            # Once enough of the backlog has drained to make room (or it has drained completely)
+            wait = min(backlog + incoming - limit, backlog) / rate
+            decision["retry_after_seconds"] = max(math.ceil(wait), 1)
+        return decision
+
+    def admit(self, incoming: int, priority: str) -> Dict:
+        """Like check, but raises 429 with Retry-After when the work is turned away"""
+        decision = self.check(incoming, priority)
+        if not decision["admitted"]:
+            retry_after = decision["retry_after_seconds"]
+            raise HTTPException(
+                status_code=429,
+                detail=f"Server is at capacity with {decision['backlog_files']} files queued. Retry in about {retry_after}s.",
+                headers={"Retry-After": str(retry_after)}
+            )
+        return decision
+
+    @staticmethod
+    def _admission_limit(service_rate: float) -> int:
+        return min(settings.ADMISSION_MAX_BACKLOG_FILES, int(settings.ADMISSION_MAX_WAIT_SECONDS * service_rate))
+
+# Global instance
+admission_controller = AdmissionController()
@@ -0,0 +1,138 @@
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+from datetime import datetime
+from app.config import settings
+
+# Extension kept on blob filenames so downstream code can still tell PDFs from images
+BLOB_EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "application/pdf": "pdf",
+}
+
+class BlobStore:
+    """Content-addressed file storage: one copy per SHA-256, shared across batches by reference"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.blob_root = os.path.join(root, "blobs")
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        """Open the index lazily so importing the module doesn't touch disk"""
+        if self._conn is None:
+            os.makedirs(self.root, exist_ok=True)
+            self._conn = sqlite3.connect(os.path.join(self.root, "blob_index.db"), check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS blobs (
+                    sha256 TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS blob_refs (
+                    sha256 TEXT NOT NULL,
+                    batch_id TEXT NOT NULL,
+                    PRIMARY KEY (sha256, batch_id)
+                );
+                CREATE TABLE IF NOT EXISTS file_blobs (
+                    file_id TEXT PRIMARY KEY,
+                    batch_id TEXT NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    filename TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_file_blobs_batch ON file_blobs(batch_id);
+            """)
+        return self._conn
+
+    def blob_path(self, sha256: str, file_type: str) -> str:
+        """Two levels of fan-out keep any one directory small"""
+        ext = BLOB_EXTENSIONS.get(file_type, "bin")
+        return os.path.join(self.blob_root, sha256[:2], sha256[2:4], f"{sha256}.{ext}")
+
+    def put(self, source_path: str, sha256: str, file_type: str, batch_id: str, file_id: str, filename: str) -> str:
+        """Move a freshly written file into the store (or drop it if already stored) and return the blob path"""
+        path = self.blob_path(sha256, file_type)
+
+        with self._lock:
+            db = self._db()
+            existing = db.execute("SELECT path FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+
+            if existing and os.path.exists(existing["path"]):
+                # Identical content already stored - keep one copy
+                os.remove(source_path)
+                path = existing["path"]
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(source_path, path)
+                db.execute(
+                    "INSERT OR REPLACE INTO blobs (sha256, path, size, created_at) VALUES (?, ?, ?, ?)",
+                    (sha256, path, os.path.getsize(path), datetime.now().isoformat())
+                )
+
+            db.execute("INSERT OR IGNORE INTO blob_refs (sha256, batch_id) VALUES (?, ?)", (sha256, batch_id))
+            db.execute(
+                "INSERT OR REPLACE INTO file_blobs (file_id, batch_id, sha256, filename) VALUES (?, ?, ?, ?)",
+                (file_id, batch_id, sha256, filename)
+            )
+            db.commit()
+
+        return path
+
+    def list_files(self) -> List[Dict]:
+        """Every stored file_id with its batch, original filename and blob"""
+        with self._lock:
+            rows = self._db().execute(
+                """SELECT f.file_id, f.batch_id, f.filename, f.sha256, b.path, b.size, b.created_at
+                   FROM file_blobs f JOIN blobs b ON b.sha256 = f.sha256 ORDER BY f.rowid"""
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def get_ref_count(self, sha256: str) -> int:
+        """Number of batches holding a reference to a blob"""
+        with self._lock:
+            row = self._db().execute("SELECT COUNT(*) AS refs FROM blob_refs WHERE sha256 = ?", (sha256,)).fetchone()
+        return row["refs"]
+
+    def release_batch(self, batch_id: str) -> int:
+        """Drop a batch's references and delete blobs nobody else holds; returns the stored bytes freed"""
+        freed = 0
+        with self._lock:
+            db = self._db()
+            hashes = [r["sha256"] for r in db.execute("SELECT sha256 FROM blob_refs WHERE batch_id = ?", (batch_id,))]
+            db.execute("DELETE FROM blob_refs WHERE batch_id = ?", (batch_id,))
+            db.execute("DELETE FROM file_blobs WHERE batch_id = ?", (batch_id,))
+
+            for sha256 in hashes:
+                still_used = db.execute("SELECT 1 FROM blob_refs WHERE sha256 = ? LIMIT 1", (sha256,)).fetchone()
+                if still_used:
+                    continue
+                row = db.execute("SELECT path, size FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+                db.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+                if row:
+                    freed += row["size"]
+                    if os.path.exists(row["path"]):
+                        os.remove(row["path"])
+
+            db.commit()
+        return freed
+
+    def get_stats(self) -> Dict:
+        """Blob count, stored bytes and how many file_ids share them"""
+        with self._lock:
+            db = self._db()
+            blobs = db.execute("SELECT COUNT(*) AS n, COALESCE(SUM(size), 0) AS bytes FROM blobs").fetchone()
+            files = db.execute("SELECT COUNT(*) AS n FROM file_blobs").fetchone()
+        return {
+            "blobs": blobs["n"],
+            "stored_bytes": blobs["bytes"],
+            "files": files["n"],
+            "deduplicated_files": files["n"] - blobs["n"]
+        }
+
+# Global instance
+blob_store = BlobStore(settings.TEMP_STORAGE_PATH)
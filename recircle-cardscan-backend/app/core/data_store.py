@@ -1,28 +1,22 @@
 from typing import Dict, List
-import threading
+from app.core.state_backend import state_backend
 
 class DataStore:
-    """In-memory storage for extracted data"""
+    """Extracted data per batch, kept in the shared state backend so every API worker sees it"""
     
-    def __init__(self):
-        self._data: Dict[str, List[Dict]] = {}
-        self._lock = threading.Lock()
+    NAMESPACE = "extracted_data"
     
     def store_batch_data(self, batch_id: str, records: List[Dict]):
         """Store extracted records for a batch"""
-        with self._lock:
-            self._data[batch_id] = records
+        state_backend.set(self.NAMESPACE, batch_id, records)
     
     def get_batch_data(self, batch_id: str) -> List[Dict]:
         """Get extracted records for a batch"""
-        with self._lock:
-            return self._data.get(batch_id, [])
+        return state_backend.get(self.NAMESPACE, batch_id, [])
     
     def clear_batch_data(self, batch_id: str):
         """Clear data for a batch"""
-        with self._lock:
-            if batch_id in self._data:
-                del self._data[batch_id]
+        state_backend.delete(self.NAMESPACE, batch_id)
 
 # Global instance
 data_store = DataStore()
\ No newline at end of file
@@ -0,0 +1,185 @@
+import asyncio
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+# Priority classes, highest first. Interactive work (a person waiting at the booth) always
+# goes ahead of bulk batches at the next file boundary.
+INTERACTIVE = "interactive"
+BULK = "bulk"
+PRIORITIES = [INTERACTIVE, BULK]
+
+class DeficitRoundRobin:
+    """Per-batch lanes served by weighted deficit round robin.
+
+    Each time a lane reaches the head of the rotation it earns its weight in credit and is
+    served one item per credit, so a 300-file batch and a 5-file batch with equal weights
+    alternate instead of being served in arrival order.
+    """
+
+    def __init__(self, weight_fn: Callable[[str], float]):
+        self._weight_fn = weight_fn
+        self._lanes: Dict[str, Deque[Any]] = {}
+        self._deficit: Dict[str, float] = {}
+        self._rotation: Deque[str] = deque()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def push(self, batch_id: str, item: Any) -> None:
+        if batch_id not in self._lanes:
+            self._lanes[batch_id] = deque()
+            self._deficit[batch_id] = 0.0
+            self._rotation.append(batch_id)
+        self._lanes[batch_id].append(item)
+        self._size += 1
+
+    def pop(self) -> Any:
+        while True:
+            batch_id = self._rotation[0]
+            if self._deficit[batch_id] < 1:
+                self._deficit[batch_id] += self._weight_fn(batch_id)
+                if self._deficit[batch_id] < 1:
+                    # Fractional weights build up credit over several rounds
+                    self._rotation.rotate(-1)
+                    continue
+
+            item = self._lanes[batch_id].popleft()
+            self._size -= 1
+            self._deficit[batch_id] -= 1
+
+            if not self._lanes[batch_id]:
+                self._drop_lane(batch_id)
+            elif self._deficit[batch_id] < 1:
+                self._rotation.rotate(-1)
+            return item
+
+    def remove(self, batch_id: str, item: Any) -> bool:
+        """Take a specific item out of its lane; False if it isn't queued here"""
+        lane = self._lanes.get(batch_id)
+        if lane is None or item not in lane:
+            return False
+        lane.remove(item)
+        self._size -= 1
+        if not lane:
+            self._drop_lane(batch_id)
+        return True
+
+    def snapshot(self) -> List[Dict]:
+        return [
+            {
+                "batch_id": batch_id,
+                "queue_position": position,
+                "waiting": len(self._lanes[batch_id]),
+                "weight": self._weight_fn(batch_id)
+            }
+            for position, batch_id in enumerate(self._rotation)
+        ]
+
+    def _drop_lane(self, batch_id: str) -> None:
+        # An emptied lane leaves the rotation and forfeits unused credit
+        del self._lanes[batch_id]
+        del self._deficit[batch_id]
+        self._rotation.remove(batch_id)
+
+class FairShareQueue:
+    """Bounded queue with strict priority between classes and fair share between batches within a class.
+
+    Only bulk items count against maxsize, so an interactive item is never held up
+    behind a full bulk backlog. Getters created with interactive_only=True model
+    capacity reserved for interactive work.
+    """
+
+    def __init__(self, maxsize: int = 0, weight_fn: Optional[Callable[[str], float]] = None):
+        self.maxsize = maxsize
+        weight_fn = weight_fn or (lambda batch_id: 1.0)
+        self._classes = {priority: DeficitRoundRobin(weight_fn) for priority in PRIORITIES}
+        self._getters: Deque[asyncio.Future] = deque()
+        self._interactive_getters: Deque[asyncio.Future] = deque()
+        self._putters: Deque[asyncio.Future] = deque()
+
+    def qsize(self) -> int:
+        return sum(len(lanes) for lanes in self._classes.values())
+
+    def full(self) -> bool:
+        return self.maxsize > 0 and len(self._classes[BULK]) >= self.maxsize
+
+    async def put(self, batch_id: str, item: Any, priority: str = BULK) -> None:
+        """Add an item to the batch's lane, waiting while the bulk queue is full"""
+        while priority == BULK and self.full():
+            await self._wait(self._putters)
+        self.put_nowait(batch_id, item, priority)
+
+    def put_nowait(self, batch_id: str, item: Any, priority: str = BULK) -> None:
+        self._classes[priority].push(batch_id, item)
+        if priority == INTERACTIVE and self._wake(self._interactive_getters):
+            return
+        self._wake(self._getters)
+
+    async def get(self, interactive_only: bool = False) -> Any:
+        """Remove and return the next item - interactive first, then bulk in fair-share order"""
+        waiters = self._interactive_getters if interactive_only else self._getters
+        while not self._available(interactive_only):
+            await self._wait(waiters)
+        return self.get_nowait(interactive_only)
+
+    def get_nowait(self, interactive_only: bool = False) -> Any:
+        if not self._available(interactive_only):
+            raise asyncio.QueueEmpty
+
+        if len(self._classes[INTERACTIVE]):
+            return self._classes[INTERACTIVE].pop()
+
+        item = self._classes[BULK].pop()
+        self._wake(self._putters)
+        return item
+
+    def promote(self, batch_id: str, item: Any) -> bool:
+        """Move a queued bulk item to the interactive class; False if it isn't waiting here"""
+        if not self._classes[BULK].remove(batch_id, item):
+            return False
+        self._wake(self._putters)
+        self.put_nowait(batch_id, item, INTERACTIVE)
+        return True
+
+    def remove(self, batch_id: str, item: Any) -> bool:
+        """Take a queued item out (e.g. a cancelled file); False if it isn't waiting here"""
+        if self._classes[INTERACTIVE].remove(batch_id, item):
+            return True
+        if not self._classes[BULK].remove(batch_id, item):
+            return False
+        self._wake(self._putters)
+        return True
+
+    def snapshot(self, priority: str = BULK) -> List[Dict]:
+        """Waiting batches of one class in service order with their backlog and weight"""
+        return self._classes[priority].snapshot()
+
+    def _available(self, interactive_only: bool) -> bool:
+        if interactive_only:
+            return len(self._classes[INTERACTIVE]) > 0
+        return self.qsize() > 0
+
+    async def _wait(self, waiters: Deque[asyncio.Future]) -> None:
+        future = asyncio.get_running_loop().create_future()
+        waiters.append(future)
+        try:
+            await future
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # Woken but cancelled before running - pass the wakeup on
+                self._wake(waiters)
+            else:
+                future.cancel()
+                if future in waiters:
+                    waiters.remove(future)
+            raise
+
+    @staticmethod
+    def _wake(waiters: Deque[asyncio.Future]) -> bool:
+        while waiters:
+            future = waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return True
+        return False
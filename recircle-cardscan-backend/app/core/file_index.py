@@ -0,0 +1,193 @@
+import os
+import re
+import json
+import mimetypes
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+from datetime import datetime
+from app.config import settings
+
+# Uploads saved before the blob store sat directly in the storage root as {file_id}_{filename}
+LEGACY_FILENAME = re.compile(r"^(f_[0-9a-f]{8})_(.+)$")
+
+# Pre-blob-store uploads were stored without a batch; each is indexed as its own batch under this
+# prefix, so LRU eviction ages them out one at a time by their own mtime rather than all at once
+LEGACY_BATCH_PREFIX = "legacy_"
+
+# PRAGMA user_version once files stored before the index existed have been indexed; version 1
+# indexed them all under one "legacy" batch, version 2 gives each its own
+BACKFILLED_VERSION = 2
+SHARED_LEGACY_BATCH_VERSION = 1
+
+def is_legacy_batch(batch_id: str) -> bool:
+    return batch_id.startswith(LEGACY_BATCH_PREFIX)
+
+class FileIndex:
+    """Persistent file_id -> path/metadata lookup, written once at upload time"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.root, exist_ok=True)
+            self._conn = sqlite3.connect(os.path.join(self.root, "file_index.db"), check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS files (
+                    file_id TEXT PRIMARY KEY,
+                    batch_id TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    file_type TEXT,
+                    size INTEGER,
+                    sha256 TEXT,
+                    file_path TEXT NOT NULL,
+                    probe TEXT,
+                    created_at TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_files_batch ON files(batch_id);
+                CREATE TABLE IF NOT EXISTS batch_access (
+                    batch_id TEXT PRIMARY KEY,
+                    last_access REAL NOT NULL
+                );
+            """)
+        return self._conn
+
+    def add(self, batch_id: str, file_info: Dict) -> None:
+        """Record a stored file"""
+        with self._lock:
+            db = self._db()
+            db.execute(
+                """INSERT OR REPLACE INTO files
+                   (file_id, batch_id, filename, file_type, size, sha256, file_path, probe, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    file_info["file_id"],
+                    batch_id,
+                    file_info["filename"],
+                    file_info.get("file_type"),
+                    file_info.get("size"),
+                    file_info.get("sha256"),
+                    file_info["file_path"],
+                    json.dumps(file_info.get("probe")),
+                    datetime.now().isoformat()
+                )
+            )
+            db.commit()
+
+    def backfill(self) -> int:
+        """Index files stored before the index existed, once per storage root; returns how many were added.
+
+        Blob store entries keep their batch and filename. Older uploads in the storage root each
+        become a batch of their own, dated by their mtime, with their type taken from the extension,
+        so they can be previewed and age out with the storage lifecycle like any other batch.
+        """
+        from app.core.blob_store import blob_store, BLOB_EXTENSIONS
+
+        with self._lock:
+            db = self._db()
+            version = db.execute("PRAGMA user_version").fetchone()[0]
+            if version == SHARED_LEGACY_BATCH_VERSION:
+                # Indexed before legacy files got a batch each - split the shared one up
+                db.execute("UPDATE files SET batch_id = ? || file_id WHERE batch_id = 'legacy'", (LEGACY_BATCH_PREFIX,))
+                db.execute(f"PRAGMA user_version = {BACKFILLED_VERSION}")
+                db.commit()
+            if version >= SHARED_LEGACY_BATCH_VERSION:
+                # Already backfilled
+                return 0
+
+        blob_types = {ext: file_type for file_type, ext in BLOB_EXTENSIONS.items()}
+        rows = [
+            (f["file_id"], f["batch_id"], f["filename"], blob_types.get(f["path"].rsplit(".", 1)[-1]),
+             f["size"], f["sha256"], f["path"], None, f["created_at"])
+            for f in blob_store.list_files()
+        ]
+
+        # Shortest name first, so a PDF wins over the page renders saved next to it under the same id
+        seen = {row[0] for row in rows}
+        legacy = sorted((e for e in os.scandir(self.root) if e.is_file()), key=lambda e: len(e.name))
+        for entry in legacy:
+            match = LEGACY_FILENAME.match(entry.name)
+            if not match or match.group(1) in seen:
+                continue
+            seen.add(match.group(1))
+            stat = entry.stat()
+            rows.append((
+                match.group(1), LEGACY_BATCH_PREFIX + match.group(1), match.group(2), mimetypes.guess_type(entry.name)[0],
+                stat.st_size, None, entry.path, None, datetime.fromtimestamp(stat.st_mtime).isoformat()
+            ))
+
+        with self._lock:
+            db = self._db()
+            before = db.total_changes
+            # Files the index already has were recorded at upload time - keep those rows
+            db.executemany(
+                """INSERT OR IGNORE INTO files
+                   (file_id, batch_id, filename, file_type, size, sha256, file_path, probe, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                rows
+            )
+            added = db.total_changes - before
+            db.execute(f"PRAGMA user_version = {BACKFILLED_VERSION}")
+            db.commit()
+        return added
+
+    def get(self, file_id: str) -> Optional[Dict]:
+        """Look up one file by id (primary-key lookup, independent of storage size)"""
+        with self._lock:
+            row = self._db().execute("SELECT * FROM files WHERE file_id = ?", (file_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def get_batch_files(self, batch_id: str) -> List[Dict]:
+        """All files uploaded in a batch, in upload order"""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT * FROM files WHERE batch_id = ? ORDER BY rowid", (batch_id,)
+            ).fetchall()
+        return [self._row_to_dict(r) for r in rows]
+
+    def list_batches(self) -> List[Dict]:
+        """Every indexed batch with its upload time, logical size and last access (None if never touched)"""
+        with self._lock:
+            rows = self._db().execute(
+                """SELECT f.batch_id, MIN(f.created_at) AS created_at, COUNT(*) AS files,
+                          COALESCE(SUM(f.size), 0) AS size, a.last_access
+                   FROM files f LEFT JOIN batch_access a ON a.batch_id = f.batch_id
+                   GROUP BY f.batch_id ORDER BY created_at"""
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def legacy_bytes(self) -> int:
+        """Size of the uploads from before the blob store, which sit outside it"""
+        with self._lock:
+            row = self._db().execute(
+                "SELECT COALESCE(SUM(size), 0) FROM files WHERE substr(batch_id, 1, ?) = ?",
+                (len(LEGACY_BATCH_PREFIX), LEGACY_BATCH_PREFIX)
+            ).fetchone()
+        return row[0]
+
+    def touch_batch(self, batch_id: str, at: float) -> None:
+        """Record when a batch was last used, for LRU eviction across restarts and API workers"""
+        with self._lock:
+            db = self._db()
+            db.execute("INSERT OR REPLACE INTO batch_access (batch_id, last_access) VALUES (?, ?)", (batch_id, at))
+            db.commit()
+
+    def remove_batch(self, batch_id: str) -> None:
+        with self._lock:
+            db = self._db()
+            db.execute("DELETE FROM files WHERE batch_id = ?", (batch_id,))
+            db.execute("DELETE FROM batch_access WHERE batch_id = ?", (batch_id,))
+            db.commit()
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict:
+        entry = dict(row)
+        entry["probe"] = json.loads(entry["probe"]) if entry["probe"] else None
+        return entry
+
+# Global instance
+file_index = FileIndex(settings.TEMP_STORAGE_PATH)
@@ -0,0 +1,59 @@
+import asyncio
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Optional
+from PIL import Image
+from app.config import settings
+
+def _run_transform(transform: Callable[[Image.Image], Image.Image], image_path: str) -> bytes:
+    """Worker side: open the file, apply the transform and return the result encoded as lossless WebP"""
+    result = transform(Image.open(image_path))
+    if result.mode != 'RGB':
+        result = result.convert('RGB')
+
+    # The encoding google-generativeai applies to an in-memory image, done here instead of on the event loop
+    encoded = io.BytesIO()
+    result.save(encoded, format="webp", lossless=True)
+    return encoded.getvalue()
+
+class ImagePool:
+    """Process pool for CPU-bound image transforms, so decoding and enhancing a 12MP photo
+    doesn't block the event loop for hundreds of milliseconds.
+
+    Workers open the file themselves and send back only the compressed image, so no pixels
+    are pickled in either direction.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawned workers don't inherit the server's threads, sockets or event loop
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def blob(self, transform: Callable[[Image.Image], Image.Image], image_path: str) -> Dict:
+        """Apply a transform from app.utils.image_ops to a file and encode the result as a Gemini
+        content part (lossless WebP)"""
+        data = await asyncio.get_running_loop().run_in_executor(self._pool(), _run_transform, transform, image_path)
+        return {"mime_type": "image/webp", "data": data}
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+def _default_workers() -> int:
+    """IMAGE_POOL_WORKERS, or the host's cores shared out between the WEB_CONCURRENCY API processes
+    (the worker count uvicorn and gunicorn read), so N workers don't each start a pool per core"""
+    if settings.IMAGE_POOL_WORKERS:
+        return settings.IMAGE_POOL_WORKERS
+    processes = max(int(os.environ.get("WEB_CONCURRENCY") or 1), 1)
+    return max((os.cpu_count() or 1) // processes, 1)
+
+# Global instance
+image_pool = ImagePool(_default_workers())
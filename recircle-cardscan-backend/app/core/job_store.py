@@ -0,0 +1,272 @@
+import os
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from datetime import datetime
+from app.config import settings
+
+class JobStore:
+    """Durable record of every file in the pipeline and the last stage it completed.
+
+    SQLite in WAL mode, so each stage transition is a cheap append that survives a crash.
+    On startup the pipeline reloads unfinished files and resumes them after their last
+    completed stage instead of paying for validation/extraction again.
+
+    It is also the queue pipeline workers pull from: each unfinished file is owned by the
+    process running it, which heartbeats its files; files with no owner, or whose owner
+    stopped heartbeating, can be claimed by any worker.
+
+    jobs.db lives in TEMP_STORAGE_PATH beside the blob store whose files the workers read, so it
+    coordinates the API and pipeline workers of one host only. STATE_BACKEND=redis shares API
+    state across hosts, but each host runs its own pipeline over its own uploads.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.root, exist_ok=True)
+            self._conn = sqlite3.connect(os.path.join(self.root, "jobs.db"), check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS file_jobs (
+                    file_id TEXT PRIMARY KEY,
+                    batch_id TEXT NOT NULL,
+                    priority TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    last_stage TEXT,
+                    file_info TEXT NOT NULL,
+                    state TEXT,
+                    owner TEXT,
+                    heartbeat_at REAL,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_file_jobs_batch ON file_jobs(batch_id);
+                CREATE TABLE IF NOT EXISTS stage_transitions (
+                    file_id TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    at TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_transitions_file ON stage_transitions(file_id);
+                CREATE INDEX IF NOT EXISTS idx_transitions_at ON stage_transitions(at);
+            """)
+            # Job stores created before workers existed have no ownership columns
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(file_jobs)")}
+            if "owner" not in columns:
+                self._conn.execute("ALTER TABLE file_jobs ADD COLUMN owner TEXT")
+                self._conn.execute("ALTER TABLE file_jobs ADD COLUMN heartbeat_at REAL")
+                self._conn.commit()
+        return self._conn
+
+    def add_file(self, batch_id: str, file_info: Dict, priority: str, owner: Optional[str] = None) -> bool:
+        """Record a file entering the pipeline, owned by owner or left for a worker to claim;
+        False if it is already recorded (e.g. by another API worker)"""
+        now = datetime.now().isoformat()
+        with self._lock:
+            db = self._db()
+            cursor = db.execute(
+                """INSERT OR IGNORE INTO file_jobs
+                   (file_id, batch_id, priority, status, last_stage, file_info, state, owner, heartbeat_at, created_at, updated_at)
+                   VALUES (?, ?, ?, 'queued', NULL, ?, NULL, ?, ?, ?, ?)""",
+                (file_info["file_id"], batch_id, priority, json.dumps(file_info), owner, time.time() if owner else None, now, now)
+            )
+            if cursor.rowcount == 0:
+                db.commit()
+                return False
+            db.execute(
+                "INSERT INTO stage_transitions (file_id, stage, status, at) VALUES (?, 'submitted', 'queued', ?)",
+                (file_info["file_id"], now)
+            )
+            db.commit()
+        return True
+
+    def record_stage(self, file_id: str, stage: Optional[str], status: str, state: Dict) -> None:
+        """Record that a file finished a stage (or reached a terminal status) along with its results so far"""
+        now = datetime.now().isoformat()
+        with self._lock:
+            db = self._db()
+            # A cancelled file stays cancelled even if its owner finishes a stage before it hears of it
+            cursor = db.execute(
+                """UPDATE file_jobs SET status = ?, last_stage = COALESCE(?, last_stage), state = ?, updated_at = ?
+                   WHERE file_id = ? AND status != 'cancelled'""",
+                (status, stage, json.dumps(state), now, file_id)
+            )
+            if cursor.rowcount == 0:
+                db.commit()
+                return
+            db.execute(
+                "INSERT INTO stage_transitions (file_id, stage, status, at) VALUES (?, ?, ?, ?)",
+                (file_id, stage or "finished", status, now)
+            )
+            db.commit()
+
+    def load_batches(self) -> Dict[str, List[Dict]]:
+        """Every stored file grouped by batch, in submission order"""
+        with self._lock:
+            rows = self._db().execute("SELECT * FROM file_jobs ORDER BY rowid").fetchall()
+
+        batches: Dict[str, List[Dict]] = {}
+        for row in rows:
+            entry = self._entry(row)
+            batches.setdefault(entry["batch_id"], []).append(entry)
+        return batches
+
+    def claim(self, owner: str, limit: int, stale_after: float, finished_states: Iterable[str]) -> List[Dict]:
+        """Take up to limit unfinished files that have no live owner, interactive ones first"""
+        finished_states = list(finished_states)
+        placeholders = ", ".join("?" for _ in finished_states)
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            rows = db.execute(
+                f"""SELECT * FROM file_jobs
+                    WHERE status NOT IN ({placeholders}) AND (owner IS NULL OR heartbeat_at < ?)
+                    ORDER BY priority = 'interactive' DESC, rowid
+                    LIMIT ?""",
+                (*finished_states, now - stale_after, limit)
+            ).fetchall()
+            claimed = []
+            for row in rows:
+                # Only take the row if nobody claimed it since we looked (other workers share the file)
+                cursor = db.execute(
+                    "UPDATE file_jobs SET owner = ?, heartbeat_at = ? WHERE file_id = ? AND owner IS ? AND heartbeat_at IS ?",
+                    (owner, now, row["file_id"], row["owner"], row["heartbeat_at"])
+                )
+                if cursor.rowcount:
+                    claimed.append(self._entry(row))
+            db.commit()
+        return claimed
+
+    def heartbeat(self, owner: str) -> None:
+        """Keep the owner's files from being claimed by another worker"""
+        with self._lock:
+            db = self._db()
+            db.execute("UPDATE file_jobs SET heartbeat_at = ? WHERE owner = ?", (time.time(), owner))
+            db.commit()
+
+    def release(self, owner: str, finished_states: Iterable[str]) -> None:
+        """Hand the owner's unfinished files back to the queue (on a clean shutdown)"""
+        finished_states = list(finished_states)
+        placeholders = ", ".join("?" for _ in finished_states)
+        with self._lock:
+            db = self._db()
+            db.execute(
+                f"UPDATE file_jobs SET owner = NULL, heartbeat_at = NULL WHERE owner = ? AND status NOT IN ({placeholders})",
+                (owner, *finished_states)
+            )
+            db.commit()
+
+    def set_priority(self, file_id: str, priority: str) -> None:
+        with self._lock:
+            db = self._db()
+            db.execute("UPDATE file_jobs SET priority = ? WHERE file_id = ?", (priority, file_id))
+            db.commit()
+
+    def cancel(self, batch_id: str, file_id: Optional[str], finished_states: Iterable[str]) -> List[str]:
+        """Mark a batch's unfinished files (or just file_id) cancelled so no worker claims them; returns their ids"""
+        finished_states = list(finished_states)
+        placeholders = ", ".join("?" for _ in finished_states)
+        file_filter = " AND file_id = ?" if file_id else ""
+        params = (batch_id, *finished_states, *([file_id] if file_id else []))
+        now = datetime.now().isoformat()
+        with self._lock:
+            db = self._db()
+            rows = db.execute(
+                f"SELECT file_id FROM file_jobs WHERE batch_id = ? AND status NOT IN ({placeholders}){file_filter} ORDER BY rowid",
+                params
+            ).fetchall()
+            cancelled = [row["file_id"] for row in rows]
+            for cancelled_id in cancelled:
+                db.execute(
+                    "UPDATE file_jobs SET status = 'cancelled', updated_at = ? WHERE file_id = ?", (now, cancelled_id)
+                )
+                db.execute(
+                    "INSERT INTO stage_transitions (file_id, stage, status, at) VALUES (?, 'finished', 'cancelled', ?)",
+                    (cancelled_id, now)
+                )
+            db.commit()
+        return cancelled
+
+    def get_file(self, file_id: str) -> Optional[Dict]:
+        """One file's row, for files another API worker is processing"""
+        with self._lock:
+            row = self._db().execute("SELECT * FROM file_jobs WHERE file_id = ?", (file_id,)).fetchone()
+        return self._entry(row) if row else None
+
+    def has_unfinished(self, batch_id: str, finished_states: Iterable[str]) -> bool:
+        finished_states = list(finished_states)
+        placeholders = ", ".join("?" for _ in finished_states)
+        with self._lock:
+            row = self._db().execute(
+                f"SELECT 1 FROM file_jobs WHERE batch_id = ? AND status NOT IN ({placeholders}) LIMIT 1",
+                (batch_id, *finished_states)
+            ).fetchone()
+        return row is not None
+
+    def count_unfinished(self, finished_states: Iterable[str], priority: Optional[str] = None) -> int:
+        """Files waiting or in progress across every batch and process, optionally of one priority only"""
+        finished_states = list(finished_states)
+        placeholders = ", ".join("?" for _ in finished_states)
+        query = f"SELECT COUNT(*) FROM file_jobs WHERE status NOT IN ({placeholders})"
+        if priority:
+            query += " AND priority = ?"
+            finished_states.append(priority)
+        with self._lock:
+            row = self._db().execute(query, finished_states).fetchone()
+        return row[0]
+
+    def finished_since(self, since: datetime) -> Tuple[int, Optional[datetime]]:
+        """How many files left the pipeline (other than by cancellation) since the given time, and when the first did"""
+        with self._lock:
+            row = self._db().execute(
+                "SELECT COUNT(*), MIN(at) FROM stage_transitions WHERE at >= ? AND stage = 'finished' AND status != 'cancelled'",
+                (since.isoformat(),)
+            ).fetchone()
+        return row[0], datetime.fromisoformat(row[1]) if row[1] else None
+
+    def unfinished_stages(self, finished_states: Iterable[str]) -> List[Tuple[str, Optional[str]]]:
+        """(batch_id, last completed stage) for every file still waiting or in progress"""
+        finished_states = list(finished_states)
+        placeholders = ", ".join("?" for _ in finished_states)
+        with self._lock:
+            rows = self._db().execute(
+                f"SELECT batch_id, last_stage FROM file_jobs WHERE status NOT IN ({placeholders})", finished_states
+            ).fetchall()
+        return [(row["batch_id"], row["last_stage"]) for row in rows]
+
+    def get_transitions(self, file_id: str) -> List[Dict]:
+        """Stage history for one file, oldest first"""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT stage, status, at FROM stage_transitions WHERE file_id = ? ORDER BY rowid", (file_id,)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def remove_batch(self, batch_id: str) -> None:
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "DELETE FROM stage_transitions WHERE file_id IN (SELECT file_id FROM file_jobs WHERE batch_id = ?)",
+                (batch_id,)
+            )
+            db.execute("DELETE FROM file_jobs WHERE batch_id = ?", (batch_id,))
+            db.commit()
+
+    @staticmethod
+    def _entry(row: sqlite3.Row) -> Dict:
+        entry = dict(row)
+        entry["file_info"] = json.loads(entry["file_info"])
+        entry["state"] = json.loads(entry["state"]) if entry["state"] else {}
+        return entry
+
+# Global instance
+job_store = JobStore(settings.TEMP_STORAGE_PATH)
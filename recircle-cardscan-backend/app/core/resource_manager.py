@@ -1,8 +1,11 @@
 import asyncio
 import threading
-from typing import Dict, List
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
 from datetime import datetime, timedelta
-import queue
+from app.config import settings
+from app.core.adaptive_limiter import AdaptiveLimiter, CANCELLED, classify_error, slot_outcome
 
 class ResourceManager:
     """Manages system resources and ensures fair allocation across users"""
@@ -11,15 +14,25 @@ class ResourceManager:
         # Global resource limits
         self.max_concurrent_batches = 10  # Max simultaneous users
         self.max_files_per_batch = 300    # Max files per user
-        self.max_concurrent_files_per_batch = 5  # Files processed simultaneously per user
-        self.max_total_concurrent_files = 20     # Total files processing across all users
+        self.reserved_interactive_files = 2      # Extra slots only interactive scans may use
         
         # Semaphores for resource control
         self.batch_semaphore = asyncio.Semaphore(self.max_concurrent_batches)
-        self.global_file_semaphore = asyncio.Semaphore(self.max_total_concurrent_files)
+        self.interactive_file_semaphore = asyncio.Semaphore(self.reserved_interactive_files)
         
-        # Fair scheduling queue
-        self.batch_queue = queue.Queue()
+        # Files in Gemini calls across all users - the limit adapts to latency and 429s
+        self.file_limiter = AdaptiveLimiter(
+            initial=settings.CONCURRENCY_INITIAL_LIMIT,
+            minimum=settings.CONCURRENCY_MIN_LIMIT,
+            maximum=settings.CONCURRENCY_MAX_LIMIT,
+            decrease_factor=settings.CONCURRENCY_DECREASE_FACTOR,
+            latency_tolerance=settings.CONCURRENCY_LATENCY_TOLERANCE,
+            max_error_rate=settings.CONCURRENCY_MAX_ERROR_RATE
+        )
+        
+        # Fair scheduling - team per batch (from the events table) sets its share of slots
+        self.batch_teams: Dict[str, Optional[str]] = {}
+        self.avg_slot_seconds = 5.0
         self.active_batches: Dict[str, Dict] = {}
         self.batch_stats: Dict[str, Dict] = {}
         
@@ -62,30 +75,131 @@ class ResourceManager:
         
         self.batch_semaphore.release()
     
-    async def acquire_file_slot(self, batch_id: str) -> bool:
-        """Acquire slot for processing a single file"""
-        # Wait for global file processing slot
-        await self.global_file_semaphore.acquire()
+    async def acquire_file_slot(self, batch_id: str, interactive: bool = False):
+        """Acquire slot for processing a single file; returns the semaphore it came from, to release it to"""
+        if interactive and self.file_limiter.locked():
+            # Shared slots are all taken by bulk work - use the reserved ones
+            slot = self.interactive_file_semaphore
+        else:
+            # Wait for global file processing slot
+            slot = self.file_limiter
+        await slot.acquire()
+        slot_outcome.set(None)
         
         with self.stats_lock:
             if batch_id in self.active_batches:
                 self.active_batches[batch_id]["processed_files"] += 1
         
-        return True
+        return slot
+    
+    def release_file_slot(self, slot, started_at: float):
+        """Release a slot from acquire_file_slot, feeding its latency to the concurrency limit unless its call failed"""
+        held = time.time() - started_at
+        with self.stats_lock:
+            # Moving average of slot hold time, used for wait estimates
+            self.avg_slot_seconds = 0.8 * self.avg_slot_seconds + 0.2 * held
+        
+        if slot_outcome.get() is None:
+            self.file_limiter.record_success(held)
+        slot_outcome.set(None)
+        slot.release()
+    
+    @asynccontextmanager
+    async def file_slot(self, batch_id: str, interactive: bool = False):
+        """Hold a file slot for the block; if the file is cancelled mid-call the slot is freed without a latency sample.
+
+        The slot and its start time stay with this block, so out-of-order finishes and a file
+        promoted to interactive while it waited each release exactly what they acquired.
+        """
+        slot = await self.acquire_file_slot(batch_id, interactive)
+        started_at = time.time()
+        try:
+            yield
+        except asyncio.CancelledError:
+            slot_outcome.set(CANCELLED)
+            raise
+        finally:
+            self.release_file_slot(slot, started_at)
+    
+    def record_api_error(self, error: Exception) -> None:
+        """Called by the Gemini services when a call fails; 429s and timeouts cut the concurrency limit"""
+        outcome = classify_error(error)
+        # Visible to release_file_slot because the service runs in the same task as the slot holder
+        slot_outcome.set(outcome)
+        self.file_limiter.record_failure(outcome)
     
-    def release_file_slot(self, batch_id: str):
-        """Release file processing slot"""
-        self.global_file_semaphore.release()
+    async def load_batch_team(self, batch_id: str) -> None:
+        """Look up the batch's team in the events table (once per batch)"""
+        if batch_id in self.batch_teams:
+            return
+        self.batch_teams[batch_id] = None
+        
+        try:
+            team = await asyncio.to_thread(self._query_batch_team, batch_id)
+        except Exception:
+            # No database (or no event row yet) - the batch keeps the default weight
+            team = None
+        
+        if team:
+            self.batch_teams[batch_id] = team
+    
+    def set_batch_team(self, batch_id: str, team: str) -> None:
+        self.batch_teams[batch_id] = team
+    
+    def get_batch_weight(self, batch_id: str) -> float:
+        """Fair-share weight for a batch, from its team (1.0 if unknown)"""
+        team = self.batch_teams.get(batch_id)
+        weight = settings.team_weights_map.get(team, 1.0) if team else 1.0
+        return max(weight, 0.1)
+    
+    @staticmethod
+    def _query_batch_team(batch_id: str) -> Optional[str]:
+        import mysql.connector
+        
+        conn = mysql.connector.connect(
+            host=settings.DB_HOST,
+            port=settings.DB_PORT,
+            user=settings.DB_USER,
+            password=settings.DB_PASSWORD,
+            database=settings.DB_NAME,
+            connection_timeout=3
+        )
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT team FROM events WHERE batch_id = %s LIMIT 1", (batch_id,))
+            row = cursor.fetchone()
+            cursor.close()
+            return row[0] if row else None
+        finally:
+            conn.close()
     
     def get_system_stats(self) -> Dict:
         """Get current system resource usage statistics"""
+        from app.services.pipeline_engine import pipeline_engine
+        from app.core.fair_scheduler import INTERACTIVE
+        
+        # Expected wait: a batch drains at its weighted share of extraction throughput
+        waiting_batches = pipeline_engine.get_scheduler_snapshot("extract")
+        total_weight = sum(b["weight"] for b in waiting_batches) or 1.0
+        concurrency = min(settings.PIPELINE_EXTRACT_WORKERS, int(self.file_limiter.limit))
+        files_per_second = concurrency / max(self.avg_slot_seconds, 0.1)
+        for batch in waiting_batches:
+            batch["team"] = self.batch_teams.get(batch["batch_id"])
+            share = batch["weight"] / total_weight
+            batch["expected_wait_seconds"] = round(batch["waiting"] / (files_per_second * share), 1)
+        
         with self.stats_lock:
             return {
                 "active_batches": len(self.active_batches),
                 "max_concurrent_batches": self.max_concurrent_batches,
                 "available_batch_slots": self.batch_semaphore._value,
-                "available_file_slots": self.global_file_semaphore._value,
-                "active_batch_details": self.active_batches.copy()
+                "available_file_slots": max(int(self.file_limiter.limit) - self.file_limiter.in_flight, 0),
+                "available_interactive_slots": self.interactive_file_semaphore._value,
+                "interactive_queue": pipeline_engine.get_scheduler_snapshot("extract", INTERACTIVE),
+                "active_batch_details": self.active_batches.copy(),
+                "avg_slot_seconds": round(self.avg_slot_seconds, 2),
+                "scheduler_queue": waiting_batches,
+                "concurrency": self.file_limiter.snapshot()
             }
 
 # Global resource manager instance
@@ -0,0 +1,135 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, List, Optional, Tuple
+from app.core.state_backend import state_backend
+
+# Timed stages: receiving and probing an upload, then each pipeline stage
+STAGES = ["upload", "probe", "ingest", "preprocess", "validate", "extract", "postprocess", "persist"]
+
+# Bucket upper bounds in seconds, roughly log-spaced; the last bucket takes anything slower
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 60.0, 120.0, math.inf]
+
+# The rolling window is SLOTS slots of SLOT_SECONDS; a whole slot ages out at a time
+SLOT_SECONDS = 60
+SLOTS = 10
+
+# Where each process publishes its histograms so the API can merge the pipeline workers' timings
+NAMESPACE = "stage_metrics"
+
+class RollingHistogram:
+    """Latency histogram over roughly the last SLOTS x SLOT_SECONDS"""
+
+    def __init__(self):
+        # (slot start, bucket counts, sum of observed seconds), oldest first
+        self._slots: Deque[Tuple[float, List[int], float]] = deque()
+
+    def observe(self, seconds: float) -> None:
+        now = time.time()
+        slot_start = now - now % SLOT_SECONDS
+        if not self._slots or self._slots[-1][0] != slot_start:
+            self._slots.append((slot_start, [0] * len(BUCKETS), 0.0))
+        self._expire(now)
+
+        start, counts, total = self._slots[-1]
+        counts[next(i for i, bound in enumerate(BUCKETS) if seconds <= bound)] += 1
+        self._slots[-1] = (start, counts, total + seconds)
+
+    def totals(self) -> Tuple[List[int], float]:
+        """Bucket counts and summed seconds across the window"""
+        self._expire(time.time())
+        counts = [0] * len(BUCKETS)
+        total = 0.0
+        for _, slot_counts, slot_total in self._slots:
+            counts = [a + b for a, b in zip(counts, slot_counts)]
+            total += slot_total
+        return counts, total
+
+    def _expire(self, now: float) -> None:
+        while self._slots and self._slots[0][0] <= now - SLOTS * SLOT_SECONDS:
+            self._slots.popleft()
+
+class StageMetrics:
+    """Rolling per-stage latency histograms, merged across every process sharing the state backend"""
+
+    def __init__(self):
+        self._histograms = {stage: RollingHistogram() for stage in STAGES}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        self._histograms[stage].observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str):
+        """Time the block into the stage's histogram (a cancelled block isn't counted)"""
+        started = time.perf_counter()
+        try:
+            yield
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.observe(stage, time.perf_counter() - started)
+            raise
+        self.observe(stage, time.perf_counter() - started)
+
+    def publish(self) -> None:
+        """Share this process's histograms (pipeline workers call this on their heartbeat)"""
+        state_backend.set(NAMESPACE, state_backend.origin, {
+            "published_at": time.time(),
+            "stages": {stage: histogram.totals() for stage, histogram in self._histograms.items()}
+        })
+
+    def merged(self, stage: str) -> Tuple[List[int], float]:
+        """A stage's counts and summed seconds here plus what other processes published recently"""
+        counts, total = self._histograms[stage].totals()
+        for origin in state_backend.keys(NAMESPACE):
+            published = state_backend.get(NAMESPACE, origin)
+            if origin == state_backend.origin or not published:
+                continue
+            if published["published_at"] < time.time() - SLOTS * SLOT_SECONDS:
+                continue
+            other_counts, other_total = published["stages"].get(stage, ([0] * len(BUCKETS), 0.0))
+            counts = [a + b for a, b in zip(counts, other_counts)]
+            total += other_total
+        return counts, total
+
+    def mean(self, stage: str) -> Optional[float]:
+        counts, total = self.merged(stage)
+        return total / sum(counts) if sum(counts) else None
+
+    def snapshot(self) -> Dict:
+        """Count, mean and percentiles per stage, plus the raw buckets"""
+        stages = {}
+        for stage in STAGES:
+            counts, total = self.merged(stage)
+            samples = sum(counts)
+            stages[stage] = {
+                "count": samples,
+                "mean_seconds": round(total / samples, 3) if samples else None,
+                "p50_seconds": self._quantile(counts, 0.5),
+                "p90_seconds": self._quantile(counts, 0.9),
+                "p99_seconds": self._quantile(counts, 0.99),
+                "buckets": {("+Inf" if math.isinf(bound) else str(bound)): count for bound, count in zip(BUCKETS, counts)}
+            }
+        return {"window_seconds": SLOTS * SLOT_SECONDS, "stages": stages}
+
+    @staticmethod
+    def _quantile(counts: List[int], q: float) -> Optional[float]:
+        """Interpolated within the bucket holding the q-th sample"""
+        samples = sum(counts)
+        if not samples:
+            return None
+        rank = q * samples
+        seen = 0
+        for i, count in enumerate(counts):
+            if count and seen + count >= rank:
+                lower = BUCKETS[i - 1] if i else 0.0
+                # Past the last finite bound there is nothing to interpolate towards
+                upper = BUCKETS[i] if not math.isinf(BUCKETS[i]) else lower
+                return round(lower + (upper - lower) * (rank - seen) / count, 3)
+            seen += count
+        return None
+
+# Global instance
+stage_metrics = StageMetrics()
@@ -0,0 +1,673 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from app.config import settings
+from app.utils.logger import app_logger
+
+# Sentinel for "key not present" - update() without a default leaves missing keys alone
+MISSING = object()
+
+# How long other processes can still pick up a published message (SQLite backend)
+EVENT_RETENTION_SECONDS = 60
+
+Subscriber = Callable[[str, Dict], Awaitable[None]]
+
+# Upsert that keeps the row (and so its place in get_fields order) when the field already exists
+UPSERT_FIELD = (
+    "INSERT INTO fields (namespace, key, field, value) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT (namespace, key, field) DO UPDATE SET value = excluded.value"
+)
+
+class StateBackend:
+    """Key/value and pub/sub store behind the API's shared state.
+
+    Values are JSON-shaped and grouped by namespace. get() returns a copy, so changes to it are
+    not stored: write them back through set() or update(), which is atomic across every process
+    sharing the backend. A key can instead hold named fields (like a Redis hash), each read and
+    written on its own, so one entry of a large collection changes without rewriting the rest.
+    publish() reaches subscribers in this process and, once start() has run, in the others.
+    """
+
+    # Whether calls wait on I/O; if so run() moves them off the event loop
+    blocking = True
+
+    def __init__(self):
+        # Identifies this process's messages so it doesn't deliver them twice
+        self.origin = uuid.uuid4().hex
+        self._subscribers: List[Subscriber] = []
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    def set(self, namespace: str, key: str, value: Any) -> None:
+        raise NotImplementedError
+
+    def delete(self, namespace: str, key: str) -> bool:
+        raise NotImplementedError
+
+    def keys(self, namespace: str) -> List[str]:
+        raise NotImplementedError
+
+    def update(self, namespace: str, key: str, fn: Callable[[Any], Any], default: Any = MISSING) -> Any:
+        """Atomically replace a value with fn(value); a missing key starts from default, or is skipped without one"""
+        raise NotImplementedError
+
+    def view(self, namespace: str, key: str, fn: Callable[[Any], Any], default: Any = None) -> Any:
+        """fn(value) against a consistent snapshot of the value"""
+        return fn(self.get(namespace, key, default))
+
+    def contains(self, namespace: str, key: str) -> bool:
+        return self.get(namespace, key, MISSING) is not MISSING
+
+    def get_field(self, namespace: str, key: str, field: str, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    def get_fields(self, namespace: str, key: str) -> Dict[str, Any]:
+        """Every field of a key, in the order they were first set where the backend keeps one"""
+        raise NotImplementedError
+
+    def set_field(self, namespace: str, key: str, field: str, value: Any) -> None:
+        raise NotImplementedError
+
+    def update_field(self, namespace: str, key: str, field: str, fn: Callable[[Any], Any], default: Any = MISSING) -> Any:
+        """update() for a single field"""
+        raise NotImplementedError
+
+    def increment(self, namespace: str, key: str, field: str, amount: int = 1) -> int:
+        """Atomically add amount to an integer field (missing counts as 0) and return the new value"""
+        raise NotImplementedError
+
+    def delete_fields(self, namespace: str, key: str) -> None:
+        """Drop a key's fields"""
+        raise NotImplementedError
+
+    def acquire_lease(self, name: str, ttl_seconds: float) -> bool:
+        """Take (or renew) a named lease for ttl_seconds; False while another process holds it"""
+        raise NotImplementedError
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """Call fn(*args), in a worker thread if this backend blocks on I/O"""
+        if self.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def subscribe(self, handler: Subscriber) -> None:
+        self._subscribers.append(handler)
+
+    async def publish(self, channel: str, message: Dict) -> None:
+        """Deliver to this process's subscribers now and to every other process through the backend"""
+        await self._deliver(channel, message)
+        await self._publish_remote(channel, message)
+
+    async def start(self) -> None:
+        """Begin receiving other processes' messages (needs a running event loop)"""
+
+    async def stop(self) -> None:
+        pass
+
+    async def _publish_remote(self, channel: str, message: Dict) -> None:
+        pass
+
+    async def _deliver(self, channel: str, message: Dict) -> None:
+        for handler in self._subscribers:
+            try:
+                await handler(channel, message)
+            except Exception as e:
+                app_logger.error(f"[STATE] Subscriber failed for {channel}: {str(e)}")
+
+class MemoryBackend(StateBackend):
+    """Dicts in this process - the default for a single uvicorn worker.
+
+    Values are kept JSON-encoded, like the shared backends keep them, so get() hands out a copy
+    and a value that can't be serialized fails here rather than only once a shared backend is on.
+    """
+
+    blocking = False
+
+    def __init__(self):
+        super().__init__()
+        self._data: Dict[str, Dict[str, str]] = {}
+        self._fields: Dict[tuple, Dict[str, str]] = {}
+        self._key_locks: Dict[tuple, threading.Lock] = {}
+        self._leases: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        raw = self._data.get(namespace, {}).get(key)
+        return json.loads(raw) if raw is not None else default
+
+    def set(self, namespace: str, key: str, value: Any) -> None:
+        raw = json.dumps(value)
+        with self._lock:
+            self._data.setdefault(namespace, {})[key] = raw
+
+    def delete(self, namespace: str, key: str) -> bool:
+        with self._lock:
+            self._key_locks.pop((namespace, key), None)
+            return self._data.get(namespace, {}).pop(key, MISSING) is not MISSING
+
+    def keys(self, namespace: str) -> List[str]:
+        with self._lock:
+            return list(self._data.get(namespace, {}))
+
+    def update(self, namespace: str, key: str, fn: Callable[[Any], Any], default: Any = MISSING) -> Any:
+        with self._key_lock(namespace, key):
+            current = self.get(namespace, key, default)
+            if current is MISSING:
+                return MISSING
+            value = fn(current)
+            self.set(namespace, key, value)
+            return value
+
+    def get_field(self, namespace: str, key: str, field: str, default: Any = None) -> Any:
+        raw = self._fields.get((namespace, key), {}).get(field)
+        return json.loads(raw) if raw is not None else default
+
+    def get_fields(self, namespace: str, key: str) -> Dict[str, Any]:
+        with self._lock:
+            fields = dict(self._fields.get((namespace, key), {}))
+        return {field: json.loads(raw) for field, raw in fields.items()}
+
+    def set_field(self, namespace: str, key: str, field: str, value: Any) -> None:
+        raw = json.dumps(value)
+        with self._lock:
+            self._fields.setdefault((namespace, key), {})[field] = raw
+
+    def update_field(self, namespace: str, key: str, field: str, fn: Callable[[Any], Any], default: Any = MISSING) -> Any:
+        with self._key_lock(namespace, f"{key}\0{field}"):
+            current = self.get_field(namespace, key, field, default)
+            if current is MISSING:
+                return MISSING
+            value = fn(current)
+            self.set_field(namespace, key, field, value)
+            return value
+
+    def increment(self, namespace: str, key: str, field: str, amount: int = 1) -> int:
+        with self._lock:
+            fields = self._fields.setdefault((namespace, key), {})
+            value = json.loads(fields.get(field, "0")) + amount
+            fields[field] = json.dumps(value)
+            return value
+
+    def delete_fields(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._fields.pop((namespace, key), None)
+            for lock_key in [k for k in self._key_locks if k[0] == namespace and k[1].startswith(f"{key}\0")]:
+                del self._key_locks[lock_key]
+
+    def acquire_lease(self, name: str, ttl_seconds: float) -> bool:
+        with self._lock:
+            now = time.time()
+            if self._leases.get(name, 0) > now:
+                return False
+            self._leases[name] = now + ttl_seconds
+            return True
+
+    def _key_lock(self, namespace: str, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault((namespace, key), threading.Lock())
+
+class SQLiteBackend(StateBackend):
+    """One WAL-mode SQLite file shared by every worker on the host; messages fan out through an events table"""
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._poller: Optional[asyncio.Task] = None
+        self._last_event_id = 0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # Autocommit; update() and acquire_lease() open their own write transactions
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS kv (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                );
+                CREATE TABLE IF NOT EXISTS fields (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    field TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    PRIMARY KEY (namespace, key, field)
+                );
+                CREATE TABLE IF NOT EXISTS events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    channel TEXT NOT NULL,
+                    origin TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS leases (
+                    name TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                );
+            """)
+        return self._conn
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        with self._lock:
+            row = self._db().execute("SELECT value FROM kv WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, namespace: str, key: str, value: Any) -> None:
+        with self._lock:
+            self._db().execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value) VALUES (?, ?, ?)",
+                (namespace, key, json.dumps(value))
+            )
+
+    def delete(self, namespace: str, key: str) -> bool:
+        with self._lock:
+            cursor = self._db().execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+        return cursor.rowcount > 0
+
+    def keys(self, namespace: str) -> List[str]:
+        with self._lock:
+            rows = self._db().execute("SELECT key FROM kv WHERE namespace = ? ORDER BY rowid", (namespace,)).fetchall()
+        return [row[0] for row in rows]
+
+    def update(self, namespace: str, key: str, fn: Callable[[Any], Any], default: Any = MISSING) -> Any:
+        with self._lock:
+            db = self._db()
+            # IMMEDIATE takes the write lock up front, so no other process can read-modify-write in between
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute("SELECT value FROM kv WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+                current = json.loads(row[0]) if row else default
+                if current is MISSING:
+                    db.execute("ROLLBACK")
+                    return MISSING
+                value = fn(current)
+                db.execute(
+                    "INSERT OR REPLACE INTO kv (namespace, key, value) VALUES (?, ?, ?)",
+                    (namespace, key, json.dumps(value))
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return value
+
+    def get_field(self, namespace: str, key: str, field: str, default: Any = None) -> Any:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT value FROM fields WHERE namespace = ? AND key = ? AND field = ?", (namespace, key, field)
+            ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def get_fields(self, namespace: str, key: str) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT field, value FROM fields WHERE namespace = ? AND key = ? ORDER BY rowid", (namespace, key)
+            ).fetchall()
+        return {field: json.loads(value) for field, value in rows}
+
+    def set_field(self, namespace: str, key: str, field: str, value: Any) -> None:
+        with self._lock:
+            self._db().execute(UPSERT_FIELD, (namespace, key, field, json.dumps(value)))
+
+    def update_field(self, namespace: str, key: str, field: str, fn: Callable[[Any], Any], default: Any = MISSING) -> Any:
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute(
+                    "SELECT value FROM fields WHERE namespace = ? AND key = ? AND field = ?", (namespace, key, field)
+                ).fetchone()
+                current = json.loads(row[0]) if row else default
+                if current is MISSING:
+                    db.execute("ROLLBACK")
+                    return MISSING
+                value = fn(current)
+                db.execute(UPSERT_FIELD, (namespace, key, field, json.dumps(value)))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return value
+
+    def increment(self, namespace: str, key: str, field: str, amount: int = 1) -> int:
+        with self._lock:
+            row = self._db().execute(
+                "INSERT INTO fields (namespace, key, field, value) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (namespace, key, field) DO UPDATE SET value = CAST(value AS INTEGER) + ? "
+                "RETURNING value",
+                (namespace, key, field, str(amount), amount)
+            ).fetchone()
+        return int(row[0])
+
+    def delete_fields(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._db().execute("DELETE FROM fields WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def acquire_lease(self, name: str, ttl_seconds: float) -> bool:
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute("SELECT owner, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+                if row and row[0] != self.origin and row[1] > now:
+                    db.execute("ROLLBACK")
+                    return False
+                db.execute(
+                    "INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)",
+                    (name, self.origin, now + ttl_seconds)
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return True
+
+    async def start(self) -> None:
+        if self._poller:
+            return
+        with self._lock:
+            row = self._db().execute("SELECT MAX(id) FROM events").fetchone()
+        self._last_event_id = row[0] or 0
+        self._poller = asyncio.create_task(self._poll_events())
+
+    async def stop(self) -> None:
+        if self._poller:
+            self._poller.cancel()
+            self._poller = None
+
+    async def _publish_remote(self, channel: str, message: Dict) -> None:
+        with self._lock:
+            self._db().execute(
+                "INSERT INTO events (channel, origin, payload, at) VALUES (?, ?, ?, ?)",
+                (channel, self.origin, json.dumps(message), time.time())
+            )
+
+    async def _poll_events(self) -> None:
+        while True:
+            await asyncio.sleep(settings.STATE_POLL_SECONDS)
+            try:
+                with self._lock:
+                    db = self._db()
+                    rows = db.execute(
+                        "SELECT id, channel, origin, payload FROM events WHERE id > ? ORDER BY id",
+                        (self._last_event_id,)
+                    ).fetchall()
+                    db.execute("DELETE FROM events WHERE at < ?", (time.time() - EVENT_RETENTION_SECONDS,))
+            except sqlite3.Error as e:
+                app_logger.error(f"[STATE] Event poll failed: {str(e)}")
+                continue
+
+            for event_id, channel, origin, payload in rows:
+                self._last_event_id = event_id
+                if origin != self.origin:
+                    await self._deliver(channel, json.loads(payload))
+
+class RedisBackend(StateBackend):
+    """Any Redis-protocol server (Redis, Valkey, KeyDB); a fakeredis:// URL runs an in-process stand-in"""
+
+    PREFIX = "cardscan"
+
+    def __init__(self, url: str):
+        super().__init__()
+        import redis
+        self._watch_error = redis.exceptions.WatchError
+
+        if url.startswith("fakeredis://"):
+            import fakeredis
+            from fakeredis import aioredis as fake_aioredis
+            server = fakeredis.FakeServer()
+            self._client = fakeredis.FakeRedis(server=server)
+            self._async_client = fake_aioredis.FakeRedis(server=server)
+        else:
+            import redis.asyncio
+            self._client = redis.Redis.from_url(url)
+            self._async_client = redis.asyncio.Redis.from_url(url)
+        self._listener: Optional[asyncio.Task] = None
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{self.PREFIX}:{namespace}:{key}"
+
+    def _index(self, namespace: str) -> str:
+        return f"{self.PREFIX}:{namespace}"
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        raw = self._client.get(self._key(namespace, key))
+        return json.loads(raw) if raw is not None else default
+
+    def set(self, namespace: str, key: str, value: Any) -> None:
+        pipe = self._client.pipeline()
+        pipe.set(self._key(namespace, key), json.dumps(value))
+        pipe.sadd(self._index(namespace), key)
+        pipe.execute()
+
+    def delete(self, namespace: str, key: str) -> bool:
+        pipe = self._client.pipeline()
+        pipe.delete(self._key(namespace, key))
+        pipe.srem(self._index(namespace), key)
+        deleted, _ = pipe.execute()
+        return deleted > 0
+
+    def keys(self, namespace: str) -> List[str]:
+        return [key.decode() for key in self._client.smembers(self._index(namespace))]
+
+    def update(self, namespace: str, key: str, fn: Callable[[Any], Any], default: Any = MISSING) -> Any:
+        redis_key = self._key(namespace, key)
+        with self._client.pipeline() as pipe:
+            while True:
+                try:
+                    # Optimistic transaction: retried if another process writes the key first
+                    pipe.watch(redis_key)
+                    raw = pipe.get(redis_key)
+                    current = json.loads(raw) if raw is not None else default
+                    if current is MISSING:
+                        pipe.unwatch()
+                        return MISSING
+                    value = fn(current)
+                    pipe.multi()
+                    pipe.set(redis_key, json.dumps(value))
+                    pipe.sadd(self._index(namespace), key)
+                    pipe.execute()
+                    return value
+                except self._watch_error:
+                    continue
+
+    def _fields_key(self, namespace: str, key: str) -> str:
+        return f"{self.PREFIX}:{namespace}:{key}:fields"
+
+    def get_field(self, namespace: str, key: str, field: str, default: Any = None) -> Any:
+        raw = self._client.hget(self._fields_key(namespace, key), field)
+        return json.loads(raw) if raw is not None else default
+
+    def get_fields(self, namespace: str, key: str) -> Dict[str, Any]:
+        # Hashes are unordered; callers that need an order keep it in the values
+        return {
+            field.decode(): json.loads(raw)
+            for field, raw in self._client.hgetall(self._fields_key(namespace, key)).items()
+        }
+
+    def set_field(self, namespace: str, key: str, field: str, value: Any) -> None:
+        self._client.hset(self._fields_key(namespace, key), field, json.dumps(value))
+
+    def update_field(self, namespace: str, key: str, field: str, fn: Callable[[Any], Any], default: Any = MISSING) -> Any:
+        redis_key = self._fields_key(namespace, key)
+        with self._client.pipeline() as pipe:
+            while True:
+                try:
+                    # Watches the whole hash: a write to any field of the key retries this one
+                    pipe.watch(redis_key)
+                    raw = pipe.hget(redis_key, field)
+                    current = json.loads(raw) if raw is not None else default
+                    if current is MISSING:
+                        pipe.unwatch()
+                        return MISSING
+                    value = fn(current)
+                    pipe.multi()
+                    pipe.hset(redis_key, field, json.dumps(value))
+                    pipe.execute()
+                    return value
+                except self._watch_error:
+                    continue
+
+    def increment(self, namespace: str, key: str, field: str, amount: int = 1) -> int:
+        return self._client.hincrby(self._fields_key(namespace, key), field, amount)
+
+    def delete_fields(self, namespace: str, key: str) -> None:
+        self._client.delete(self._fields_key(namespace, key))
+
+    def acquire_lease(self, name: str, ttl_seconds: float) -> bool:
+        lease_key = self._key("leases", name)
+        if self._client.set(lease_key, self.origin, nx=True, px=int(ttl_seconds * 1000)):
+            return True
+        if self._client.get(lease_key) == self.origin.encode():
+            self._client.pexpire(lease_key, int(ttl_seconds * 1000))
+            return True
+        return False
+
+    async def start(self) -> None:
+        if not self._listener:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener:
+            self._listener.cancel()
+            self._listener = None
+
+    async def _publish_remote(self, channel: str, message: Dict) -> None:
+        await self._async_client.publish(
+            f"{self.PREFIX}:events",
+            json.dumps({"origin": self.origin, "channel": channel, "message": message})
+        )
+
+    async def _listen(self) -> None:
+        pubsub = self._async_client.pubsub()
+        await pubsub.subscribe(f"{self.PREFIX}:events")
+        async for event in pubsub.listen():
+            if event["type"] != "message":
+                continue
+            data = json.loads(event["data"])
+            if data["origin"] != self.origin:
+                await self._deliver(data["channel"], data["message"])
+
+class SharedDict:
+    """Dict-like view of one backend namespace, standing in for the module-level dicts routers used to share.
+
+    Every method is a coroutine that goes through state_backend.run, so a backend doing I/O
+    never holds up the event loop.
+    """
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        return await state_backend.run(state_backend.get, self.namespace, key, default)
+
+    async def set(self, key: str, value: Any) -> None:
+        await state_backend.run(state_backend.set, self.namespace, key, value)
+
+    async def contains(self, key: str) -> bool:
+        return await state_backend.run(state_backend.contains, self.namespace, key)
+
+    async def pop(self, key: str, default: Any = None) -> Any:
+        def pop() -> Any:
+            value = state_backend.get(self.namespace, key, default)
+            state_backend.delete(self.namespace, key)
+            return value
+
+        return await state_backend.run(pop)
+
+    async def keys(self) -> List[str]:
+        return await state_backend.run(state_backend.keys, self.namespace)
+
+    async def update_item(self, key: str, fn: Callable[[Any], Any], default: Any = MISSING) -> Any:
+        """Atomically replace one entry with fn(entry); see StateBackend.update"""
+        return await state_backend.run(state_backend.update, self.namespace, key, fn, default)
+
+class SharedList:
+    """Lists keyed like SharedDict, each item stored as its own backend field under item[id_field].
+
+    Appending or changing an item writes only that item, so a 300-file batch costs the same
+    per file as a 3-file one and concurrent appends from different workers never collide.
+    The item count is kept as a counter field, which also marks an empty list as existing.
+    """
+
+    def __init__(self, namespace: str, id_field: str):
+        self.namespace = namespace
+        self.counters = f"{namespace}_counters"
+        self.id_field = id_field
+
+    async def create(self, key: str, items: List[Dict] = ()) -> None:
+        """Start (or replace) the list for key"""
+        def create() -> None:
+            self._delete(key)
+            state_backend.set_field(self.counters, key, "count", 0)
+            for item in items:
+                self._append(key, item)
+
+        await state_backend.run(create)
+
+    async def contains(self, key: str) -> bool:
+        return await state_backend.run(self._exists, key)
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        """The items in the order they were appended, or default if the list doesn't exist"""
+        def read() -> Any:
+            if not self._exists(key):
+                return default
+            entries = sorted(state_backend.get_fields(self.namespace, key).values(), key=lambda e: e["position"])
+            return [entry["item"] for entry in entries]
+
+        return await state_backend.run(read)
+
+    async def append(self, key: str, item: Dict) -> None:
+        await state_backend.run(self._append, key, item)
+
+    async def merge_items(self, key: str, changes: Dict[str, Dict]) -> None:
+        """Merge changes[item_id] into each listed item; ids not in the list are skipped"""
+        def merge() -> None:
+            for item_id, fields in changes.items():
+                state_backend.update_field(self.namespace, key, item_id,
+                                           lambda entry: {**entry, "item": {**entry["item"], **fields}})
+
+        await state_backend.run(merge)
+
+    async def pop(self, key: str, default: Any = None) -> Any:
+        items = await self.get(key, default)
+        await state_backend.run(self._delete, key)
+        return items
+
+    def _exists(self, key: str) -> bool:
+        return state_backend.get_field(self.counters, key, "count") is not None
+
+    def _append(self, key: str, item: Dict) -> None:
+        position = state_backend.increment(self.counters, key, "count")
+        state_backend.set_field(self.namespace, key, item[self.id_field], {"position": position, "item": item})
+
+    def _delete(self, key: str) -> None:
+        state_backend.delete_fields(self.namespace, key)
+        state_backend.delete_fields(self.counters, key)
+
+def create_state_backend() -> StateBackend:
+    backend = settings.STATE_BACKEND.lower()
+    if backend == "sqlite":
+        return SQLiteBackend(settings.STATE_SQLITE_PATH or os.path.join(settings.TEMP_STORAGE_PATH, "state.db"))
+    if backend == "redis":
+        return RedisBackend(settings.REDIS_URL)
+    if backend != "memory":
+        raise ValueError(f"Unknown STATE_BACKEND: {settings.STATE_BACKEND} (expected memory, sqlite or redis)")
+    return MemoryBackend()
+
+# Global instance
+state_backend = create_state_backend()
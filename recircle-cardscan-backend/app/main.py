@@ -1,7 +1,13 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import upload, process, download, pdf_preview_simple, vcf_export, prompt_manager, extracted_data, save_data, process_single, websocket_router, bulk_email
+from app.routers import upload, resumable_upload, process, download, pdf_preview_simple, vcf_export, prompt_manager, extracted_data, save_data, process_single, websocket_router, bulk_email, storage, system
 from app.config import settings
+from app.services.storage_lifecycle import storage_lifecycle
+from app.services.pipeline_engine import pipeline_engine
+from app.core.state_backend import state_backend
+from app.core.image_pool import image_pool
+from app.core.file_index import file_index
+import asyncio
 import os
 import logging
 
@@ -32,6 +38,7 @@ app.add_middleware(
 
 # Include routers
 app.include_router(upload.router)
+app.include_router(resumable_upload.router)
 app.include_router(process.router)
 app.include_router(process_single.router)
 app.include_router(websocket_router.router)
@@ -43,6 +50,45 @@ app.include_router(extracted_data.router)
 app.include_router(bulk_email.router)
 # Removed field_update and email_lookup routers due to database dependency issues
 app.include_router(save_data.router)
+app.include_router(storage.router)
+app.include_router(system.router)
+
+@app.on_event("startup")
+async def start_state_backend():
+    # Relays WebSocket messages published by the other API workers
+    await state_backend.start()
+
+@app.on_event("startup")
+async def backfill_file_index():
+    # Makes files stored before the file index existed reachable by preview again
+    added = await asyncio.to_thread(file_index.backfill)
+    if added:
+        logger.info(f"[STORAGE] Indexed {added} files stored before the file index")
+
+@app.on_event("startup")
+async def start_storage_lifecycle():
+    storage_lifecycle.start()
+
+@app.on_event("startup")
+async def start_pipeline_engine():
+    # Picks up any batches that were mid-flight when the server last stopped
+    await pipeline_engine.resume()
+
+@app.on_event("shutdown")
+async def stop_storage_lifecycle():
+    await storage_lifecycle.stop()
+
+@app.on_event("shutdown")
+async def stop_pipeline_engine():
+    await pipeline_engine.stop()
+
+@app.on_event("shutdown")
+async def stop_image_pool():
+    image_pool.shutdown()
+
+@app.on_event("shutdown")
+async def stop_state_backend():
+    await state_backend.stop()
 
 @app.get("/")
 async def root():
@@ -15,6 +15,9 @@ class FileInfo(BaseModel):
     file_type: str
     size: int
     file_path: str
+    sha256: Optional[str] = None
+    probe: Optional[dict] = None
+    quality: Optional[dict] = None
     validation: Optional[ValidationResult] = None
 
 class UploadResponse(BaseModel):
@@ -23,6 +26,10 @@ class UploadResponse(BaseModel):
     uploaded_files: List[FileInfo]
     total_count: int
     message: str
+    predicted_completion_seconds: Optional[float] = None
+    predicted_completion_at: Optional[str] = None
+    # quality_warning messages for photos that look unreadable, so the client can ask for a reshoot
+    quality_warnings: List[dict] = []
 
 class ExtractedData(BaseModel):
     file_id: str
@@ -42,10 +49,13 @@ class ProcessResponse(BaseModel):
     batch_id: str
     total_files: int
     message: str
+    predicted_completion_seconds: Optional[float] = None
+    predicted_completion_at: Optional[str] = None
 
 class StatusResponse(BaseModel):
     status: str
     batch_id: str
     progress: dict
     current_file: Optional[str] = None
-    error: Optional[str] = None
\ No newline at end of file
+    error: Optional[str] = None
+    eta_seconds: Optional[float] = None
\ No newline at end of file
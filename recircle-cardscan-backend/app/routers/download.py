@@ -1,6 +1,8 @@
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
 from app.services.csv_writer import CSVWriter
+from app.services.storage_lifecycle import storage_lifecycle
 from app.config import settings
 import os
 
@@ -15,12 +17,13 @@ async def download_csv(batch_id: str):
         from app.services.queue_manager import queue_manager
         
         # Get completed data from output queue
-        cards_data = queue_manager.get_all_outputs(batch_id)
+        cards_data = await queue_manager.get_all_outputs(batch_id)
         
         # Fallback to save-data request storage
         if not cards_data:
             try:
-                from app.routers.save_data import last_request_data
+                from app.routers.save_data import save_requests
+                last_request_data = await save_requests.get("last", {})
                 if last_request_data.get('batch_id') == batch_id:
                     cards_data = last_request_data.get('extracted_data', [])
             except:
@@ -56,12 +59,14 @@ async def download_csv(batch_id: str):
             ])
         
         temp_file.close()
+        storage_lifecycle.track(temp_file.name, batch_id, kind="csv")
         
         return FileResponse(
             path=temp_file.name,
             media_type="application/octet-stream",
             filename=custom_filename,
-            headers={"Content-Disposition": f"attachment; filename={custom_filename}"}
+            headers={"Content-Disposition": f"attachment; filename={custom_filename}"},
+            background=BackgroundTask(storage_lifecycle.release, temp_file.name)
         )
         
     except Exception as e:
@@ -142,12 +147,14 @@ async def download_latest_data():
             ])
         
         temp_file.close()
+        storage_lifecycle.track(temp_file.name, batch_id, kind="csv")
         
         return FileResponse(
             path=temp_file.name,
             media_type="application/octet-stream",
             filename=custom_filename,
-            headers={"Content-Disposition": f"attachment; filename={custom_filename}"}
+            headers={"Content-Disposition": f"attachment; filename={custom_filename}"},
+            background=BackgroundTask(storage_lifecycle.release, temp_file.name)
         )
         
     except Exception as e:
@@ -222,12 +229,14 @@ async def download_saved_data(batch_id: str):
             ])
         
         temp_file.close()
+        storage_lifecycle.track(temp_file.name, batch_id, kind="csv")
         
         return FileResponse(
             path=temp_file.name,
             media_type="application/octet-stream",
             filename=custom_filename,
-            headers={"Content-Disposition": f"attachment; filename={custom_filename}"}
+            headers={"Content-Disposition": f"attachment; filename={custom_filename}"},
+            background=BackgroundTask(storage_lifecycle.release, temp_file.name)
         )
         
     except Exception as e:
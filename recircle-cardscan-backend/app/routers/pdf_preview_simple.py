@@ -3,7 +3,8 @@ from fastapi.responses import FileResponse
 from pydantic import BaseModel
 import os
 import json
-import glob
+from app.core.file_index import file_index
+from app.services.storage_lifecycle import storage_lifecycle
 
 router = APIRouter()
 
@@ -23,27 +24,18 @@ data_store = {}
 async def get_document_preview(file_id: str):
     """Get document preview with actual extracted data"""
     try:
-        from app.config import settings
         from app.services.gemini_service import GeminiService
-        import glob
         
         # Find the actual uploaded file
-        file_patterns = [
-            os.path.join(settings.TEMP_STORAGE_PATH, f"{file_id}.*"),
-            os.path.join(settings.TEMP_STORAGE_PATH, f"*{file_id}*")
-        ]
-        
-        found_file = None
-        for pattern in file_patterns:
-            matches = glob.glob(pattern)
-            if matches:
-                found_file = matches[0]
-                break
+        indexed = file_index.get(file_id)
+        found_file = indexed["file_path"] if indexed else None
+        if indexed:
+            storage_lifecycle.touch_batch(indexed["batch_id"])
         
         if found_file and os.path.exists(found_file):
             # Extract actual data from the file
             gemini_service = GeminiService()
-            filename = os.path.basename(found_file)
+            filename = indexed["filename"]
             
             # Detect document type
             document_type = "business_card"
@@ -52,13 +44,14 @@ async def get_document_preview(file_id: str):
             
             # Handle PDF conversion if needed
             processing_file = found_file
-            if found_file.lower().endswith('.pdf'):
+            if indexed["file_type"] == 'application/pdf':
                 from app.services.pdf_converter import PDFConverter
                 pdf_converter = PDFConverter()
                 images = pdf_converter.convert_pdf_to_images(found_file)
                 if images:
                     temp_image_path = found_file.replace('.pdf', '_temp.jpg')
                     images[0].save(temp_image_path)
+                    storage_lifecycle.track(temp_image_path, indexed["batch_id"], kind="render")
                     processing_file = temp_image_path
             
             # Extract data using Gemini (this returns records with multiple phone entries)
@@ -119,31 +112,22 @@ async def update_document_field(file_id: str, request: UpdateFieldRequest):
 async def get_document_image(file_id: str):
     """Get actual document image"""
     try:
-        from app.config import settings
-        import glob
-        
         # Find the actual uploaded file
-        file_patterns = [
-            os.path.join(settings.TEMP_STORAGE_PATH, f"{file_id}.*"),
-            os.path.join(settings.TEMP_STORAGE_PATH, f"*{file_id}*")
-        ]
-        
-        found_file = None
-        for pattern in file_patterns:
-            matches = glob.glob(pattern)
-            if matches:
-                found_file = matches[0]
-                break
+        indexed = file_index.get(file_id)
+        found_file = indexed["file_path"] if indexed else None
+        if indexed:
+            storage_lifecycle.touch_batch(indexed["batch_id"])
         
         if found_file and os.path.exists(found_file):
             # If it's a PDF, convert to image
-            if found_file.lower().endswith('.pdf'):
+            if indexed["file_type"] == 'application/pdf':
                 from app.services.pdf_converter import PDFConverter
                 pdf_converter = PDFConverter()
                 images = pdf_converter.convert_pdf_to_images(found_file)
                 if images:
                     temp_image_path = found_file.replace('.pdf', '_preview.jpg')
                     images[0].save(temp_image_path)
+                    storage_lifecycle.track(temp_image_path, indexed["batch_id"], kind="render")
                     return FileResponse(temp_image_path)
             else:
                 # Return image file directly
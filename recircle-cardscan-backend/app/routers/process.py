@@ -1,25 +1,20 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException
 from app.models.schemas import ProcessRequest, ProcessResponse, StatusResponse
 from app.core.processor import FileProcessor
 from app.routers.upload import batch_storage, validation_storage
+from app.services.job_registry import job_registry
+from app.core.state_backend import SharedDict
 from app.utils.logger import app_logger
 
 router = APIRouter(prefix="/api/v1", tags=["process"])
 
-# Store processing status with thread-safe access
-import threading
-processing_status = {}
-status_lock = threading.Lock()
+# Processing status, individual file status and record queue per batch, shared by every API worker
+processing_status = SharedDict("processing_status")
+file_status = SharedDict("file_status")
+file_queue = SharedDict("file_queue")
 
-# Store individual file status and queue
-file_status = {}
-file_queue = {}
-file_lock = threading.Lock()
 
 
-
-import asyncio
-
 async def background_processing(batch_id: str, files_list: list):
     """Background task for file processing with thread-safe status updates"""
     # Load environment variables
@@ -32,13 +27,12 @@ async def background_processing(batch_id: str, files_list: list):
     try:
         app_logger.info(f"[OCR] Processing {len(files_list)} files for batch {batch_id}")
         
-        with status_lock:
-            processing_status[batch_id] = {
-                "status": "processing",
-                "total_files": len(files_list),
-                "processed": 0,
-                "current_file": None
-            }
+        await processing_status.set(batch_id, {
+            "status": "processing",
+            "total_files": len(files_list),
+            "processed": 0,
+            "current_file": None
+        })
         
         processor = FileProcessor(batch_id)
         
@@ -50,15 +44,14 @@ async def background_processing(batch_id: str, files_list: list):
         
         app_logger.info(f"[OCR] Completed batch {batch_id}, Records: {result.get('records_count', 0)}")
         
-        with status_lock:
-            processing_status[batch_id] = {
-                "status": "completed",
-                "total_files": len(files_list),
-                "processed": len(files_list),
-                "current_file": None,
-                "records_count": result.get("records_count", 0),
-                "extracted_data": result.get("extracted_data", [])
-            }
+        await processing_status.set(batch_id, {
+            "status": "completed",
+            "total_files": len(files_list),
+            "processed": len(files_list),
+            "current_file": None,
+            "records_count": result.get("records_count", 0),
+            "extracted_data": result.get("extracted_data", [])
+        })
         
         app_logger.info(f"[OCR] Batch {batch_id} ready for download")
     except Exception as e:
@@ -67,44 +60,40 @@ async def background_processing(batch_id: str, files_list: list):
         traceback.print_exc()
         # Skip batch status update for simplified schema
         
-        with status_lock:
-            processing_status[batch_id] = {
-                "status": "failed",
-                "error": str(e),
-                "total_files": len(files_list),
-                "processed": 0
-            }
+        await processing_status.set(batch_id, {
+            "status": "failed",
+            "error": str(e),
+            "total_files": len(files_list),
+            "processed": 0
+        })
     finally:
         # No database session to close
         pass
 
 @router.post("/process", response_model=ProcessResponse)
-async def process_batch(
-    request: ProcessRequest,
-    background_tasks: BackgroundTasks
-):
+async def process_batch(request: ProcessRequest):
     """Start processing uploaded files"""
     
     batch_id = request.batch_id
     app_logger.info(f"[PROCESS] Starting processing for batch {batch_id}")
     
     # Check if batch exists
-    if batch_id not in batch_storage:
+    files_list = await batch_storage.get(batch_id)
+    if files_list is None:
         app_logger.error(f"[PROCESS] Batch not found: {batch_id}")
         raise HTTPException(status_code=404, detail="Batch not found")
     
     # Check if validation has been completed
-    if batch_id not in validation_storage:
+    validation_results = await validation_storage.get(batch_id)
+    if validation_results is None:
         app_logger.error(f"[PROCESS] Validation required for batch {batch_id}")
         raise HTTPException(status_code=400, detail="Files must be validated before processing")
     
-    validation_results = validation_storage[batch_id]
-    
     # Only process valid business cards
     valid_files = []
     invalid_files = []
     
-    for file_info in batch_storage[batch_id]:
+    for file_info in files_list:
         # Check if file has validation result
         is_valid = False
         for valid_card in validation_results['valid_business_cards']:
@@ -130,29 +119,36 @@ async def process_batch(
     
     app_logger.info(f"[PROCESS] Processing {len(valid_files)} valid files, skipping {len(invalid_files)} invalid")
     
+    # Files uploaded through /upload are already queued; only ones new to the pipeline count against admission
+    from app.core.admission import admission_controller
+    from app.core.fair_scheduler import BULK
+    from app.services.pipeline_engine import pipeline_engine
+    incoming = sum(1 for f in valid_files if not pipeline_engine.has_file(f["file_id"]))
+    admission = admission_controller.admit(incoming, BULK)
+    
     # Skip batch status update for simplified schema
     
-    # Start background processing with only valid files
-    background_tasks.add_task(background_processing, batch_id, valid_files)
+    # Start background processing with only valid files (a repeat request attaches to the running job)
+    job, created = await job_registry.start(batch_id, "process", lambda: background_processing(batch_id, valid_files))
     
-    app_logger.info(f"[PROCESS] OCR processing started for batch {batch_id}")
+    app_logger.info(f"[PROCESS] OCR processing {'started' if created else 'already ' + job['state']} for batch {batch_id}")
     
     return ProcessResponse(
         status="processing",
         batch_id=batch_id,
         total_files=len(valid_files),
-        message=f"Processing started for {len(valid_files)} valid business cards. {len(invalid_files)} invalid files skipped."
+        message=f"Processing started for {len(valid_files)} valid business cards. {len(invalid_files)} invalid files skipped.",
+        predicted_completion_seconds=admission["predicted_completion_seconds"],
+        predicted_completion_at=admission["predicted_completion_at"]
     )
 
 @router.get("/status/{batch_id}", response_model=StatusResponse)
 async def get_status(batch_id: str):
-    """Get processing status with thread-safe access"""
+    """Get processing status"""
     
-    with status_lock:
-        if batch_id not in processing_status:
-            raise HTTPException(status_code=404, detail="Status not found")
-        
-        status_info = processing_status[batch_id].copy()  # Create a copy to avoid race conditions
+    status_info = await processing_status.get(batch_id)
+    if status_info is None:
+        raise HTTPException(status_code=404, detail="Status not found")
     
     # Handle failed status
     if status_info["status"] == "failed":
@@ -168,6 +164,14 @@ async def get_status(batch_id: str):
             error=status_info.get("error", "Unknown error")
         )
     
+    # Time left for the batch's files still in the pipeline, from per-stage latency histograms
+    eta_seconds = None
+    if status_info["status"] == "completed":
+        eta_seconds = 0.0
+    elif status_info["status"] != "cancelled":
+        from app.services.pipeline_engine import pipeline_engine
+        eta_seconds = pipeline_engine.estimate_eta(batch_id)
+    
     return StatusResponse(
         status=status_info["status"],
         batch_id=batch_id,
@@ -176,20 +180,88 @@ async def get_status(batch_id: str):
             "processed": status_info.get("processed", 0),
             "percentage": int((status_info.get("processed", 0) / status_info.get("total_files", 1)) * 100)
         },
-        current_file=status_info.get("current_file")
+        current_file=status_info.get("current_file"),
+        eta_seconds=eta_seconds
     )
 
+@router.delete("/batch/{batch_id}")
+async def cancel_batch(batch_id: str):
+    """Cancel a batch: queued files are dropped and in-flight Gemini calls are stopped"""
+    from app.services.pipeline_engine import pipeline_engine
+    from app.services.websocket_manager import websocket_manager
+    
+    files_list = await batch_storage.get(batch_id)
+    if files_list is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    cancelled = await pipeline_engine.cancel(batch_id)
+    
+    await processing_status.set(batch_id, {
+        "status": "cancelled",
+        "total_files": len(files_list),
+        "processed": len(files_list) - len(cancelled),
+        "current_file": None
+    })
+    
+    await websocket_manager.broadcast(batch_id, {
+        "type": "cancelled",
+        "batch_id": batch_id,
+        "file_ids": cancelled,
+        "message": f"Batch cancelled - {len(cancelled)} unfinished files stopped"
+    })
+    
+    app_logger.info(f"[PROCESS] Cancelled batch {batch_id}: {len(cancelled)} unfinished files")
+    
+    return {
+        "status": "cancelled",
+        "batch_id": batch_id,
+        "cancelled_files": len(cancelled),
+        "file_ids": cancelled
+    }
+
+@router.delete("/batch/{batch_id}/files/{file_id}")
+async def cancel_file(batch_id: str, file_id: str):
+    """Cancel one file of a batch; the rest keep processing"""
+    from app.services.pipeline_engine import pipeline_engine
+    from app.services.websocket_manager import websocket_manager
+    
+    files_list = await batch_storage.get(batch_id)
+    if files_list is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    file_info = next((f for f in files_list if f["file_id"] == file_id), None)
+    if file_info is None:
+        raise HTTPException(status_code=404, detail="File not found in batch")
+    
+    if not await pipeline_engine.cancel(batch_id, file_id):
+        raise HTTPException(status_code=409, detail="File is not queued or processing")
+    
+    await websocket_manager.broadcast(batch_id, {
+        "type": "cancelled",
+        "batch_id": batch_id,
+        "file_id": file_id,
+        "filename": file_info["filename"],
+        "status": "cancelled"
+    })
+    
+    app_logger.info(f"[PROCESS] Cancelled {file_info['filename']} in batch {batch_id}")
+    
+    return {
+        "status": "cancelled",
+        "batch_id": batch_id,
+        "file_id": file_id
+    }
+
 @router.get("/extracted-data/{batch_id}")
 async def get_extracted_data(batch_id: str):
     """Get all extracted data for a completed batch"""
     
-    with status_lock:
-        if batch_id not in processing_status:
-            raise HTTPException(status_code=404, detail="Batch not found")
-        
-        status_info = processing_status[batch_id]
-        if status_info["status"] != "completed":
-            raise HTTPException(status_code=400, detail=f"Batch is not completed. Current status: {status_info['status']}")
+    status_info = await processing_status.get(batch_id)
+    if status_info is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    if status_info["status"] != "completed":
+        raise HTTPException(status_code=400, detail=f"Batch is not completed. Current status: {status_info['status']}")
     
     # Get extracted data from data store
     from app.core.data_store import data_store
@@ -209,15 +281,15 @@ async def get_extracted_data(batch_id: str):
 async def get_file_status(batch_id: str):
     """Get individual file processing status"""
     
-    with file_lock:
-        if batch_id not in file_status:
-            raise HTTPException(status_code=404, detail="Batch not found")
-        
-        return {
-            "batch_id": batch_id,
-            "files": file_status[batch_id],
-            "queue_data": file_queue.get(batch_id, [])
-        }
+    files = await file_status.get(batch_id)
+    if files is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    return {
+        "batch_id": batch_id,
+        "files": files,
+        "queue_data": await file_queue.get(batch_id, [])
+    }
 
 @router.get("/saved-data/{batch_id}")
 async def get_saved_data(batch_id: str):
@@ -317,214 +389,118 @@ async def get_recent_batches():
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 @router.post("/start-individual-processing")
-async def start_individual_processing(
-    request: ProcessRequest,
-    background_tasks: BackgroundTasks
-):
+async def start_individual_processing(request: ProcessRequest):
     """Start individual file processing with queue updates"""
     
     batch_id = request.batch_id
     
-    if batch_id not in batch_storage:
+    if not await batch_storage.contains(batch_id):
         raise HTTPException(status_code=404, detail="Batch not found")
     
-    if batch_id not in validation_storage:
+    if not await validation_storage.contains(batch_id):
         raise HTTPException(status_code=400, detail="Files must be validated first")
     
-    # Initialize file status
-    with file_lock:
-        file_status[batch_id] = {}
-        file_queue[batch_id] = []
-        
-        for file_info in batch_storage[batch_id]:
-            file_status[batch_id][file_info['file_id']] = {
-                "filename": file_info['filename'],
-                "status": "pending",
-                "validation": None,
-                "extracted_data": None
-            }
-    
-    # Start individual processing
-    background_tasks.add_task(process_files_individually, batch_id)
+    # Start individual processing, or attach to the job already running for this batch
+    job, created = await start_individual_job(batch_id)
     
     return {
-        "status": "started",
+        "status": "started" if created else "attached",
         "batch_id": batch_id,
-        "message": "Individual file processing started"
+        "job_state": job["state"],
+        "message": "Individual file processing started" if created else f"Individual file processing already {job['state']}"
     }
 
+async def start_individual_job(batch_id: str):
+    """Start the batch's individual-processing job once, on whichever API worker asks first;
+    later callers, on any worker, get the existing job"""
+    return await job_registry.start(batch_id, "individual", lambda: process_files_individually(batch_id))
+
 async def process_files_individually(batch_id: str):
-    """Process files one by one and update queue with WebSocket updates"""
+    """Follow the batch through the pipeline engine, filling file status and the record queue as files finish"""
     
     try:
         from app.services.websocket_manager import websocket_manager
-        validation_results = validation_storage[batch_id]
-        
-        for file_info in batch_storage[batch_id]:
-            file_id = file_info['file_id']
-            
-            # Update to validating
-            with file_lock:
-                file_status[batch_id][file_id]["status"] = "validating"
-            
-            # WebSocket update - validation started
-            await websocket_manager.broadcast(batch_id, {
-                "type": "file_update",
-                "file_id": file_id,
+        from app.services.pipeline_engine import pipeline_engine
+
+        # Only the job's own run resets these, so a second tab or worker can't wipe or double its results
+        files_list = await batch_storage.get(batch_id)
+        await file_queue.set(batch_id, [])
+        await file_status.set(batch_id, {
+            file_info['file_id']: {
                 "filename": file_info['filename'],
-                "status": "validating",
-                "progress": 25
-            })
-            
-            app_logger.info(f"[VALIDATION] Starting validation for {file_info['filename']}")
-            await asyncio.sleep(2.0)  # Longer validation time for visibility
-            
-            # Check validation result
-            is_valid = False
-            validation_result = None
-            
-            for valid_card in validation_results['valid_business_cards']:
-                if valid_card['file_id'] == file_id:
-                    is_valid = True
-                    validation_result = valid_card['validation']
-                    break
-            
-            if not is_valid:
-                for invalid_file in validation_results['invalid_files']:
-                    if invalid_file['file_id'] == file_id:
-                        validation_result = invalid_file['validation']
-                        break
+                "status": "pending",
+                "validation": None,
+                "extracted_data": None
+            }
+            for file_info in files_list
+        })
+
+        # The engine broadcasts per-stage WebSocket updates; this only mirrors results into file_status/file_queue
+        async for result in pipeline_engine.wait_for_batch(batch_id, files_list):
+            file_id = result["file_id"]
+            extracted_records = result["records"] or []
             
-            with file_lock:
-                file_status[batch_id][file_id]["validation"] = validation_result
+            if result["status"] == "invalid":
+                status = "invalid"
+                app_logger.info(f"[INVALID] {result['filename']} marked as invalid business card")
+            elif result["status"] == "cancelled":
+                status = "cancelled"
+                app_logger.info(f"[CANCELLED] {result['filename']} cancelled")
+            elif result["status"] == "failed":
+                status = "error"
+                app_logger.error(f"[ERROR] Extraction failed for {result['filename']}: {result['error']}")
+            else:
+                status = "completed"
+                app_logger.info(f"[COMPLETED] {result['filename']} processed - {len(extracted_records)} cards extracted")
             
-            # WebSocket update - validation result
-            await websocket_manager.broadcast(batch_id, {
-                "type": "validation_result",
-                "file_id": file_id,
-                "filename": file_info['filename'],
-                "is_valid": is_valid,
-                "reasoning": validation_result.get('reasoning', '') if validation_result else ''
-            })
+            def record_file(files: dict) -> dict:
+                files[file_id]["validation"] = result["validation"]
+                files[file_id]["status"] = status
+                if status == "completed":
+                    files[file_id]["extracted_data"] = extracted_records or None
+                return files
             
-            app_logger.info(f"[VALIDATION] {file_info['filename']} validation result: {'VALID' if is_valid else 'INVALID'}")
-            await asyncio.sleep(1.0)  # Pause after validation
+            await file_status.update_item(batch_id, record_file)
             
-            if is_valid:
-                # Update to processing
-                with file_lock:
-                    file_status[batch_id][file_id]["status"] = "processing"
-                
-                # WebSocket update - extraction started
-                await websocket_manager.broadcast(batch_id, {
-                    "type": "file_update",
-                    "file_id": file_id,
-                    "filename": file_info['filename'],
-                    "status": "extracting",
-                    "progress": 50
-                })
-                
-                app_logger.info(f"[PROCESSING] Starting OCR extraction for {file_info['filename']}")
-                
-                # Real OCR extraction using Gemini service
-                try:
-                    from app.services.gemini_service import GeminiService
-                    gemini_service = GeminiService()
-                    
-                    # Extract data from the actual file
-                    extracted_records = await gemini_service.extract_document_data(file_info['file_path'])
-                    
-                    if extracted_records and len(extracted_records) > 0:
-                        # Process ALL extracted records from the image
-                        cards_added = 0
-                        with file_lock:
-                            file_status[batch_id][file_id]["status"] = "completed"
-                            file_status[batch_id][file_id]["extracted_data"] = extracted_records
-                            
-                            # Add each business card to queue
-                            for card_index, extracted_data in enumerate(extracted_records):
-                                file_queue[batch_id].append({
-                                    "file_id": f"{file_id}_card_{card_index + 1}",
-                                    "filename": f"{file_info['filename']} (Card {card_index + 1})",
-                                    "name": extracted_data.get("name", "N/A"),
-                                    "phone": extracted_data.get("phone", "N/A"),
-                                    "email": extracted_data.get("email", "N/A"),
-                                    "company": extracted_data.get("company", "N/A"),
-                                    "designation": extracted_data.get("designation", "N/A"),
-                                    "address": extracted_data.get("address", "N/A")
-                                })
-                                cards_added += 1
-                        
-                        # WebSocket update - extraction complete
-                        await websocket_manager.broadcast(batch_id, {
-                            "type": "extraction_complete",
-                            "file_id": file_id,
-                            "filename": file_info['filename'],
-                            "status": "completed",
-                            "progress": 100,
-                            "extracted_data": extracted_records[0] if extracted_records else {},
-                            "cards_count": cards_added
-                        })
-                        
-                        app_logger.info(f"[COMPLETED] {file_info['filename']} processed successfully - {cards_added} cards extracted")
-                    else:
-                        # No data extracted
-                        with file_lock:
-                            file_status[batch_id][file_id]["status"] = "completed"
-                            file_status[batch_id][file_id]["extracted_data"] = None
-                        
-                        app_logger.info(f"[COMPLETED] {file_info['filename']} processed but no business cards found")
-                        
-                except Exception as extract_error:
-                    app_logger.error(f"[ERROR] Extraction failed for {file_info['filename']}: {str(extract_error)}")
-                    with file_lock:
-                        file_status[batch_id][file_id]["status"] = "error"
-            else:
-                # Update to invalid
-                with file_lock:
-                    file_status[batch_id][file_id]["status"] = "invalid"
-                
-                # WebSocket update - invalid file
-                await websocket_manager.broadcast(batch_id, {
-                    "type": "file_update",
-                    "file_id": file_id,
-                    "filename": file_info['filename'],
-                    "status": "invalid",
-                    "progress": 100
-                })
-                
-                app_logger.info(f"[INVALID] {file_info['filename']} marked as invalid business card")
+            if status == "completed" and extracted_records:
+                # Add each business card to queue
+                cards = [{
+                    "file_id": f"{file_id}_card_{card_index + 1}",
+                    "filename": f"{result['filename']} (Card {card_index + 1})",
+                    **extracted_data
+                } for card_index, extracted_data in enumerate(extracted_records)]
+                await file_queue.update_item(batch_id, lambda queue: queue + cards, [])
+        
+        files = await file_status.get(batch_id)
+        queue = await file_queue.get(batch_id)
         
         # Mark batch as completed
-        with status_lock:
-            processing_status[batch_id] = {
-                "status": "completed",
-                "total_files": len(batch_storage[batch_id]),
-                "processed": len([f for f in file_status[batch_id].values() if f["status"] in ["completed", "invalid"]]),
-                "queue_size": len(file_queue[batch_id])
-            }
+        await processing_status.set(batch_id, {
+            "status": "completed",
+            "total_files": len(files_list),
+            "processed": len([f for f in files.values() if f["status"] in ["completed", "invalid"]]),
+            "queue_size": len(queue)
+        })
         
         # Store in data store for CSV export
         from app.core.data_store import data_store
-        data_store.store_batch_data(batch_id, file_queue[batch_id])
+        data_store.store_batch_data(batch_id, queue)
         
         # WebSocket update - batch complete
         await websocket_manager.broadcast(batch_id, {
             "type": "batch_complete",
             "batch_id": batch_id,
-            "total_files": len(batch_storage[batch_id]),
-            "completed_files": len([f for f in file_status[batch_id].values() if f["status"] == "completed"]),
-            "total_records": len(file_queue[batch_id]),
+            "total_files": len(files_list),
+            "completed_files": len([f for f in files.values() if f["status"] == "completed"]),
+            "total_records": len(queue),
             "download_url": f"/api/v1/download/{batch_id}"
         })
         
-        app_logger.info(f"[QUEUE] Batch {batch_id} completed with {len(file_queue[batch_id])} records in queue")
+        app_logger.info(f"[QUEUE] Batch {batch_id} completed with {len(queue)} records in queue")
         
     except Exception as e:
         app_logger.error(f"[QUEUE] Error processing batch {batch_id}: {str(e)}")
-        with status_lock:
-            processing_status[batch_id] = {
-                "status": "failed",
-                "error": str(e)
-            }
-
+        await processing_status.set(batch_id, {
+            "status": "failed",
+            "error": str(e)
+        })
@@ -0,0 +1,195 @@
+from fastapi import APIRouter, HTTPException, Request, Query
+from pydantic import BaseModel
+from typing import List, Optional
+from app.config import settings
+from app.models.schemas import UploadResponse, FileInfo
+from app.utils.file_validator import FileValidator
+from app.utils.file_manager import FileManager
+from app.services.upload_session_manager import upload_session_manager, ChunkTooLarge
+from app.services.queue_manager import queue_manager
+from app.services.websocket_manager import websocket_manager
+from app.services.pipeline_engine import pipeline_engine
+from app.services.quality_gate import quality_gate
+from app.core.admission import admission_controller
+from app.core.fair_scheduler import BULK
+from app.routers.upload import batch_storage
+from app.utils.logger import app_logger
+
+router = APIRouter(prefix="/api/v1", tags=["upload"])
+
+class ResumableFileRequest(BaseModel):
+    filename: str
+    size: int
+    content_type: Optional[str] = None
+
+class CreateUploadRequest(BaseModel):
+    files: List[ResumableFileRequest] = []
+
+@router.post("/uploads")
+async def create_upload(request: CreateUploadRequest):
+    """Create a resumable upload batch, optionally declaring its files up front"""
+    _admit(len(request.files))
+
+    batch_id = FileManager.generate_batch_id()
+    await upload_session_manager.create_session(batch_id)
+
+    # Batch is queued immediately so files can start processing as they complete
+    await batch_storage.create(batch_id)
+    await queue_manager.initialize_batch(batch_id, [])
+
+    declared = [await _register_file(batch_id, f) for f in request.files]
+
+    app_logger.info(f"[RESUMABLE] Created batch {batch_id} with {len(declared)} declared files")
+
+    return {
+        "batch_id": batch_id,
+        "files": declared,
+        "max_chunk_size": settings.RESUMABLE_MAX_CHUNK_MB * 1024 * 1024,
+        "message": f"Upload session created. WebSocket: ws://localhost:8000/ws/{batch_id}"
+    }
+
+@router.post("/uploads/{batch_id}/files")
+async def add_upload_file(batch_id: str, request: ResumableFileRequest):
+    """Declare another file in an open upload batch"""
+    await _require_open_session(batch_id)
+    _admit(1)
+    return await _register_file(batch_id, request)
+
+@router.get("/uploads/{batch_id}")
+async def get_upload_status(batch_id: str):
+    """Get received byte ranges for every file in the batch"""
+    session = await upload_session_manager.get_session(batch_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload batch not found")
+    return session
+
+@router.get("/uploads/{batch_id}/files/{file_id}")
+async def get_upload_file_status(batch_id: str, file_id: str):
+    """Get received byte ranges for one file so the client can resume"""
+    status = await upload_session_manager.get_file_status(batch_id, file_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="File not found in upload batch")
+    return status
+
+@router.put("/uploads/{batch_id}/files/{file_id}")
+async def upload_chunk(batch_id: str, file_id: str, request: Request, offset: int = Query(..., ge=0)):
+    """Write one chunk of a file at the given byte offset"""
+    await _require_open_session(batch_id)
+
+    file_entry = await upload_session_manager.get_file(batch_id, file_id)
+    if not file_entry:
+        raise HTTPException(status_code=404, detail="File not found in upload batch")
+
+    content_length = request.headers.get("content-length")
+    max_chunk_bytes = settings.RESUMABLE_MAX_CHUNK_MB * 1024 * 1024
+    if content_length and int(content_length) > max_chunk_bytes:
+        raise HTTPException(status_code=413, detail=f"Chunk exceeds {settings.RESUMABLE_MAX_CHUNK_MB}MB limit")
+
+    if offset >= file_entry["size"]:
+        raise HTTPException(status_code=400, detail=f"Offset {offset} is past end of file ({file_entry['size']} bytes)")
+
+    try:
+        status, completed = await upload_session_manager.write_chunk(
+            batch_id, file_id, offset, request.stream(), max_chunk_bytes
+        )
+    except ChunkTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException as e:
+        app_logger.error(f"[RESUMABLE] Rejected {file_entry['filename']} in batch {batch_id}: {e.detail}")
+        # The rejected file may have been the last one outstanding
+        await _submit_deferred(batch_id)
+        raise
+
+    if completed:
+        # File is whole - hand it to the processing queue right away (it was admitted when declared)
+        file_info = next(f for f in await upload_session_manager.completed_files(batch_id) if f["file_id"] == file_id)
+        # Flag an unreadable photo while the rest of the batch is still uploading
+        await quality_gate.inspect(batch_id, file_info)
+        await batch_storage.append(batch_id, file_info)
+        await queue_manager.add_file(batch_id, file_info)
+        if not quality_gate.deferred(file_info):
+            await pipeline_engine.submit(batch_id, file_info, BULK)
+
+        app_logger.info(f"[RESUMABLE] {file_info['filename']} complete in batch {batch_id}, queued")
+
+        await websocket_manager.broadcast(batch_id, {
+            "type": "file_uploaded",
+            "file_id": file_id,
+            "filename": file_info["filename"],
+            "size": file_info["size"]
+        })
+        # The client holds the batch_id from the start, so it can be watching for this
+        await quality_gate.warn(batch_id, file_info)
+        await _submit_deferred(batch_id)
+
+    return status
+
+@router.post("/uploads/{batch_id}/finalize", response_model=UploadResponse)
+async def finalize_upload(batch_id: str):
+    """Close the upload batch once every declared file has been received"""
+    await _require_open_session(batch_id)
+
+    try:
+        session = await upload_session_manager.finalize(batch_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    uploaded_files = await upload_session_manager.completed_files(batch_id)
+    await _submit_deferred(batch_id)
+
+    app_logger.info(f"[RESUMABLE] Finalized batch {batch_id}: {len(uploaded_files)} files, {session['total_bytes'] / (1024 * 1024):.1f}MB")
+
+    return UploadResponse(
+        status="success",
+        batch_id=batch_id,
+        uploaded_files=[FileInfo(**f) for f in uploaded_files],
+        total_count=len(uploaded_files),
+        message=f"Files uploaded successfully. WebSocket: ws://localhost:8000/ws/{batch_id}"
+    )
+
+def _admit(incoming: int) -> None:
+    """Turn declared files away (429 + Retry-After) before any of their bytes are sent, while the
+    backlog is too deep to finish them in time - once a file is whole it goes straight to the pipeline"""
+    try:
+        admission_controller.admit(incoming, BULK)
+    except HTTPException as e:
+        app_logger.warning(f"[RESUMABLE] Rejected {incoming} declared files: {e.detail}")
+        raise
+
+async def _submit_deferred(batch_id: str) -> None:
+    """Once no declared file is still uploading, queue the flagged photos held back until then -
+    last, as /upload does. Repeat submits of a file already in the pipeline are ignored"""
+    session = await upload_session_manager.get_session(batch_id)
+    if not session or any(f["status"] not in ("completed", "rejected") for f in session["files"]):
+        return
+    for file_info in await batch_storage.get(batch_id, []):
+        if quality_gate.deferred(file_info):
+            await pipeline_engine.submit(batch_id, file_info, BULK)
+
+async def _require_open_session(batch_id: str) -> None:
+    session = await upload_session_manager.get_session(batch_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload batch not found")
+    if session["finalized"]:
+        raise HTTPException(status_code=409, detail="Upload batch already finalized")
+
+async def _register_file(batch_id: str, request: ResumableFileRequest) -> dict:
+    """Validate a declared file against limits and reserve it in the session"""
+    if not FileValidator.validate_file_extension(request.filename):
+        raise HTTPException(status_code=400, detail=f"Invalid file type: {request.filename}")
+
+    if request.size <= 0 or request.size > settings.MAX_FILE_SIZE_MB * 1024 * 1024:
+        raise HTTPException(status_code=400, detail=f"File {request.filename} must be between 1 byte and {settings.MAX_FILE_SIZE_MB}MB")
+
+    file_id = FileManager.generate_file_id()
+    try:
+        # The session checks its file count and byte total as it reserves the file
+        return await upload_session_manager.register_file(
+            batch_id, file_id, request.filename, request.size, request.content_type,
+            max_files=settings.MAX_FILES_PER_BATCH,
+            max_total_bytes=settings.RESUMABLE_MAX_BATCH_SIZE_MB * 1024 * 1024
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
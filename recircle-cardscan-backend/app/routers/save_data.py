@@ -3,11 +3,13 @@ from pydantic import BaseModel
 from typing import List
 import mysql.connector
 from app.config import settings
+from app.core.resource_manager import resource_manager
+from app.core.state_backend import SharedDict
 
 router = APIRouter(prefix="/api/v1", tags=["save-data"])
 
-# Store last request data for download fallback
-last_request_data = {}
+# Store last request data for download fallback (under "last", shared by every API worker)
+save_requests = SharedDict("save_requests")
 
 class SaveDataRequest(BaseModel):
     name: str
@@ -26,11 +28,10 @@ async def save_data(request: SaveDataRequest):
         print(f"[SAVE] Attempting to save data for batch {request.batch_id}")
         
         # Store request data for download fallback
-        global last_request_data
-        last_request_data = {
+        await save_requests.set("last", {
             'batch_id': request.batch_id,
             'extracted_data': request.extracted_data
-        }
+        })
         
         conn = mysql.connector.connect(
             host=settings.DB_HOST,
@@ -62,6 +63,9 @@ async def save_data(request: SaveDataRequest):
             ))
             print(f"[SAVE] Inserted event data for batch {request.batch_id}")
         
+        # Later processing of this batch is scheduled with the team's weight
+        resource_manager.set_batch_team(request.batch_id, request.team)
+        
         # Insert extracted business card data with duplicate prevention
         card_query = """
         INSERT INTO business_cards (batch_id, name, phone, email, company, designation, address)
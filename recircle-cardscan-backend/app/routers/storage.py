@@ -0,0 +1,11 @@
+import asyncio
+from fastapi import APIRouter
+from app.services.storage_lifecycle import storage_lifecycle
+
+router = APIRouter(prefix="/api/v1", tags=["storage"])
+
+@router.get("/storage/stats")
+async def get_storage_stats():
+    """Get storage usage against the quota and eviction counts"""
+    # Sizes every staged file and queries both indexes - keep that off the event loop
+    return await asyncio.to_thread(storage_lifecycle.get_stats)
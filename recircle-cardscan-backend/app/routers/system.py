@@ -0,0 +1,26 @@
+from fastapi import APIRouter
+from app.core.resource_manager import resource_manager
+from app.core.admission import admission_controller
+from app.core.stage_metrics import stage_metrics
+
+router = APIRouter(prefix="/api/v1", tags=["system"])
+
+@router.get("/system/stats")
+async def get_system_stats():
+    """Get slot usage, scheduler queues and the concurrency limit"""
+    return resource_manager.get_system_stats()
+
+@router.get("/system/concurrency")
+async def get_concurrency():
+    """Get the adaptive concurrency limit, call outcomes and its recent decisions"""
+    return resource_manager.file_limiter.snapshot()
+
+@router.get("/system/stage-latency")
+async def get_stage_latency():
+    """Get rolling latency histograms and percentiles per stage"""
+    return stage_metrics.snapshot()
+
+@router.get("/capacity")
+async def get_capacity():
+    """Get current throughput, backlog and whether bulk work is being admitted"""
+    return admission_controller.capacity()
\ No newline at end of file
@@ -1,27 +1,39 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import List
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+from typing import List, Optional
 from app.models.schemas import UploadResponse, FileInfo, ValidationResult
 from app.utils.file_validator import FileValidator
 from app.utils.file_manager import FileManager
-from app.services.business_card_validator import BusinessCardValidator
+from app.services.queue_manager import queue_manager
+from app.services.pipeline_engine import pipeline_engine
+from app.core.fair_scheduler import INTERACTIVE, BULK, PRIORITIES
+from app.core.admission import admission_controller
+from app.services.archive_extractor import ArchiveExtractor
+from app.services.quality_gate import quality_gate
+from app.core.state_backend import SharedDict, SharedList
+from app.config import settings
 from app.utils.logger import app_logger
 
 router = APIRouter(prefix="/api/v1", tags=["upload"])
 
-# In-memory storage for batch files
-batch_storage = {}
-# Storage for validation results
-validation_storage = {}
+# Batch files (one backend entry per file) and validation results, shared by every API worker
+batch_storage = SharedList("batches", "file_id")
+validation_storage = SharedDict("validations")
 
 @router.post("/upload", response_model=UploadResponse)
-async def upload_files(files: List[UploadFile] = File(...)):
-    """Upload multiple files (max 100)"""
+async def upload_files(files: List[UploadFile] = File(...), priority: Optional[str] = Query(None)):
+    """Upload multiple files (max 100)
+
+    A single image or PDF (e.g. a camera capture) is interactive work, processed ahead of queued
+    bulk batches; anything larger is bulk. The class is decided here - a client may pass
+    priority="bulk" to give up the interactive path, but asking for "interactive" on a larger
+    upload is downgraded to bulk.
+    """
     
     try:
         app_logger.info(f"[UPLOAD] Starting upload: {len(files)} files")
         
-        # Validate batch size and total size
-        await FileValidator.validate_batch_size(files)
+        # Validate file count (sizes are enforced while streaming)
+        FileValidator.validate_batch_size(files)
         app_logger.info(f"[UPLOAD] Batch validation passed")
     except HTTPException as e:
         app_logger.error(f"[UPLOAD] Batch validation failed: {str(e.detail)}")
@@ -30,48 +42,123 @@ async def upload_files(files: List[UploadFile] = File(...)):
         app_logger.error(f"[UPLOAD] Unexpected error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
     
+    # Validate file extensions before writing anything
+    for file in files:
+        if not FileValidator.validate_file_extension(file.filename) and not ArchiveExtractor.is_archive(file.filename):
+            app_logger.error(f"[UPLOAD] Invalid file type: {file.filename}")
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid file type: {file.filename}"
+            )
+    
+    if priority is not None and priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of: {', '.join(PRIORITIES)}")
+    single_capture = len(files) == 1 and not ArchiveExtractor.is_archive(files[0].filename)
+    if priority == INTERACTIVE and not single_capture:
+        app_logger.info(f"[UPLOAD] Interactive priority requested for {len(files)} files, queuing as bulk")
+    priority = INTERACTIVE if single_capture and priority != BULK else BULK
+    
+    # Turn work away (429 + Retry-After) while the backlog is too deep to finish it in time. Archives
+    # are admitted once expanded, when their member count is known
+    _admit(sum(1 for f in files if not ArchiveExtractor.is_archive(f.filename)), priority)
+    
     # Generate batch ID
     batch_id = FileManager.generate_batch_id()
     app_logger.info(f"[UPLOAD] Batch ID: {batch_id}")
     uploaded_files = []
+    batch_bytes = 0
     
     # Skip database batch creation
     
-    for file in files:
-        # Validate file extension
-        if not FileValidator.validate_file_extension(file.filename):
-            app_logger.error(f"[UPLOAD] Invalid file type: {file.filename}")
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid file type: {file.filename}"
-            )
-        
-        # Generate unique file ID
-        file_id = FileManager.generate_file_id()
+    # Register the batch up front so each file can start processing as soon as it is saved
+    await batch_storage.create(batch_id)
+    await queue_manager.initialize_batch(batch_id, [])
+    
+    # Photos that look unreadable, held back until the rest of the upload is queued
+    deferred = []
+    
+    try:
+        for file in files:
+            if ArchiveExtractor.is_archive(file.filename):
+                # Each member is saved and queued as its own file while the archive is still being read,
+                # then the members go to the pipeline once admission has seen how many there are
+                remaining = settings.MAX_FILES_PER_BATCH - len(uploaded_files)
+                members = []
+                async for file_info in ArchiveExtractor.extract(file, batch_id, remaining):
+                    await quality_gate.inspect(batch_id, file_info)
+                    uploaded_files.append(file_info)
+                    members.append(file_info)
+                    await batch_storage.append(batch_id, file_info)
+                    await queue_manager.add_file(batch_id, file_info)
+                
+                _admit(len(members), priority)
+                for file_info in members:
+                    if quality_gate.deferred(file_info):
+                        deferred.append(file_info)
+                    else:
+                        await pipeline_engine.submit(batch_id, file_info, priority)
+                continue
+            
+            # Generate unique file ID
+            file_id = FileManager.generate_file_id()
+            
+            # Stream file to disk, aborting as soon as a size limit is crossed
+            file_info = await FileManager.save_uploaded_file(file, file_id, batch_id, batch_bytes)
+            batch_bytes += file_info["size"]
+            
+            # Score blur, glare and exposure now, so a bad photo is flagged while it can still be reshot
+            await quality_gate.inspect(batch_id, file_info)
+            uploaded_files.append(file_info)
+            await batch_storage.append(batch_id, file_info)
+            
+            # Hand the file to the pipeline while the rest are still being written
+            await queue_manager.add_file(batch_id, file_info)
+            if quality_gate.deferred(file_info):
+                deferred.append(file_info)
+            else:
+                await pipeline_engine.submit(batch_id, file_info, priority)
+            
+            # Skip database record creation
         
-        # Save file
-        file_info = await FileManager.save_uploaded_file(file, file_id)
-        uploaded_files.append(file_info)
+        # Flagged photos go last, behind interactive scans too
+        for file_info in deferred:
+            await pipeline_engine.submit(batch_id, file_info, BULK)
+    except HTTPException as e:
+        app_logger.error(f"[UPLOAD] Aborted: {str(e.detail)}")
         
-        # Skip database record creation
-    
-    # Store in memory
-    batch_storage[batch_id] = uploaded_files
+        # Stop work already started and release files stored for this batch
+        await pipeline_engine.forget_batch(batch_id)
+        await batch_storage.pop(batch_id)
+        FileManager.cleanup_temp_files(batch_id)
+        raise
     
-    # Initialize queue with uploaded files
-    from app.services.queue_manager import queue_manager
-    queue_manager.initialize_batch(batch_id, uploaded_files)
+    app_logger.info(f"[UPLOAD] Stored {batch_bytes / (1024 * 1024):.1f}MB for batch {batch_id}")
     
     app_logger.info(f"[UPLOAD] Completed: {len(uploaded_files)} files uploaded and queued")
     
+    # Everything is in the backlog now, so its drain time is the prediction for this batch
+    admission = admission_controller.check(0, priority)
+    
     return UploadResponse(
         status="success",
         batch_id=batch_id,
         uploaded_files=[FileInfo(**f) for f in uploaded_files],
         total_count=len(uploaded_files),
-        message=f"Files uploaded successfully. WebSocket: ws://localhost:8000/ws/{batch_id}"
+        message=f"Files uploaded successfully. WebSocket: ws://localhost:8000/ws/{batch_id}",
+        predicted_completion_seconds=admission["predicted_completion_seconds"],
+        predicted_completion_at=admission["predicted_completion_at"],
+        # Nobody can be subscribed yet - the client learns the batch_id from this response
+        quality_warnings=[w for w in map(quality_gate.warning, uploaded_files) if w]
     )
 
+def _admit(incoming: int, priority: str) -> None:
+    """Raise 429 with Retry-After unless the backlog has room for incoming more files"""
+    try:
+        admission_controller.admit(incoming, priority)
+    except HTTPException as e:
+        app_logger.warning(f"[UPLOAD] Rejected {incoming} files: {e.detail}")
+        raise
+
 @router.post("/validate/{batch_id}")
 async def validate_batch(batch_id: str):
     """Validate uploaded files for business card detection"""
@@ -79,21 +166,16 @@ async def validate_batch(batch_id: str):
     app_logger.info(f"[VALIDATION] Starting validation for batch {batch_id}")
     
     # Check if batch exists
-    if batch_id not in batch_storage:
+    files_list = await batch_storage.get(batch_id)
+    if files_list is None:
         app_logger.error(f"[VALIDATION] Batch not found: {batch_id}")
         raise HTTPException(status_code=404, detail="Batch not found")
     
-    files_list = batch_storage[batch_id]
-    files_list = batch_storage[batch_id]
-    
-    # Initialize validator
-    validator = BusinessCardValidator()
-    
-    # Validate all files
-    validation_results = await validator.validate_batch(files_list)
+    # Files are validated by the pipeline as they land - collect those results
+    validation_results = await pipeline_engine.wait_for_validation(batch_id, files_list)
     
     # Store validation results
-    validation_storage[batch_id] = validation_results
+    await validation_storage.set(batch_id, validation_results)
     
     # Log validation summary
     valid_count = validation_results['validation_summary']['valid_cards']
@@ -101,23 +183,15 @@ async def validate_batch(batch_id: str):
     app_logger.info(f"[VALIDATION] Results: {valid_count} valid, {invalid_count} invalid")
     
     # Update file info with validation results and save to database
-    for file_info in files_list:
-        validation_result = None
-        
-        # Find validation result for this file
-        for valid_card in validation_results['valid_business_cards']:
-            if valid_card['file_id'] == file_info['file_id']:
-                validation_result = ValidationResult(**valid_card['validation'])
-                file_info['validation'] = validation_result
-                break
-        
-        for invalid_file in validation_results['invalid_files']:
-            if invalid_file['file_id'] == file_info['file_id']:
-                validation_result = ValidationResult(**invalid_file['validation'])
-                file_info['validation'] = validation_result
-                break
-        
-        # Skip database validation update
+    results_by_file = {
+        result['file_id']: {'validation': ValidationResult(**result['validation']).model_dump()}
+        for result in validation_results['valid_business_cards'] + validation_results['invalid_files']
+    }
+    
+    # Entries read from batch_storage are copies - write the results back to each file's entry
+    await batch_storage.merge_items(batch_id, results_by_file)
+    
+    # Skip database validation update
     
     # Skip batch status update
     
@@ -137,11 +211,12 @@ async def get_validation_status(batch_id: str):
     """Get validation results for a batch"""
     
     app_logger.info(f"[VALIDATION-STATUS] Checking status for batch {batch_id}")
-    app_logger.info(f"[VALIDATION-STATUS] Available batches: {list(validation_storage.keys())}")
+    app_logger.info(f"[VALIDATION-STATUS] Available batches: {await validation_storage.keys()}")
     
-    if batch_id not in validation_storage:
+    validation_results = await validation_storage.get(batch_id)
+    if validation_results is None:
         app_logger.error(f"[VALIDATION-STATUS] Batch not found: {batch_id}")
         raise HTTPException(status_code=404, detail=f"Validation results not found for batch {batch_id}")
     
     app_logger.info(f"[VALIDATION-STATUS] Returning results for batch {batch_id}")
-    return validation_storage[batch_id]
\ No newline at end of file
+    return validation_results
\ No newline at end of file
@@ -1,8 +1,7 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from app.services.websocket_manager import websocket_manager
 from app.routers.upload import batch_storage, validation_storage
-from app.routers.process import process_files_individually
-import asyncio
+from app.routers.process import start_individual_job
 
 router = APIRouter(tags=["websocket"])
 
@@ -15,9 +14,9 @@ async def websocket_endpoint(websocket: WebSocket, batch_id: str):
         # Send initial status
         await websocket_manager.send_initial_status(batch_id, websocket)
         
-        # Auto-start existing processing workflow
-        if batch_id in batch_storage and batch_id in validation_storage:
-            asyncio.create_task(process_files_individually(batch_id))
+        # Auto-start existing processing workflow (reconnects and extra tabs attach to the same job)
+        if await batch_storage.contains(batch_id) and await validation_storage.contains(batch_id):
+            await start_individual_job(batch_id)
         
         # Keep connection alive
         while True:
@@ -27,8 +26,8 @@ async def websocket_endpoint(websocket: WebSocket, batch_id: str):
                     await websocket.send_text("pong")
                 elif data == "start_processing":
                     # Client can manually trigger processing
-                    if batch_id in batch_storage and batch_id in validation_storage:
-                        asyncio.create_task(process_files_individually(batch_id))
+                    if await batch_storage.contains(batch_id) and await validation_storage.contains(batch_id):
+                        await start_individual_job(batch_id)
             except:
                 break
                 
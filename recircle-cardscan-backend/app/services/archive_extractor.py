@@ -0,0 +1,151 @@
+import os
+import asyncio
+import hashlib
+import tarfile
+import zipfile
+from fastapi import UploadFile, HTTPException
+from typing import AsyncIterator, Dict, Optional, Tuple
+from app.config import settings
+from app.core.stage_metrics import stage_metrics
+from app.utils.file_manager import FileManager, UPLOAD_CHUNK_SIZE
+from app.utils.file_validator import FileValidator
+from app.utils.logger import app_logger
+
+class ArchiveExtractor:
+    """Streams members out of ZIP/tar uploads one at a time, with zip-bomb limits"""
+
+    @staticmethod
+    def is_archive(filename: str) -> bool:
+        """Check if filename is a supported archive type"""
+        name = filename.lower()
+        return any(name.endswith(f".{ext}") for ext in settings.archive_extensions_list)
+
+    @staticmethod
+    async def extract(file: UploadFile, batch_id: str, max_members: int) -> AsyncIterator[Dict]:
+        """Yield a saved file_info dict for each supported member as soon as it is written"""
+        archive_file = file.file
+        archive_file.seek(0, os.SEEK_END)
+        archive_size = max(archive_file.tell(), 1)
+        archive_file.seek(0)
+
+        # Shared across members so the whole archive is held to the limits
+        totals = {"members": 0, "bytes": 0, "archive_size": archive_size, "max_members": max_members, "batch_id": batch_id}
+
+        if zipfile.is_zipfile(archive_file):
+            archive_file.seek(0)
+            with zipfile.ZipFile(archive_file) as zf:
+                # The central directory lists every entry up front, so an oversized archive is refused unread
+                entries = zf.infolist()
+                if len(entries) > settings.ARCHIVE_MAX_ENTRIES:
+                    raise HTTPException(status_code=400, detail=f"Archive has more than {settings.ARCHIVE_MAX_ENTRIES} entries")
+                for info in entries:
+                    if info.is_dir():
+                        continue
+                    with zf.open(info) as member:
+                        file_info = await ArchiveExtractor._save_member(member, info.filename, totals)
+                    if file_info:
+                        yield file_info
+        else:
+            archive_file.seek(0)
+            try:
+                # Pipe mode reads the tar strictly front to back, never seeking
+                with tarfile.open(fileobj=archive_file, mode="r|*") as tf:
+                    members = iter(tf)
+                    entries = 0
+                    while True:
+                        # Reaching the next header reads through (and decompresses) the previous member
+                        info = await asyncio.to_thread(next, members, None)
+                        if info is None:
+                            break
+                        # A tar has no index, so entries are counted as their headers stream past
+                        entries += 1
+                        if entries > settings.ARCHIVE_MAX_ENTRIES:
+                            raise HTTPException(status_code=400, detail=f"Archive has more than {settings.ARCHIVE_MAX_ENTRIES} entries")
+                        if not info.isfile():
+                            continue
+                        member = tf.extractfile(info)
+                        file_info = await ArchiveExtractor._save_member(member, info.name, totals)
+                        if file_info:
+                            yield file_info
+            except tarfile.TarError as e:
+                raise HTTPException(status_code=400, detail=f"Unreadable archive {file.filename}: {e}")
+
+        app_logger.info(f"[ARCHIVE] {file.filename}: extracted {totals['members']} files, {totals['bytes'] / (1024 * 1024):.1f}MB")
+
+    @staticmethod
+    async def _save_member(stream, member_name: str, totals: Dict) -> Optional[Dict]:
+        """Stream one member to disk, checking magic bytes and bomb limits as bytes arrive"""
+        filename = os.path.basename(member_name)
+        if not filename or filename.startswith('.') or '__MACOSX' in member_name:
+            return None
+
+        first_chunk = await asyncio.to_thread(stream.read, UPLOAD_CHUNK_SIZE)
+        file_type = FileValidator.detect_file_type(first_chunk)
+        if not file_type:
+            app_logger.info(f"[ARCHIVE] Skipping unsupported member: {member_name}")
+            return None
+
+        totals["members"] += 1
+        if totals["members"] > totals["max_members"]:
+            raise HTTPException(status_code=400, detail=f"Archive exceeds {totals['max_members']} file limit")
+
+        file_id = FileManager.generate_file_id()
+        file_path = FileManager.incoming_path(file_id, filename)
+
+        try:
+            # Decompression is blocking CPU work - run the whole copy off the event loop
+            size, sha256 = await asyncio.to_thread(
+                ArchiveExtractor._write_member, stream, first_chunk, file_path, filename, totals
+            )
+        except Exception:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+
+        try:
+            with stage_metrics.timer("probe"):
+                probe = FileValidator.probe_file(file_path, filename)
+        except HTTPException as e:
+            # One bad scan shouldn't sink the whole archive
+            app_logger.info(f"[ARCHIVE] Skipping {member_name}: {e.detail}")
+            os.remove(file_path)
+            totals["members"] -= 1
+            return None
+
+        return FileManager.store_blob({
+            "file_id": file_id,
+            "filename": filename,
+            "file_type": probe["file_type"],
+            "size": size,
+            "sha256": sha256,
+            "file_path": file_path,
+            "probe": probe
+        }, totals["batch_id"])
+
+    @staticmethod
+    def _write_member(stream, chunk: bytes, file_path: str, filename: str, totals: Dict) -> Tuple[int, str]:
+        """Copy a member to file_path starting from its first chunk, enforcing the bomb limits; returns (size, sha256)"""
+        max_file_bytes = settings.MAX_FILE_SIZE_MB * 1024 * 1024
+        max_total_bytes = settings.ARCHIVE_MAX_TOTAL_MB * 1024 * 1024
+        sha256 = hashlib.sha256()
+        size = 0
+
+        with open(file_path, 'wb') as out_file:
+            while chunk:
+                size += len(chunk)
+                totals["bytes"] += len(chunk)
+
+                if size > max_file_bytes:
+                    raise HTTPException(status_code=400, detail=f"Archive member {filename} exceeds {settings.MAX_FILE_SIZE_MB}MB limit")
+                if totals["bytes"] > max_total_bytes:
+                    raise HTTPException(status_code=400, detail=f"Archive expands past {settings.ARCHIVE_MAX_TOTAL_MB}MB limit")
+
+                # Everything extracted so far against the archive's size - the one ratio a compressed
+                # tar stream has, applied to zips too so both formats are held to the same limit
+                if totals["bytes"] / totals["archive_size"] > settings.ARCHIVE_MAX_RATIO:
+                    raise HTTPException(status_code=400, detail=f"Archive exceeds {settings.ARCHIVE_MAX_RATIO}x compression ratio at {filename}")
+
+                sha256.update(chunk)
+                out_file.write(chunk)
+                chunk = stream.read(UPLOAD_CHUNK_SIZE)
+        return size, sha256.hexdigest()
@@ -1,9 +1,13 @@
+import asyncio
 import google.generativeai as genai
 from PIL import Image
 from app.config import settings
 from typing import Dict, List
 import json
 from app.utils.logger import app_logger
+from app.core.resource_manager import resource_manager
+from app.core.image_pool import image_pool
+from app.utils.image_ops import to_rgb
 
 class BusinessCardValidator:
     
@@ -17,9 +21,9 @@ class BusinessCardValidator:
             pass
             image = Image.open(image_path)
             
-            # Convert to RGB if needed
+            # Convert to RGB if needed (an RGB file is sent as-is, without decoding it)
             if image.mode != 'RGB':
-                image = image.convert('RGB')
+                image = await image_pool.blob(to_rgb, image_path)
             
             prompt = """
 Analyze the uploaded image and determine if it is a business card.
@@ -51,12 +55,27 @@ Information Found: [List if applicable]
                 "max_output_tokens": 1024,
             }
             
-            pass
-            response = self.model.generate_content(
-                [prompt, image],
-                generation_config=generation_config
-            )
-            pass
+            # Retry rate-limited calls - the adaptive concurrency limit probes up to the quota
+            max_retries = 3
+            retry_delay = 2
+            
+            for attempt in range(max_retries):
+                try:
+                    response = await self.model.generate_content_async(
+                        [prompt, image],
+                        generation_config=generation_config
+                    )
+                    break
+                except Exception as e:
+                    # 429s and timeouts lower the concurrency limit
+                    resource_manager.record_api_error(e)
+                    if "429" in str(e) or "quota" in str(e).lower():
+                        if attempt < max_retries - 1:
+                            app_logger.warning(f"[VALIDATOR] Rate limit hit, retrying in {retry_delay} seconds")
+                            await asyncio.sleep(retry_delay)
+                            retry_delay *= 2
+                            continue
+                    raise
             
             # Parse the response
             response_text = response.text.strip()
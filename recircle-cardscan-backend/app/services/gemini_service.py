@@ -1,13 +1,16 @@
+import asyncio
+from functools import partial
 import google.generativeai as genai
-from PIL import Image, ImageEnhance, ImageFilter
+from PIL import Image
 import base64
 import io
 from app.config import settings
 from typing import Dict, Optional, List
 import json
 from app.services.gemini_memory import GeminiMemoryManager
-import numpy as np
-import cv2
+from app.core.resource_manager import resource_manager
+from app.core.image_pool import image_pool
+from app.utils.image_ops import enhance_for_ocr
 
 
 class GeminiService:
@@ -17,16 +20,17 @@ class GeminiService:
         self.model = genai.GenerativeModel(settings.GEMINI_MODEL)
         self.memory = GeminiMemoryManager()
     
-    async def extract_document_data(self, image_path: str, custom_prompt_id: str = None) -> list:
+    async def extract_document_data(self, image_path: str, custom_prompt_id: str = None,
+                                    enhancement_steps: Optional[List[str]] = None) -> list:
         """Extract structured data from business card using dynamic prompts"""
         if custom_prompt_id:
             return await self.extract_with_memory_prompt(image_path, custom_prompt_id)
         else:
-            return await self.extract_business_card_data(image_path)
+            return await self.extract_business_card_data(image_path, enhancement_steps)
     
 
     
-    async def extract_business_card_data(self, image_path: str) -> list:
+    async def extract_business_card_data(self, image_path: str, enhancement_steps: Optional[List[str]] = None) -> list:
         """Extract structured data from business card using stored prompt from Gemini memory"""
         try:
             # Try to get prompt from memory first
@@ -37,7 +41,7 @@ class GeminiService:
             
             print("⚠️ No stored prompt found, using hardcoded prompt")
             # Load and enhance image
-            image = self._enhance_image_for_ocr(image_path)
+            image = await self._enhance_image_for_ocr(image_path, enhancement_steps)
             
             # Create enhanced prompt for better data extraction
             prompt = """
@@ -247,22 +251,23 @@ NOW ANALYZE THE IMAGE AND RETURN ONLY THE JSON ARRAY OUTPUT.
             }
             
             # Add retry logic for rate limiting
-            import time
             max_retries = 3
             retry_delay = 2
             
             for attempt in range(max_retries):
                 try:
-                    response = self.model.generate_content(
+                    response = await self.model.generate_content_async(
                         [prompt, image],
                         generation_config=generation_config
                     )
                     break
                 except Exception as e:
+                    # 429s and timeouts lower the concurrency limit
+                    resource_manager.record_api_error(e)
                     if "429" in str(e) or "quota" in str(e).lower():
                         if attempt < max_retries - 1:
                             print(f"Rate limit hit, retrying in {retry_delay} seconds...")
-                            time.sleep(retry_delay)
+                            await asyncio.sleep(retry_delay)
                             retry_delay *= 2  # Exponential backoff
                             continue
                     raise e
@@ -356,30 +361,17 @@ NOW ANALYZE THE IMAGE AND RETURN ONLY THE JSON ARRAY OUTPUT.
         
         return ','.join(phones) if phones else 'N/A'
     
-    def _enhance_image_for_ocr(self, image_path: str) -> Image.Image:
-        """Enhance image brightness, contrast, and sharpness for better OCR"""
+    async def _enhance_image_for_ocr(self, image_path: str, steps: Optional[List[str]] = None):
+        """Enhance image brightness, contrast, and sharpness for better OCR (only the given steps, if any)"""
+        if steps is not None and not steps:
+            # Already clean - the original file goes as it is, without a decode or re-encode
+            print("✅ Image needs no enhancement")
+            return Image.open(image_path)
+
         try:
-            # Load image
-            image = Image.open(image_path)
-            
-            # Convert to RGB if needed
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Enhance brightness (increase by 20%)
-            brightness_enhancer = ImageEnhance.Brightness(image)
-            image = brightness_enhancer.enhance(1.2)
-            
-            # Enhance contrast (increase by 30%)
-            contrast_enhancer = ImageEnhance.Contrast(image)
-            image = contrast_enhancer.enhance(1.3)
-            
-            # Enhance sharpness (increase by 50%)
-            sharpness_enhancer = ImageEnhance.Sharpness(image)
-            image = sharpness_enhancer.enhance(1.5)
-            
-            # Apply unsharp mask for better text clarity
-            image = image.filter(ImageFilter.UnsharpMask(radius=1, percent=150, threshold=3))
+            # Decoding, enhancing and encoding all run in the image pool, off the event loop
+            transform = enhance_for_ocr if steps is None else partial(enhance_for_ocr, steps=tuple(steps))
+            image = await image_pool.blob(transform, image_path)
             
             print("✅ Image enhanced for better OCR")
             return image
@@ -431,7 +423,11 @@ NOW ANALYZE THE IMAGE AND RETURN ONLY THE JSON ARRAY OUTPUT.
                 "max_output_tokens": 2048,
             }
             
-            response = self.model.generate_content([stored_prompt, image], generation_config=generation_config)
+            try:
+                response = await self.model.generate_content_async([stored_prompt, image], generation_config=generation_config)
+            except Exception as e:
+                resource_manager.record_api_error(e)
+                raise
             
             print(f"🔍 MEMORY PROMPT RESPONSE: {response.text[:200]}...")
             
@@ -0,0 +1,145 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from app.config import settings
+from app.core.state_backend import MISSING, state_backend
+from app.utils.logger import app_logger
+
+# Jobs in these states are reused by later start requests instead of spawning a new run
+ATTACHABLE_STATES = {"queued", "running", "done"}
+
+# States a job's owner is still working through
+UNFINISHED_STATES = {"queued", "running"}
+
+# How often wait() checks on a job another process is running
+REMOTE_POLL_SECONDS = 1.0
+
+class JobRegistry:
+    """One processing job per batch, across every API worker: repeated start requests attach to the existing job.
+
+    Job records live in the shared state backend and are claimed atomically, so two tabs served
+    by different workers still get one job. The job's task runs in the process that created it,
+    which heartbeats the record while it runs; a job whose owner stopped heartbeating for
+    WORKER_LEASE_SECONDS is presumed dead and the next start request replaces it.
+    """
+
+    NAMESPACE = "jobs"
+
+    def __init__(self):
+        # Tasks for the jobs this process owns
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def start(self, batch_id: str, kind: str, runner: Callable[[], Awaitable]) -> Tuple[Dict, bool]:
+        """Start a job for the batch unless one is queued, running or done; returns (job, created)"""
+        now = time.time()
+        created = False
+
+        def claim(job: Optional[Dict]) -> Dict:
+            nonlocal created
+            # Decided inside the update, which a backend may retry
+            created = not (job and job["state"] in ATTACHABLE_STATES and not self._abandoned(job, now))
+            if not created:
+                return {**job, "attach_count": job["attach_count"] + 1}
+            return {
+                "batch_id": batch_id,
+                "kind": kind,
+                "state": "queued",
+                "attach_count": 0,
+                "owner": state_backend.origin,
+                "heartbeat_at": now,
+                "created_at": datetime.now().isoformat(),
+                "finished_at": None,
+                "error": None
+            }
+
+        job = await state_backend.run(state_backend.update, self.NAMESPACE, batch_id, claim, None)
+        if not created:
+            app_logger.info(f"[JOBS] Attached to {job['kind']} job for {batch_id} ({job['state']})")
+            return job, False
+
+        self._tasks[batch_id] = asyncio.create_task(self._run(batch_id, runner))
+        app_logger.info(f"[JOBS] Started {kind} job for {batch_id}")
+        return job, True
+
+    async def get(self, batch_id: str) -> Optional[Dict]:
+        return await state_backend.run(state_backend.get, self.NAMESPACE, batch_id)
+
+    async def wait(self, batch_id: str) -> Optional[Dict]:
+        """Wait for the batch's job to finish (whatever its outcome), wherever it runs"""
+        task = self._tasks.get(batch_id)
+        if task:
+            await asyncio.gather(task, return_exceptions=True)
+            return await self.get(batch_id)
+
+        while True:
+            job = await self.get(batch_id)
+            if not job or job["state"] not in UNFINISHED_STATES or self._abandoned(job, time.time()):
+                return job
+            await asyncio.sleep(REMOTE_POLL_SECONDS)
+
+    async def cancel(self, batch_id: str) -> bool:
+        """Cancel the batch's job if it hasn't finished; False if there is nothing to cancel.
+
+        Stops the task if this process runs it; the owner stops its own when it gets the
+        pipeline's cancel message.
+        """
+        task = self._tasks.get(batch_id)
+        if task and not task.done():
+            task.cancel()
+        return await self._set_finished(batch_id, "cancelled")
+
+    async def forget(self, batch_id: str) -> None:
+        await self.cancel(batch_id)
+        self._tasks.pop(batch_id, None)
+        await state_backend.run(state_backend.delete, self.NAMESPACE, batch_id)
+
+    async def _run(self, batch_id: str, runner: Callable[[], Awaitable]) -> None:
+        await self._update_owned(batch_id, lambda job: {**job, "state": "running"})
+        heartbeat = asyncio.create_task(self._heartbeat(batch_id))
+        try:
+            await runner()
+            await self._set_finished(batch_id, "done")
+        except asyncio.CancelledError:
+            await asyncio.shield(self._set_finished(batch_id, "cancelled"))
+            raise
+        except Exception as e:
+            app_logger.error(f"[JOBS] Job for {batch_id} failed: {str(e)}")
+            await self._set_finished(batch_id, "failed", str(e))
+        finally:
+            heartbeat.cancel()
+            if self._tasks.get(batch_id) is asyncio.current_task():
+                del self._tasks[batch_id]
+
+    async def _heartbeat(self, batch_id: str) -> None:
+        while True:
+            await asyncio.sleep(settings.WORKER_LEASE_SECONDS / 3)
+            await self._update_owned(batch_id, lambda job: {**job, "heartbeat_at": time.time()})
+
+    async def _update_owned(self, batch_id: str, fn: Callable[[Dict], Dict]) -> None:
+        """Apply fn to the job record only while this process still owns it"""
+        def update(job: Dict) -> Dict:
+            return fn(job) if job["owner"] == state_backend.origin else job
+
+        await state_backend.run(state_backend.update, self.NAMESPACE, batch_id, update)
+
+    async def _set_finished(self, batch_id: str, state: str, error: Optional[str] = None) -> bool:
+        changed = False
+
+        def finish(job: Dict) -> Dict:
+            nonlocal changed
+            changed = job["state"] in UNFINISHED_STATES
+            if not changed:
+                return job
+            return {**job, "state": state, "error": error, "finished_at": datetime.now().isoformat()}
+
+        result = await state_backend.run(state_backend.update, self.NAMESPACE, batch_id, finish)
+        return result is not MISSING and changed
+
+    @staticmethod
+    def _abandoned(job: Dict, now: float) -> bool:
+        """An unfinished job whose owner stopped heartbeating"""
+        return job["state"] in UNFINISHED_STATES and now - job["heartbeat_at"] > settings.WORKER_LEASE_SECONDS
+
+# Global instance
+job_registry = JobRegistry()
@@ -1,21 +1,85 @@
 from pdf2image import convert_from_path
+from PyPDF2 import PdfReader
 from PIL import Image
-from typing import List
+from typing import List, Optional
+from app.config import settings
+from app.utils.logger import app_logger
+import math
+import time
 import os
 
 class PDFConverter:
-    
+
     @staticmethod
     def convert_pdf_to_images(pdf_path: str) -> List[Image.Image]:
-        """Convert PDF pages to images"""
+        """Convert PDF pages to images, choosing DPI per page"""
         try:
-            images = convert_from_path(pdf_path, dpi=300)
+            page_sizes = PDFConverter._get_page_sizes(pdf_path)
+            if not page_sizes:
+                # Page geometry unreadable - render everything at the DPI a card needs
+                images = convert_from_path(pdf_path, dpi=settings.PDF_CARD_DPI)
+                print(f"📄 Converted PDF to {len(images)} images")
+                return images
+
+            images = []
+            for page_num, (width_pt, height_pt) in enumerate(page_sizes, 1):
+                dpi = PDFConverter.choose_dpi(width_pt, height_pt)
+
+                start_time = time.time()
+                page_images = convert_from_path(pdf_path, dpi=dpi, first_page=page_num, last_page=page_num)
+                render_time = time.time() - start_time
+
+                for image in page_images:
+                    raw_bytes = image.width * image.height * len(image.getbands())
+                    app_logger.info(
+                        f"[PDF] {os.path.basename(pdf_path)} page {page_num}: "
+                        f"{width_pt / 72:.2f}x{height_pt / 72:.2f}in @ {dpi}dpi -> "
+                        f"{image.width}x{image.height}px, {raw_bytes / (1024 * 1024):.1f}MB raw, {render_time:.2f}s"
+                    )
+                images.extend(page_images)
+
             print(f"📄 Converted PDF to {len(images)} images")
             return images
         except Exception as e:
             print(f"❌ PDF conversion error: {e}")
             return []
-    
+
+    @staticmethod
+    def choose_dpi(width_pt: float, height_pt: float) -> int:
+        """Pick the DPI for a page of this size.
+
+        Resolution is needed per card, not per page: a card-sized page and each card on a multi-card
+        sheet both get PDF_CARD_DPI, so a sheet renders with more pixels rather than smaller cards.
+        Only a page too large to render at that DPI within PDF_MAX_PAGE_PIXELS drops below it, down
+        to PDF_MIN_DPI.
+        """
+        area_sq_in = (width_pt / 72) * (height_pt / 72)
+        if area_sq_in <= 0:
+            return settings.PDF_CARD_DPI
+
+        budget_dpi = int(math.sqrt(settings.PDF_MAX_PAGE_PIXELS / area_sq_in))
+        return max(settings.PDF_MIN_DPI, min(settings.PDF_CARD_DPI, budget_dpi))
+
+    @staticmethod
+    def _get_page_sizes(pdf_path: str) -> Optional[List[tuple]]:
+        """Read each page's MediaBox size in points (rotation-aware)"""
+        try:
+            reader = PdfReader(pdf_path)
+            sizes = []
+            for page in reader.pages:
+                box = page.mediabox
+                width, height = float(box.width), float(box.height)
+                # UserUnit scales the default 1/72in user space
+                user_unit = float(page.get("/UserUnit", 1))
+                width, height = width * user_unit, height * user_unit
+                if page.get("/Rotate", 0) % 180 == 90:
+                    width, height = height, width
+                sizes.append((width, height))
+            return sizes
+        except Exception as e:
+            app_logger.error(f"[PDF] Could not read page sizes for {pdf_path}: {e}")
+            return None
+
     @staticmethod
     def preprocess_image(image: Image.Image) -> Image.Image:
         """Enhance image for better OCR"""
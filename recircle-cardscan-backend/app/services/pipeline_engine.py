@@ -0,0 +1,890 @@
+import asyncio
+import math
+import os
+import time
+from typing import Dict, List, Optional
+from app.config import settings
+from app.core.resource_manager import resource_manager
+from app.core.fair_scheduler import FairShareQueue, INTERACTIVE, BULK
+from app.core.job_store import job_store
+from app.core.state_backend import state_backend
+from app.core.stage_metrics import stage_metrics
+from app.services.queue_manager import queue_manager
+from app.services.websocket_manager import websocket_manager
+from app.services.storage_lifecycle import storage_lifecycle
+from app.services.quality_gate import quality_gate
+from app.utils import image_quality
+from app.utils.logger import app_logger
+
+CARD_FIELDS = ["name", "phone", "email", "company", "designation", "address"]
+
+# Terminal job states - a job in one of these is never picked up again
+FINISHED_STATES = {"completed", "invalid", "extraction_failed", "failed", "cancelled"}
+
+# Job fields written to the job store after each stage so a restart can resume from there
+PERSISTED_FIELDS = ["pages", "renders", "enhancement", "page_records", "validation", "records", "error", "submitted_at"]
+
+# How often to check the job store for files another API worker is processing
+REMOTE_POLL_SECONDS = 1.0
+
+# Only one API worker resumes the job store on startup; the lease outlives a rolling start of all of them
+RESUME_LEASE_SECONDS = 60
+
+# Stages that time only their Gemini calls themselves - waiting for a slot is queueing, not service time
+SLOT_STAGES = {"validate", "extract"}
+
+# EXIF orientation of a photo stored the right way up; others get an upright render at this JPEG quality
+UPRIGHT = 1
+UPRIGHT_JPEG_QUALITY = 95
+
+# State backend channel for cancellations, so whichever process runs a file stops it
+CONTROL_CHANNEL = "pipeline_control"
+
+class PipelineEngine:
+    """Single processing engine: every file flows ingest -> preprocess -> validate -> extract -> postprocess -> persist.
+
+    Each stage has its own worker pool, and stages are joined by bounded queues so a slow
+    stage pushes back on the ones before it instead of piling up work in memory. Only the
+    ingest queue is unbounded, so that push-back stops at the ingest workers instead of
+    holding open the upload that submitted the file; admission control limits what enters
+    it. The queues serve batches by weighted deficit round robin, so a large batch can't starve a small one,
+    and always hand out interactive work first; each stage also keeps reserved workers that
+    only take interactive work, so a booth scan never waits for a bulk file to finish.
+
+    The engine runs inside the API (PIPELINE_MODE=embedded) or in `python -m app.worker`
+    processes that claim files the API only enqueued in the job store (PIPELINE_MODE=enqueue).
+    """
+
+    def __init__(self):
+        self.stages = [
+            ("ingest", self._ingest, settings.PIPELINE_INGEST_WORKERS),
+            ("preprocess", self._preprocess, settings.PIPELINE_PREPROCESS_WORKERS),
+            ("validate", self._validate, settings.PIPELINE_VALIDATE_WORKERS),
+            ("extract", self._extract, settings.PIPELINE_EXTRACT_WORKERS),
+            ("postprocess", self._postprocess, settings.PIPELINE_POSTPROCESS_WORKERS),
+            ("persist", self._persist, settings.PIPELINE_PERSIST_WORKERS),
+        ]
+        self._queues: List[FairShareQueue] = []
+        self._workers: List[asyncio.Task] = []
+        # Jobs keyed by file_id, plus the file_ids submitted for each batch in order
+        self._jobs: Dict[str, Dict] = {}
+        self._batches: Dict[str, List[str]] = {}
+        # Marks the job store rows this process is running
+        self.owner = state_backend.origin
+        state_backend.subscribe(self._on_control)
+
+    def start(self) -> None:
+        """Create the stage queues and worker pools (needs a running event loop)"""
+        if self._workers:
+            return
+
+        self._queues = [
+            FairShareQueue(0 if index == 0 else settings.PIPELINE_QUEUE_SIZE, resource_manager.get_batch_weight)
+            for index in range(len(self.stages))
+        ]
+        for index, (name, _, workers) in enumerate(self.stages):
+            for _ in range(workers):
+                self._workers.append(asyncio.create_task(self._stage_worker(index)))
+            for _ in range(settings.PIPELINE_RESERVED_INTERACTIVE_WORKERS):
+                self._workers.append(asyncio.create_task(self._stage_worker(index, interactive_only=True)))
+        self._workers.append(asyncio.create_task(self._heartbeat()))
+
+        app_logger.info("[PIPELINE] Started stages: " + ", ".join(f"{name}x{workers}" for name, _, workers in self.stages))
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        self._workers = []
+        self._queues = []
+        # Unfinished files go back to the queue for another worker (or the next start) to pick up
+        job_store.release(self.owner, FINISHED_STATES)
+
+    async def submit(self, batch_id: str, file_info: Dict, priority: str = BULK) -> None:
+        """Queue a stored file for processing; returns once it is recorded, never waiting on the stages.
+
+        Re-submitting a known file is ignored, except that an interactive re-submit promotes it.
+        A file another API worker already took is left to that worker.
+        """
+        file_id = file_info["file_id"]
+        if file_id in self._jobs:
+            if priority == INTERACTIVE:
+                self.promote(file_id)
+            return
+
+        embedded = settings.PIPELINE_MODE != "enqueue"
+        if not job_store.add_file(batch_id, file_info, priority, self.owner if embedded else None):
+            if priority == INTERACTIVE:
+                # Claimed ahead of bulk files if no worker has taken it yet
+                job_store.set_priority(file_id, INTERACTIVE)
+            return
+        if not embedded:
+            # A pipeline worker claims it from the job store
+            return
+
+        self.start()
+        job = self._new_job(batch_id, file_info, priority)
+        self._register(job)
+        await self._queues[0].put(batch_id, job, priority)
+
+    async def resume(self) -> int:
+        """Reload batches from the job store after a restart; unfinished files continue after their last completed stage"""
+        from app.routers.upload import batch_storage
+
+        if settings.PIPELINE_MODE == "enqueue":
+            # Pipeline workers reclaim unfinished files themselves
+            return 0
+
+        self.start()
+        if not state_backend.acquire_lease("pipeline_resume", RESUME_LEASE_SECONDS):
+            app_logger.info("[PIPELINE] Another API worker is resuming the job store")
+            return 0
+
+        # Take over every unfinished file, whoever ran it before the restart
+        claimed = {row["file_id"] for row in job_store.claim(self.owner, -1, 0, FINISHED_STATES)}
+        resumed = []
+
+        for batch_id, rows in job_store.load_batches().items():
+            if batch_id in self._batches:
+                continue
+
+            files_list = [row["file_info"] for row in rows]
+            if not await batch_storage.contains(batch_id):
+                await batch_storage.create(batch_id, files_list)
+            # A shared state backend keeps the batch's queue across the restart; otherwise rebuild it
+            rebuild_queue = (await queue_manager.get_batch_summary(batch_id)) is None
+            if rebuild_queue:
+                await queue_manager.initialize_batch(batch_id, files_list)
+
+            for row in rows:
+                if row["status"] in FINISHED_STATES:
+                    job = self._new_job(batch_id, row["file_info"], row["priority"])
+                    job.update(row["state"])
+                    self._register(job)
+                    await self._restore_finished(job, row["status"], rebuild_queue)
+                elif row["file_id"] in claimed:
+                    resumed.append(self._adopt(row))
+
+        if resumed:
+            app_logger.info(f"[PIPELINE] Resuming {len(resumed)} unfinished files from the job store")
+            # Re-queue in the background so a large backlog can't hold up startup
+            asyncio.create_task(self._requeue(resumed))
+        return len(resumed)
+
+    async def run_worker(self) -> None:
+        """Claim files from the job store and run them until cancelled (the loop behind `python -m app.worker`)"""
+        self.start()
+
+        while True:
+            # Only claim what the ingest queue can hold, so unclaimed files stay available to other workers
+            room = settings.PIPELINE_QUEUE_SIZE - self._queues[0].qsize()
+            if room > 0:
+                rows = job_store.claim(self.owner, room, settings.WORKER_LEASE_SECONDS, FINISHED_STATES)
+                adopted = [self._adopt(row) for row in rows if row["file_id"] not in self._jobs]
+                if adopted:
+                    app_logger.info(f"[WORKER] Claimed {len(adopted)} files")
+                    await self._requeue(adopted)
+            await asyncio.sleep(settings.WORKER_POLL_SECONDS)
+
+    def _adopt(self, row: Dict) -> tuple:
+        """Build the job for a claimed job store row; returns (index of the stage to run next, job)"""
+        stage_names = [name for name, _, _ in self.stages]
+        job = self._new_job(row["batch_id"], row["file_info"], row["priority"])
+        job.update(row["state"])
+        self._register(job)
+
+        # Renders may have been cleaned up while nobody owned the file - redo preprocessing if so
+        next_stage = stage_names.index(row["last_stage"]) + 1 if row["last_stage"] else 0
+        if next_stage > stage_names.index("preprocess") and not all(os.path.exists(p) for p in job["pages"]):
+            next_stage = stage_names.index("preprocess")
+            job["pages"], job["renders"], job["page_records"] = [], [], []
+        for render_path in job["renders"]:
+            storage_lifecycle.track(render_path, job["batch_id"], kind="render")
+        if job["validation"] is not None:
+            job["validated"].set()
+
+        if row["last_stage"]:
+            job["status"] = "processing"
+        return next_stage, job
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(settings.WORKER_LEASE_SECONDS / 3)
+            await asyncio.to_thread(job_store.heartbeat, self.owner)
+            # Lets the API's ETA estimates use stage timings from pipeline workers
+            stage_metrics.publish()
+
+    async def _requeue(self, resumed: List) -> None:
+        for index, job in resumed:
+            if index >= len(self.stages):
+                await self._finish(job, "completed")
+            else:
+                await self._queues[index].put(job["batch_id"], job, job["priority"])
+
+    async def _restore_finished(self, job: Dict, status: str, restore_queue: bool = True) -> None:
+        """Put a file that finished before the restart back into the queue manager, without reprocessing it"""
+        batch_id, file_id = job["batch_id"], job["file_id"]
+        job["status"] = status
+        job["validated"].set()
+        job["done"].set()
+        if not restore_queue:
+            return
+
+        await queue_manager.set_file_fields(batch_id, file_id, validation=job["validation"],
+                                            extracted_records=job["records"] or [], enhancement=job["enhancement"])
+        if status == "completed":
+            for record in job["records"] or []:
+                await queue_manager.add_to_output_queue(batch_id, file_id, record, 0.0)
+        else:
+            await queue_manager.update_input_status(batch_id, file_id, status)
+
+    def _register(self, job: Dict) -> None:
+        batch_id = job["batch_id"]
+        if batch_id not in self._batches:
+            # The team's weight applies once its lookup lands; until then the batch gets the default share
+            asyncio.create_task(resource_manager.load_batch_team(batch_id))
+
+        self._jobs[job["file_id"]] = job
+        self._batches.setdefault(batch_id, []).append(job["file_id"])
+
+    def _new_job(self, batch_id: str, file_info: Dict, priority: str) -> Dict:
+        return {
+            "batch_id": batch_id,
+            "file_id": file_info["file_id"],
+            "filename": file_info["filename"],
+            "file_path": file_info["file_path"],
+            "file_type": file_info.get("file_type") or (file_info.get("probe") or {}).get("file_type"),
+            # EXIF orientation read at upload; a rotated photo is rendered upright before validation
+            "orientation": (file_info.get("probe") or {}).get("orientation", 1),
+            # Blur, glare and exposure scored at upload (images only)
+            "quality": file_info.get("quality"),
+            "status": "queued",
+            "priority": priority,
+            "stage": None,
+            "pages": [],
+            "renders": [],
+            # Per page: the thumbnail statistics and the enhancement steps they call for
+            "enhancement": None,
+            "page_records": [],
+            "validation": None,
+            "records": None,
+            "error": None,
+            "submitted_at": time.time(),
+            # The stage handler running for this job, so a cancel can stop its API call
+            "task": None,
+            "validated": asyncio.Event(),
+            "done": asyncio.Event()
+        }
+
+    def promote(self, file_id: str) -> bool:
+        """Make an unfinished file interactive; if it is waiting in a stage queue it jumps ahead now"""
+        job = self._jobs.get(file_id)
+        if not job or job["status"] in FINISHED_STATES:
+            return False
+
+        job["priority"] = INTERACTIVE
+        for queue in self._queues:
+            if queue.promote(job["batch_id"], job):
+                break
+        return True
+
+    def is_finished(self, file_id: str) -> bool:
+        result = self.get_result(file_id)
+        return bool(result) and result["status"] in FINISHED_STATES
+
+    def has_file(self, file_id: str) -> bool:
+        return file_id in self._jobs or job_store.get_file(file_id) is not None
+
+    def has_batch(self, batch_id: str) -> bool:
+        return batch_id in self._batches
+
+    def is_active(self, batch_id: str) -> bool:
+        """True while any of the batch's files are still in the pipeline, here or on another API worker"""
+        if batch_id not in self._batches:
+            return job_store.has_unfinished(batch_id, FINISHED_STATES)
+        return any(not self._jobs[f]["done"].is_set() for f in self._batches.get(batch_id, []) if f in self._jobs)
+
+    async def cancel(self, batch_id: str, file_id: Optional[str] = None) -> List[str]:
+        """Cancel a batch's unfinished files (or just file_id) in whichever process runs them.
+
+        Files still waiting in the job store are marked cancelled so no worker claims them;
+        the process running each file drops it from its stage queue and cancels its in-flight
+        API call. Returns the ids of the files that were cancelled.
+        """
+        cancelled = job_store.cancel(batch_id, file_id, FINISHED_STATES)
+        await state_backend.publish(CONTROL_CHANNEL, {"action": "cancel", "batch_id": batch_id, "file_id": file_id})
+        return cancelled
+
+    async def cancel_batch(self, batch_id: str) -> None:
+        """Drop this process's unfinished files for a batch, stopping any that are mid-stage"""
+        for file_id in self._batches.get(batch_id, []):
+            job = self._jobs.get(file_id)
+            if job:
+                await self._cancel_job(job)
+
+    async def _cancel_job(self, job: Dict) -> bool:
+        if job["status"] in FINISHED_STATES:
+            return False
+
+        for queue in self._queues:
+            if queue.remove(job["batch_id"], job):
+                break
+        task = job["task"]
+        # _finish settles the job before its first await so no stage picks it up in between
+        await self._finish(job, "cancelled")
+        if task and not task.done():
+            # Its file slot is released as the cancellation unwinds the handler
+            task.cancel()
+        await queue_manager.update_input_status(job["batch_id"], job["file_id"], "cancelled")
+        return True
+
+    async def _on_control(self, channel: str, message: Dict) -> None:
+        if channel != CONTROL_CHANNEL or message.get("action") != "cancel":
+            return
+
+        batch_id, file_id = message["batch_id"], message.get("file_id")
+        if file_id:
+            job = self._jobs.get(file_id)
+            if job and job["batch_id"] == batch_id and await self._cancel_job(job):
+                app_logger.info(f"[PIPELINE] Cancelled {job['filename']} in batch {batch_id}")
+            return
+
+        await self.cancel_batch(batch_id)
+        # Stop the batch's process/individual job too, wherever it was started
+        from app.services.job_registry import job_registry
+        await job_registry.cancel(batch_id)
+        app_logger.info(f"[PIPELINE] Cancelled batch {batch_id}")
+
+    async def forget_batch(self, batch_id: str) -> None:
+        """Release a batch's job records, in memory and in the job store"""
+        await self.cancel_batch(batch_id)
+        for file_id in self._batches.pop(batch_id, []):
+            self._jobs.pop(file_id, None)
+        job_store.remove_batch(batch_id)
+
+    def get_result(self, file_id: str) -> Optional[Dict]:
+        """Status, validation and records for a file (None if it was never submitted)"""
+        job = self._jobs.get(file_id)
+        if not job:
+            row = job_store.get_file(file_id)
+            return self._row_result(row) if row else None
+        return {
+            "file_id": job["file_id"],
+            "filename": job["filename"],
+            "status": job["status"],
+            "priority": job["priority"],
+            "stage": job["stage"],
+            "validation": job["validation"],
+            "records": job["records"],
+            "error": job["error"]
+        }
+
+    async def wait_for_file(self, file_id: str) -> Optional[Dict]:
+        """Wait until a file leaves the pipeline and return its result"""
+        job = self._jobs.get(file_id)
+        if not job:
+            return await self._wait_remote(file_id, lambda result: result["status"] in FINISHED_STATES)
+        await job["done"].wait()
+        return self.get_result(file_id)
+
+    async def _wait_validated(self, file_id: str) -> Optional[Dict]:
+        """Wait until a file has its validation result (or left the pipeline without one)"""
+        job = self._jobs.get(file_id)
+        if not job:
+            return await self._wait_remote(
+                file_id, lambda result: result["validation"] is not None or result["status"] in FINISHED_STATES
+            )
+        await job["validated"].wait()
+        return self.get_result(file_id)
+
+    async def _wait_remote(self, file_id: str, ready) -> Optional[Dict]:
+        """Follow a file another API worker is processing through its job store row"""
+        while True:
+            result = self.get_result(file_id)
+            if result is None or ready(result):
+                return result
+            await asyncio.sleep(REMOTE_POLL_SECONDS)
+
+    @staticmethod
+    def _row_result(row: Dict) -> Dict:
+        return {
+            "file_id": row["file_id"],
+            "filename": row["file_info"]["filename"],
+            "status": row["status"],
+            "priority": row["priority"],
+            "stage": row["last_stage"],
+            "validation": row["state"].get("validation"),
+            "records": row["state"].get("records"),
+            "error": row["state"].get("error")
+        }
+
+    async def wait_for_batch(self, batch_id: str, files_list: List[Dict]):
+        """Yield each file's result as it finishes (submitting any file not yet in the pipeline)"""
+        for file_info in files_list:
+            await self.submit(batch_id, file_info)
+
+        for finished in asyncio.as_completed([self.wait_for_file(f["file_id"]) for f in files_list]):
+            yield await finished
+
+    async def wait_for_validation(self, batch_id: str, files_list: List[Dict]) -> Dict:
+        """Wait for every file's validation and return results shaped like BusinessCardValidator.validate_batch"""
+        results = {
+            "valid_business_cards": [],
+            "invalid_files": [],
+            "validation_summary": {
+                "total_files": len(files_list),
+                "valid_cards": 0,
+                "invalid_files": 0
+            }
+        }
+
+        for file_info in files_list:
+            await self.submit(batch_id, file_info)
+
+        for file_info in files_list:
+            result = await self._wait_validated(file_info["file_id"]) or {"validation": None, "error": None}
+            validation_result = result["validation"] or self._failed_validation(result["error"] or "File was not processed")
+
+            file_result = {
+                "file_id": file_info["file_id"],
+                "filename": file_info["filename"],
+                "file_path": file_info["file_path"],
+                "validation": validation_result
+            }
+
+            if validation_result["is_business_card"]:
+                results["valid_business_cards"].append(file_result)
+                results["validation_summary"]["valid_cards"] += 1
+            else:
+                results["invalid_files"].append(file_result)
+                results["validation_summary"]["invalid_files"] += 1
+
+        return results
+
+    def estimate_eta(self, batch_id: str) -> float:
+        """Seconds until the batch's unfinished files are done, from each stage's mean time.
+
+        A stage clears the batch's files that haven't passed it at the stage's concurrency; under
+        fair share another batch only gets ahead of them by its weighted share of those files. The
+        batch is done once its slowest stage to clear has, plus the time the last file then
+        spends in the stages after it.
+        """
+        positions = self._positions(batch_id)
+        own = positions.get(batch_id)
+        if not own:
+            return 0.0
+
+        means = [
+            stage_metrics.mean(name) or (resource_manager.avg_slot_seconds if name in SLOT_STAGES else 0.0)
+            for name, _, _ in self.stages
+        ]
+        concurrency = [
+            min(workers, max(int(resource_manager.file_limiter.limit), 1)) if name in SLOT_STAGES else workers
+            for name, _, workers in self.stages
+        ]
+        weight = resource_manager.get_batch_weight(batch_id)
+
+        eta = 0.0
+        for index in range(len(self.stages)):
+            remaining = sum(1 for next_stage in own if next_stage <= index)
+            if not remaining:
+                continue
+            ahead = sum(
+                min(sum(1 for next_stage in stages if next_stage <= index), remaining * resource_manager.get_batch_weight(other) / weight)
+                for other, stages in positions.items() if other != batch_id
+            )
+            clear = math.ceil((remaining + ahead) / concurrency[index]) * means[index]
+            eta = max(eta, clear + sum(means[index + 1:]))
+        return round(eta, 1)
+
+    def _positions(self, batch_id: str) -> Dict[str, List[int]]:
+        """Index of the next stage each unfinished file needs, by batch - from this process's jobs,
+        or from the job store when another process runs the batch"""
+        stage_names = [name for name, _, _ in self.stages]
+        positions: Dict[str, List[int]] = {}
+
+        if batch_id not in self._batches:
+            for other, last_stage in job_store.unfinished_stages(FINISHED_STATES):
+                positions.setdefault(other, []).append(stage_names.index(last_stage) + 1 if last_stage else 0)
+            return positions
+
+        for job in self._jobs.values():
+            if job["status"] in FINISHED_STATES:
+                continue
+            # A job between stages still names the stage it last ran
+            next_stage = 0 if job["stage"] is None else stage_names.index(job["stage"]) + (0 if job["task"] else 1)
+            positions.setdefault(job["batch_id"], []).append(next_stage)
+        return positions
+
+    def get_stats(self) -> Dict:
+        """Queue depth per stage and job counts by state"""
+        states: Dict[str, int] = {}
+        for job in self._jobs.values():
+            states[job["status"]] = states.get(job["status"], 0) + 1
+        return {
+            "mode": settings.PIPELINE_MODE,
+            "stages": {
+                name: {
+                    "workers": workers,
+                    "reserved_interactive_workers": settings.PIPELINE_RESERVED_INTERACTIVE_WORKERS,
+                    "queued": self._queues[i].qsize() if self._queues else 0
+                }
+                for i, (name, _, workers) in enumerate(self.stages)
+            },
+            "jobs": states
+        }
+
+    def get_scheduler_snapshot(self, stage: str, priority: str = BULK) -> List[Dict]:
+        """Batches waiting at a stage, in the order the fair-share queue will serve them"""
+        if not self._queues:
+            return []
+        index = [name for name, _, _ in self.stages].index(stage)
+        return self._queues[index].snapshot(priority)
+
+    async def _stage_worker(self, index: int, interactive_only: bool = False) -> None:
+        name, handler, _ = self.stages[index]
+        queue = self._queues[index]
+
+        while True:
+            job = await queue.get(interactive_only)
+            try:
+                if job["status"] in FINISHED_STATES:
+                    continue
+
+                job["stage"] = name
+                started = time.perf_counter()
+                # Run the handler as its own task so cancelling the file doesn't cancel this worker
+                job["task"] = asyncio.create_task(handler(job))
+                try:
+                    proceed = await job["task"]
+                finally:
+                    job["task"] = None
+                if name not in SLOT_STAGES:
+                    stage_metrics.observe(name, time.perf_counter() - started)
+
+                if job["status"] in FINISHED_STATES:
+                    continue
+                if proceed:
+                    # A SQLite commit per stage - off the loop, before the next stage can change the job
+                    await asyncio.to_thread(job_store.record_stage, job["file_id"], name, job["status"], self._persisted_state(job))
+                if proceed and index + 1 < len(self.stages):
+                    await self._queues[index + 1].put(job["batch_id"], job, job["priority"])
+                elif proceed:
+                    await self._finish(job, "completed")
+            except asyncio.CancelledError:
+                if job["status"] == "cancelled" and not asyncio.current_task().cancelling():
+                    # The file was cancelled mid-stage; the worker moves on
+                    continue
+                raise
+            except Exception as e:
+                await self._fail(job, e)
+
+    # Stages -------------------------------------------------------------
+
+    async def _ingest(self, job: Dict) -> bool:
+        """Check the stored file is still there and announce that it entered the pipeline"""
+        if not os.path.exists(job["file_path"]):
+            raise FileNotFoundError(f"Stored file missing for {job['filename']}")
+
+        job["status"] = "processing"
+        await queue_manager.update_input_status(job["batch_id"], job["file_id"], "processing")
+        await self._broadcast_stage(job, "processing", "started", 0)
+        return True
+
+    async def _preprocess(self, job: Dict) -> bool:
+        """Render PDF pages to images (images pass through as a single page, turned upright if their
+        EXIF orientation says so), then decide how much OCR enhancement each page needs"""
+        if job["file_type"] != "application/pdf" and not job["file_path"].lower().endswith(".pdf"):
+            if job["orientation"] == UPRIGHT:
+                job["pages"] = [job["file_path"]]
+            else:
+                job["renders"] = [await asyncio.to_thread(self._render_upright, job)]
+                job["pages"] = job["renders"]
+        else:
+            await queue_manager.update_input_status(job["batch_id"], job["file_id"], "preprocessing")
+            await self._broadcast_stage(job, "preprocessing", "preprocessing", 10)
+
+            job["renders"] = await asyncio.to_thread(self._render_pdf_pages, job)
+            if not job["renders"]:
+                raise ValueError(f"Could not render any pages from {job['filename']}")
+            job["pages"] = job["renders"]
+
+        if settings.OCR_ADAPTIVE_ENHANCEMENT:
+            job["enhancement"] = await asyncio.to_thread(self._plan_enhancement, job)
+            await queue_manager.set_file_fields(job["batch_id"], job["file_id"], enhancement=job["enhancement"])
+            steps = [",".join(page["steps"]) or "none" for page in job["enhancement"]]
+            app_logger.info(f"[PIPELINE] {job['filename']} enhancement: {'; '.join(steps)}")
+        return True
+
+    async def _validate(self, job: Dict) -> bool:
+        """Ask the validator whether the first page is a business card"""
+        batch_id, file_id, filename = job["batch_id"], job["file_id"], job["filename"]
+
+        await queue_manager.update_input_status(batch_id, file_id, "validating")
+        await self._broadcast_stage(job, "validating", "validation", 25)
+
+        from app.services.business_card_validator import BusinessCardValidator
+        interactive = job["priority"] == INTERACTIVE
+        if quality_gate.skipped(job["quality"]):
+            # Flagged at upload as unreadable - not worth a validation and an extraction call
+            validation_result = self._rejected_quality(job["quality"]["issues"])
+        else:
+            async with resource_manager.file_slot(batch_id, interactive):
+                with stage_metrics.timer("validate"):
+                    validation_result = await BusinessCardValidator().validate_business_card(job["pages"][0])
+
+        job["validation"] = validation_result
+        await queue_manager.set_file_fields(batch_id, file_id, validation=validation_result)
+        job["validated"].set()
+
+        await websocket_manager.broadcast(batch_id, {
+            "type": "validation_result",
+            "file_id": file_id,
+            "filename": filename,
+            "is_valid": validation_result["is_business_card"],
+            "confidence": validation_result.get("confidence", "Unknown"),
+            "reasoning": validation_result.get("reasoning", "")
+        })
+
+        if not validation_result["is_business_card"]:
+            await queue_manager.update_input_status(batch_id, file_id, "invalid")
+            await self._broadcast_stage(job, "invalid", "validation_failed", 100)
+            await self._finish(job, "invalid")
+            return False
+        return True
+
+    async def _extract(self, job: Dict) -> bool:
+        """Extract card data from every page"""
+        batch_id = job["batch_id"]
+
+        await queue_manager.update_input_status(batch_id, job["file_id"], "extracting")
+        await self._broadcast_stage(job, "extracting", "extraction", 50)
+
+        from app.services.gemini_service import GeminiService
+        gemini_service = GeminiService()
+        interactive = job["priority"] == INTERACTIVE
+        async with resource_manager.file_slot(batch_id, interactive):
+            with stage_metrics.timer("extract"):
+                for page, page_path in enumerate(job["pages"]):
+                    steps = job["enhancement"][page]["steps"] if job["enhancement"] else None
+                    job["page_records"].append(await gemini_service.extract_document_data(page_path, enhancement_steps=steps) or [])
+        return True
+
+    async def _postprocess(self, job: Dict) -> bool:
+        """Merge multi-page PDFs into one card, then normalise fields"""
+        batch_id, file_id = job["batch_id"], job["file_id"]
+
+        if len(job["page_records"]) > 1:
+            records = self._combine_multi_page_data([r for page in job["page_records"] for r in page])
+        else:
+            records = job["page_records"][0] if job["page_records"] else []
+
+        job["records"] = [self._normalise_record(r) for r in records]
+        await queue_manager.set_file_fields(batch_id, file_id, extracted_records=job["records"])
+
+        if not job["records"]:
+            await queue_manager.update_input_status(batch_id, file_id, "extraction_failed")
+            await self._broadcast_stage(job, "extraction_failed", "extraction_failed", 100)
+            await self._finish(job, "extraction_failed")
+            return False
+
+        await queue_manager.update_input_status(batch_id, file_id, "processing_data")
+        await self._broadcast_stage(job, "processing_data", "processing_data", 75)
+        return True
+
+    async def _persist(self, job: Dict) -> bool:
+        """Publish the records to the batch's output queue and tell watchers"""
+        batch_id, file_id, filename = job["batch_id"], job["file_id"], job["filename"]
+        records = job["records"]
+        processing_time = time.time() - job["submitted_at"]
+
+        for record in records:
+            await queue_manager.add_to_output_queue(batch_id, file_id, record, processing_time)
+
+        await websocket_manager.broadcast(batch_id, {
+            "type": "extraction_complete",
+            "file_id": file_id,
+            "filename": filename,
+            "status": "completed",
+            "stage": "completed",
+            "progress": 100,
+            "extracted_data": records[0],
+            "cards_count": len(records),
+            "processing_time": processing_time
+        })
+
+        await websocket_manager.broadcast(batch_id, {
+            "type": "batch_update",
+            "batch_id": batch_id,
+            "summary": await queue_manager.get_batch_summary(batch_id),
+            "eta_seconds": self.estimate_eta(batch_id)
+        })
+
+        app_logger.info(f"[PIPELINE] {filename} done in {processing_time:.1f}s - {len(records)} cards")
+        return True
+
+    # Helpers ------------------------------------------------------------
+
+    def _render_pdf_pages(self, job: Dict) -> List[str]:
+        """Save each PDF page as a JPEG render tracked for cleanup"""
+        from app.services.pdf_converter import PDFConverter
+        from app.utils.file_manager import FileManager
+
+        paths = []
+        for page_num, image in enumerate(PDFConverter.convert_pdf_to_images(job["file_path"])):
+            page_path = FileManager.incoming_path(job["file_id"], f"page{page_num + 1}.jpg")
+            image.save(page_path)
+            paths.append(storage_lifecycle.track(page_path, job["batch_id"], kind="render"))
+        return paths
+
+    def _render_upright(self, job: Dict) -> str:
+        """Save a copy of the photo with its EXIF orientation applied, tracked for cleanup"""
+        from PIL import Image, ImageOps
+        from app.utils.file_manager import FileManager
+        from app.utils.image_ops import to_rgb
+
+        with Image.open(job["file_path"]) as image:
+            upright = to_rgb(ImageOps.exif_transpose(image))
+        page_path = FileManager.incoming_path(job["file_id"], "upright.jpg")
+        upright.save(page_path, quality=UPRIGHT_JPEG_QUALITY)
+        return storage_lifecycle.track(page_path, job["batch_id"], kind="render")
+
+    @staticmethod
+    def _plan_enhancement(job: Dict) -> List[Dict]:
+        """Thumbnail statistics of each page and the enhancement steps they call for"""
+        plans = []
+        for page_path in job["pages"]:
+            # An uploaded image was already measured by the quality gate
+            if page_path == job["file_path"] and job["quality"]:
+                stats = {key: value for key, value in job["quality"].items() if key != "issues"}
+            else:
+                stats = image_quality.measure(page_path)
+            plans.append({**stats, "steps": image_quality.plan_enhancement(stats)})
+        return plans
+
+    async def _finish(self, job: Dict, status: str) -> None:
+        """Move a job to a terminal state, drop its page renders and wake anyone waiting on it"""
+        # Settled before the first await
+        job["status"] = status
+        renders, job["renders"] = job["renders"], []
+        await asyncio.to_thread(self._record_finish, job["file_id"], status, renders, self._persisted_state(job))
+        job["validated"].set()
+        job["done"].set()
+
+    @staticmethod
+    def _record_finish(file_id: str, status: str, renders: List[str], state: Dict) -> None:
+        for render_path in renders:
+            storage_lifecycle.release(render_path)
+        job_store.record_stage(file_id, None, status, state)
+
+    async def _fail(self, job: Dict, error: Exception) -> None:
+        batch_id, file_id, filename = job["batch_id"], job["file_id"], job["filename"]
+        app_logger.error(f"[PIPELINE] Error with {filename} at {job['stage']}: {str(error)}")
+
+        job["error"] = str(error)
+        if job["validation"] is None:
+            job["validation"] = self._failed_validation(str(error))
+        await queue_manager.update_input_status(batch_id, file_id, "failed")
+        await queue_manager.set_file_fields(batch_id, file_id, error=str(error))
+        await self._finish(job, "failed")
+
+        await websocket_manager.broadcast(batch_id, {
+            "type": "error",
+            "file_id": file_id,
+            "filename": filename,
+            "error": str(error),
+            "status": "failed"
+        })
+
+    @staticmethod
+    def _persisted_state(job: Dict) -> Dict:
+        return {field: job[field] for field in PERSISTED_FIELDS}
+
+    async def _broadcast_stage(self, job: Dict, status: str, stage: str, progress: int) -> None:
+        await websocket_manager.broadcast(job["batch_id"], {
+            "type": "file_update",
+            "file_id": job["file_id"],
+            "filename": job["filename"],
+            "status": status,
+            "stage": stage,
+            "progress": progress
+        })
+
+    @staticmethod
+    def _normalise_record(record: Dict) -> Dict:
+        """Fill missing fields with N/A and strip a leading 91 country code from long numbers"""
+        normalised = {field: record.get(field) or "N/A" for field in CARD_FIELDS}
+
+        phone = normalised["phone"]
+        if phone != "N/A" and len(phone.replace(",", "").replace(" ", "")) > 10 and phone.startswith("91"):
+            normalised["phone"] = phone[2:]
+        return normalised
+
+    @staticmethod
+    def _combine_multi_page_data(all_data: List[Dict]) -> List[Dict]:
+        """Combine data from multiple pages into complete records"""
+        if not all_data:
+            return []
+
+        if len(all_data) == 1:
+            return all_data
+
+        merged_record = {field: "N/A" for field in CARD_FIELDS}
+
+        all_phones = []
+        all_emails = []
+        all_companies = []
+
+        for record in all_data:
+            if merged_record["name"] == "N/A" and record.get("name", "N/A") != "N/A":
+                merged_record["name"] = record["name"]
+
+            if record.get("phone", "N/A") != "N/A":
+                phones = [p.strip() for p in record["phone"].split(',') if p.strip()]
+                all_phones.extend(phones)
+
+            if record.get("email", "N/A") != "N/A":
+                emails = [e.strip() for e in record["email"].split(',') if e.strip()]
+                all_emails.extend(emails)
+
+            if record.get("company", "N/A") != "N/A":
+                all_companies.append(record["company"])
+
+            if merged_record["designation"] == "N/A" and record.get("designation", "N/A") != "N/A":
+                merged_record["designation"] = record["designation"]
+
+            if merged_record["address"] == "N/A" and record.get("address", "N/A") != "N/A":
+                merged_record["address"] = record["address"]
+
+        if all_phones:
+            merged_record["phone"] = ','.join(list(dict.fromkeys(all_phones)))
+
+        if all_emails:
+            merged_record["email"] = ','.join(list(dict.fromkeys(all_emails)))
+
+        if all_companies:
+            merged_record["company"] = max(all_companies, key=len)
+
+        return [merged_record]
+
+    @staticmethod
+    def _rejected_quality(issues: List[str]) -> Dict:
+        return {
+            "is_business_card": False,
+            "confidence": "High",
+            "reasoning": f"Image quality too poor to read ({', '.join(issues)}) - please retake the photo",
+            "information_found": [],
+            "raw_response": ""
+        }
+
+    @staticmethod
+    def _failed_validation(reason: str) -> Dict:
+        return {
+            "is_business_card": False,
+            "confidence": "Low",
+            "reasoning": f"Validation error: {reason}",
+            "information_found": [],
+            "raw_response": ""
+        }
+
+# Global instance
+pipeline_engine = PipelineEngine()
@@ -0,0 +1,81 @@
+import asyncio
+from typing import Dict, Optional
+from app.config import settings
+from app.services.websocket_manager import websocket_manager
+from app.utils import image_quality
+from app.utils.logger import app_logger
+
+# What to tell the uploader about each issue
+ISSUE_HINTS = {
+    "blurry": "hold the camera steady and let it focus",
+    "underexposed": "find more light",
+    "overexposed": "move out of direct light",
+    "glare": "tilt the card away from the light"
+}
+
+class QualityGate:
+    """Scores uploaded photos for blur, glare and exposure before any API call is spent on them.
+
+    A photo that looks unreadable carries its issues in file_info["quality"], and the uploader is
+    told while they can still reshoot at the booth: in the /upload response (the client has no
+    batch_id to subscribe with before it), or on the batch's WebSocket for a resumable upload,
+    whose session the client is already watching. Either way initial_status repeats the flags to
+    anyone who subscribes later. The pipeline then either processes the photo after the rest of its
+    upload (QUALITY_GATE_ACTION "defer") or marks it invalid without calling Gemini ("skip").
+    """
+
+    async def inspect(self, batch_id: str, file_info: Dict) -> Optional[Dict]:
+        """Measure an uploaded image and attach the result to file_info"""
+        if not settings.QUALITY_GATE_ENABLED or file_info.get("file_type") == "application/pdf":
+            return None
+
+        try:
+            stats = await asyncio.to_thread(image_quality.measure, file_info["file_path"])
+        except Exception as e:
+            # Unscored files go through as usual - validation will judge them
+            app_logger.warning(f"[QUALITY] Could not score {file_info['filename']}: {str(e)}")
+            return None
+
+        issues = image_quality.assess(stats)
+        file_info["quality"] = {**stats, "issues": issues}
+        if issues:
+            app_logger.info(f"[QUALITY] {batch_id}/{file_info['filename']} flagged: {', '.join(issues)}")
+        return file_info["quality"]
+
+    def warning(self, file_info: Dict) -> Optional[Dict]:
+        """The quality_warning message for a flagged file, None if it looks fine"""
+        quality = file_info.get("quality")
+        if not self.flagged(quality):
+            return None
+        issues = quality["issues"]
+        return {
+            "type": "quality_warning",
+            "file_id": file_info["file_id"],
+            "filename": file_info["filename"],
+            "issues": issues,
+            "quality": {key: value for key, value in quality.items() if key != "issues"},
+            "action": settings.QUALITY_GATE_ACTION,
+            "message": f"{file_info['filename']} looks {' and '.join(issues)} - retake it: "
+                       f"{'; '.join(ISSUE_HINTS[issue] for issue in issues)}"
+        }
+
+    async def warn(self, batch_id: str, file_info: Dict) -> None:
+        """Tell the batch's WebSocket watchers about a flagged file"""
+        warning = self.warning(file_info)
+        if warning:
+            await websocket_manager.broadcast(batch_id, warning)
+
+    @staticmethod
+    def flagged(quality: Optional[Dict]) -> bool:
+        return bool(quality and quality["issues"])
+
+    def deferred(self, file_info: Dict) -> bool:
+        """Whether a flagged file waits until the rest of its upload has been queued"""
+        return settings.QUALITY_GATE_ACTION == "defer" and self.flagged(file_info.get("quality"))
+
+    def skipped(self, quality: Optional[Dict]) -> bool:
+        """Whether a file is marked invalid instead of being sent to Gemini"""
+        return settings.QUALITY_GATE_ACTION == "skip" and self.flagged(quality)
+
+# Global instance
+quality_gate = QualityGate()
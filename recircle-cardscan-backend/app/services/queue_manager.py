@@ -1,83 +1,59 @@
-import threading
-import time
 from typing import Dict, List, Optional
 from datetime import datetime
+from app.core.state_backend import MISSING, state_backend
+
+# Statuses counted in each batch's metadata
+COUNTED_STATUSES = ("completed", "processing", "waiting", "failed")
 
 class QueueManager:
-    """Dual queue system for sequential processing"""
-    
-    def __init__(self):
-        self._batches: Dict[str, Dict] = {}
-        self._lock = threading.Lock()
-    
-    def initialize_batch(self, batch_id: str, files_list: List[Dict]) -> None:
+    """Dual queue system for sequential processing
+
+    Each batch is stored as separate entries in the shared state backend: one per input file
+    (keyed by file_id, with its queue position), one per file's outputs, and status counters
+    kept as their own integer fields. A status change touches only that file's entry and two
+    counters, so it costs the same for file 1 and file 300 and workers never overwrite each
+    other's changes. Backend calls run off the event loop when the backend does I/O.
+    """
+
+    FILES = "queue_files"
+    OUTPUTS = "queue_outputs"
+    COUNTERS = "queue_counters"
+
+    async def initialize_batch(self, batch_id: str, files_list: List[Dict]) -> None:
         """Initialize batch with input queue"""
-        with self._lock:
-            self._batches[batch_id] = {
-                "input_queue": [
-                    {
-                        "file_id": file_info["file_id"],
-                        "filename": file_info["filename"],
-                        "file_path": file_info["file_path"],
-                        "status": "waiting",
-                        "position": i + 1,
-                        "uploaded_at": datetime.now().isoformat()
-                    }
-                    for i, file_info in enumerate(files_list)
-                ],
-                "output_queue": [],
-                "metadata": {
-                    "total": len(files_list),
-                    "completed": 0,
-                    "processing": 0,
-                    "waiting": len(files_list),
-                    "failed": 0,
-                    "current_file_id": None
-                }
-            }
-    
-    def get_next_from_input_queue(self, batch_id: str) -> Optional[Dict]:
+        await state_backend.run(self._initialize, batch_id, files_list)
+
+    async def add_file(self, batch_id: str, file_info: Dict) -> None:
+        """Append a newly completed upload to an existing batch's input queue"""
+        await state_backend.run(self._append_input, batch_id, file_info)
+
+    async def get_next_from_input_queue(self, batch_id: str) -> Optional[Dict]:
         """Get next file from input queue"""
-        with self._lock:
-            if batch_id not in self._batches:
-                return None
-            
-            input_queue = self._batches[batch_id]["input_queue"]
-            for file_info in input_queue:
-                if file_info["status"] == "waiting":
-                    file_info["status"] = "processing"
-                    self._batches[batch_id]["metadata"]["current_file_id"] = file_info["file_id"]
-                    self._update_metadata(batch_id)
-                    return file_info.copy()
+        def take_next() -> Optional[Dict]:
+            for file_info in self._input_files(batch_id):
+                if file_info["status"] != "waiting":
+                    continue
+                # Another worker may have taken it since the read - only claim it if it is still waiting
+                if self._set_status(batch_id, file_info["file_id"], "processing", only_from="waiting"):
+                    state_backend.set_field(self.COUNTERS, batch_id, "current_file_id", file_info["file_id"])
+                    return {**file_info, "status": "processing"}
             return None
-    
-    def update_input_status(self, batch_id: str, file_id: str, status: str) -> None:
+
+        return await state_backend.run(take_next)
+
+    async def update_input_status(self, batch_id: str, file_id: str, status: str) -> None:
         """Update file status in input queue"""
-        with self._lock:
-            if batch_id not in self._batches:
-                return
-            
-            input_queue = self._batches[batch_id]["input_queue"]
-            for file_info in input_queue:
-                if file_info["file_id"] == file_id:
-                    file_info["status"] = status
-                    break
-            
-            self._update_metadata(batch_id)
-    
-    def add_to_output_queue(self, batch_id: str, file_id: str, extracted_data: Dict, processing_time: float) -> None:
+        await state_backend.run(self._set_status, batch_id, file_id, status)
+
+    async def set_file_fields(self, batch_id: str, file_id: str, **fields) -> None:
+        """Attach stage results (validation, extracted records, errors) to a queued file"""
+        await state_backend.run(state_backend.update_field, self.FILES, batch_id, file_id,
+                                lambda file_info: {**file_info, **fields})
+
+    async def add_to_output_queue(self, batch_id: str, file_id: str, extracted_data: Dict, processing_time: float) -> None:
         """Add completed file to output queue with same file_id"""
-        with self._lock:
-            if batch_id not in self._batches:
-                return
-            
-            # Find file in input queue
-            input_file = None
-            for file_info in self._batches[batch_id]["input_queue"]:
-                if file_info["file_id"] == file_id:
-                    input_file = file_info
-                    break
-            
+        def add_output() -> None:
+            input_file = state_backend.get_field(self.FILES, batch_id, file_id)
             if input_file:
                 # Add to output queue with same file_id
                 output_item = {
@@ -86,91 +62,117 @@ class QueueManager:
                     "status": "completed",
                     "extracted_data": extracted_data,
                     "processing_time": processing_time,
-                    "completed_at": datetime.now().isoformat()
+                    "completed_at": datetime.now().isoformat(),
+                    "sequence": state_backend.increment(self.COUNTERS, batch_id, "outputs")
                 }
-                
-                self._batches[batch_id]["output_queue"].append(output_item)
-                
+                state_backend.update_field(self.OUTPUTS, batch_id, file_id, lambda items: items + [output_item], [])
+
                 # Update input queue status
-                input_file["status"] = "completed"
-                
-                self._update_metadata(batch_id)
-    
-    def get_file_pair(self, batch_id: str, file_id: str) -> Dict:
+                self._set_status(batch_id, file_id, "completed")
+
+        await state_backend.run(add_output)
+
+    async def get_file_pair(self, batch_id: str, file_id: str) -> Dict:
         """Get both input and output for same file_id"""
-        with self._lock:
-            if batch_id not in self._batches:
-                return {"input": None, "output": None}
-            
-            batch = self._batches[batch_id]
-            
-            # Find in input queue
-            input_file = None
-            for file_info in batch["input_queue"]:
-                if file_info["file_id"] == file_id:
-                    input_file = file_info.copy()
-                    break
-            
-            # Find in output queue
-            output_file = None
-            for file_info in batch["output_queue"]:
-                if file_info["file_id"] == file_id:
-                    output_file = file_info.copy()
-                    break
-            
-            return {"input": input_file, "output": output_file}
-    
-    def get_all_outputs(self, batch_id: str) -> List[Dict]:
+        def pair() -> Dict:
+            outputs = state_backend.get_field(self.OUTPUTS, batch_id, file_id)
+            return {
+                "input": state_backend.get_field(self.FILES, batch_id, file_id),
+                "output": self._public_output(outputs[0]) if outputs else None
+            }
+
+        return await state_backend.run(pair)
+
+    async def get_all_outputs(self, batch_id: str) -> List[Dict]:
         """Get all completed outputs for CSV"""
-        with self._lock:
-            if batch_id not in self._batches:
-                return []
-            
-            outputs = []
-            for output in self._batches[batch_id]["output_queue"]:
-                outputs.append({
-                    "file_id": output["file_id"],
-                    "filename": output["filename"],
-                    **output["extracted_data"]
-                })
-            return outputs
-    
-    def get_batch_summary(self, batch_id: str) -> Optional[Dict]:
+        return [
+            {
+                "file_id": output["file_id"],
+                "filename": output["filename"],
+                **output["extracted_data"]
+            }
+            for output in await self.get_output_queue(batch_id)
+        ]
+
+    async def get_batch_summary(self, batch_id: str) -> Optional[Dict]:
         """Get batch metadata"""
-        with self._lock:
-            if batch_id not in self._batches:
-                return None
-            return self._batches[batch_id]["metadata"].copy()
-    
-    def get_input_queue(self, batch_id: str) -> List[Dict]:
+        counters = await state_backend.run(state_backend.get_fields, self.COUNTERS, batch_id)
+        if not counters:
+            return None
+        summary = {"total": 0, **{status: 0 for status in COUNTED_STATUSES}, "current_file_id": None}
+        summary.update((name, value) for name, value in counters.items() if name in summary)
+        return summary
+
+    async def get_input_queue(self, batch_id: str) -> List[Dict]:
         """Get input queue status"""
-        with self._lock:
-            if batch_id not in self._batches:
-                return []
-            return [f.copy() for f in self._batches[batch_id]["input_queue"]]
-    
-    def get_output_queue(self, batch_id: str) -> List[Dict]:
+        return await state_backend.run(self._input_files, batch_id)
+
+    async def get_output_queue(self, batch_id: str) -> List[Dict]:
         """Get output queue"""
-        with self._lock:
-            if batch_id not in self._batches:
-                return []
-            return [f.copy() for f in self._batches[batch_id]["output_queue"]]
-    
-    def _update_metadata(self, batch_id: str) -> None:
-        """Update batch metadata"""
-        batch = self._batches[batch_id]
-        input_queue = batch["input_queue"]
-        
-        metadata = {
-            "total": len(input_queue),
-            "completed": sum(1 for f in input_queue if f["status"] == "completed"),
-            "processing": sum(1 for f in input_queue if f["status"] == "processing"),
-            "waiting": sum(1 for f in input_queue if f["status"] == "waiting"),
-            "failed": sum(1 for f in input_queue if f["status"] == "failed"),
-            "current_file_id": batch["metadata"].get("current_file_id")
-        }
-        
-        batch["metadata"] = metadata
+        outputs = await state_backend.run(state_backend.get_fields, self.OUTPUTS, batch_id)
+        items = sorted((item for items in outputs.values() for item in items), key=lambda item: item["sequence"])
+        return [self._public_output(item) for item in items]
+
+    async def delete_batch(self, batch_id: str) -> None:
+        """Drop a batch's queues and counters"""
+        def delete() -> None:
+            for namespace in (self.FILES, self.OUTPUTS, self.COUNTERS):
+                state_backend.delete_fields(namespace, batch_id)
+
+        await state_backend.run(delete)
+
+    def _initialize(self, batch_id: str, files_list: List[Dict]) -> None:
+        for namespace in (self.FILES, self.OUTPUTS, self.COUNTERS):
+            state_backend.delete_fields(namespace, batch_id)
+        # The counters' presence is what marks the batch as existing
+        state_backend.set_field(self.COUNTERS, batch_id, "total", 0)
+        for file_info in files_list:
+            self._append_input(batch_id, file_info)
+
+    def _append_input(self, batch_id: str, file_info: Dict) -> None:
+        """Add a file to the input queue and count it"""
+        position = state_backend.increment(self.COUNTERS, batch_id, "total")
+        state_backend.set_field(self.FILES, batch_id, file_info["file_id"], {
+            "file_id": file_info["file_id"],
+            "filename": file_info["filename"],
+            "file_path": file_info["file_path"],
+            "probe": file_info.get("probe"),
+            "quality": file_info.get("quality"),
+            "status": "waiting",
+            "position": position,
+            "uploaded_at": datetime.now().isoformat()
+        })
+        state_backend.increment(self.COUNTERS, batch_id, "waiting")
+
+    def _set_status(self, batch_id: str, file_id: str, status: str, only_from: Optional[str] = None) -> bool:
+        """Change one file's status and move it between counters; False if the file isn't queued
+        (or, with only_from, no longer has that status)"""
+        previous = None
+
+        def change(file_info: Dict) -> Dict:
+            nonlocal previous
+            previous = file_info["status"]
+            if only_from is not None and previous != only_from:
+                return file_info
+            return {**file_info, "status": status}
+
+        if state_backend.update_field(self.FILES, batch_id, file_id, change) is MISSING:
+            return False
+        if only_from is not None and previous != only_from:
+            return False
+        if previous != status:
+            if previous in COUNTED_STATUSES:
+                state_backend.increment(self.COUNTERS, batch_id, previous, -1)
+            if status in COUNTED_STATUSES:
+                state_backend.increment(self.COUNTERS, batch_id, status)
+        return True
+
+    def _input_files(self, batch_id: str) -> List[Dict]:
+        return sorted(state_backend.get_fields(self.FILES, batch_id).values(), key=lambda f: f["position"])
+
+    @staticmethod
+    def _public_output(item: Dict) -> Dict:
+        return {name: value for name, value in item.items() if name != "sequence"}
 
 # Global instance
-queue_manager = QueueManager()
\ No newline at end of file
+queue_manager = QueueManager()
@@ -0,0 +1,249 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Set
+from app.config import settings
+from app.core.blob_store import blob_store
+from app.core.file_index import file_index
+from app.utils.logger import app_logger
+
+class StorageLifecycleManager:
+    """Evicts uploads and generated artifacts by TTL and LRU to keep storage under quota"""
+
+    def __init__(self):
+        # Generated files (CSV exports, PDF renders) keyed by path
+        self._artifacts: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.evicted_batches = 0
+        self.evicted_artifacts = 0
+        self.expired_uploads = 0
+
+    def track(self, path: str, batch_id: Optional[str] = None, kind: str = "artifact") -> str:
+        """Register a file the app created so it is cleaned up later; returns the path"""
+        now = time.time()
+        with self._lock:
+            self._artifacts[path] = {
+                "path": path,
+                "batch_id": batch_id,
+                "kind": kind,
+                "created_at": now,
+                "last_access": now
+            }
+        return path
+
+    def release(self, path: str) -> int:
+        """Delete a tracked artifact now that it is no longer needed; returns the bytes freed"""
+        with self._lock:
+            self._artifacts.pop(path, None)
+        size = self._size(path)
+        if os.path.exists(path):
+            os.remove(path)
+        return size
+
+    def touch_batch(self, batch_id: str) -> None:
+        """Mark a batch as recently used so LRU eviction keeps it (recorded in the file index, so
+        every API worker and the next restart see it)"""
+        file_index.touch_batch(batch_id, time.time())
+
+    def start(self) -> None:
+        """Start the background sweep loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                app_logger.error(f"[LIFECYCLE] Sweep failed: {e}")
+            await asyncio.sleep(settings.LIFECYCLE_SWEEP_SECONDS)
+
+    async def sweep(self) -> Dict:
+        """One eviction pass: abandoned uploads, expired artifacts, expired batches, then LRU down to quota"""
+        now = time.time()
+        evicted = {"artifacts": 0, "batches": 0, "uploads": await self._expire_uploads(now)}
+
+        # 1. Artifacts past their TTL
+        artifact_ttl = settings.ARTIFACT_TTL_MINUTES * 60
+        for artifact in self._artifact_snapshot():
+            if now - artifact["created_at"] > artifact_ttl and not await self._batch_in_use(artifact["batch_id"]):
+                await asyncio.to_thread(self._evict_artifact, artifact["path"])
+                evicted["artifacts"] += 1
+
+        # 2. Batches past their TTL
+        batch_ttl = settings.BATCH_TTL_HOURS * 3600
+        for batch in await asyncio.to_thread(self._batches_by_last_access):
+            if now - batch["last_access"] > batch_ttl and not await self._batch_in_use(batch["batch_id"]):
+                await self._evict_batch(batch["batch_id"])
+                evicted["batches"] += 1
+
+        # 3. Least recently used first until back under quota. Usage is measured once and each
+        # eviction subtracts what it freed, rather than rescanning storage after every one
+        quota_bytes = settings.STORAGE_QUOTA_MB * 1024 * 1024
+        usage = await asyncio.to_thread(self._usage_bytes)
+        if usage > quota_bytes:
+            candidates = sorted(self._artifact_snapshot(), key=lambda a: a["last_access"])
+            for artifact in candidates:
+                if usage <= quota_bytes:
+                    break
+                if not await self._batch_in_use(artifact["batch_id"]):
+                    usage -= await asyncio.to_thread(self._evict_artifact, artifact["path"])
+                    evicted["artifacts"] += 1
+
+            for batch in await asyncio.to_thread(self._batches_by_last_access):
+                if usage <= quota_bytes:
+                    break
+                if not await self._batch_in_use(batch["batch_id"]):
+                    usage -= await self._evict_batch(batch["batch_id"])
+                    evicted["batches"] += 1
+
+            if usage > quota_bytes:
+                app_logger.error("[LIFECYCLE] Storage still over quota - remaining batches are in use")
+
+        if evicted["artifacts"] or evicted["batches"] or evicted["uploads"]:
+            app_logger.info(f"[LIFECYCLE] Evicted {evicted['batches']} batches, {evicted['artifacts']} artifacts, "
+                            f"{evicted['uploads']} abandoned upload files")
+        return evicted
+
+    def get_stats(self) -> Dict:
+        """Current storage usage and eviction counters"""
+        artifacts = self._artifact_snapshot()
+        blob_stats = blob_store.get_stats()
+        return {
+            "usage_bytes": self._usage_bytes(),
+            "legacy_bytes": file_index.legacy_bytes(),
+            "quota_bytes": settings.STORAGE_QUOTA_MB * 1024 * 1024,
+            "blob_bytes": blob_stats["stored_bytes"],
+            "blobs": blob_stats["blobs"],
+            "deduplicated_files": blob_stats["deduplicated_files"],
+            "batches": len(file_index.list_batches()),
+            "artifacts": len(artifacts),
+            "artifact_bytes": sum(self._size(a["path"]) for a in artifacts),
+            "incoming_bytes": sum(self._size(path) for path in self._incoming_files()),
+            "evicted_batches": self.evicted_batches,
+            "evicted_artifacts": self.evicted_artifacts,
+            "expired_uploads": self.expired_uploads
+        }
+
+    def _artifact_snapshot(self) -> List[Dict]:
+        with self._lock:
+            return [dict(a) for a in self._artifacts.values()]
+
+    def _batches_by_last_access(self) -> List[Dict]:
+        """Indexed batches, oldest access first (upload time if never touched)"""
+        from datetime import datetime
+        batches = [
+            {**batch, "last_access": batch["last_access"] or datetime.fromisoformat(batch["created_at"]).timestamp()}
+            for batch in file_index.list_batches()
+        ]
+        return sorted(batches, key=lambda b: b["last_access"])
+
+    def _usage_bytes(self) -> int:
+        """Blobs, uploads from before the blob store, tracked artifacts and uploads still being written
+        (streamed files and resumable .part files)"""
+        return (
+            blob_store.get_stats()["stored_bytes"]
+            + file_index.legacy_bytes()
+            + sum(self._size(a["path"]) for a in self._artifact_snapshot())
+            + sum(self._size(path) for path in self._incoming_files())
+        )
+
+    def _incoming_files(self) -> List[str]:
+        """Untracked files in the upload staging directory - nothing stays there once it is complete.
+        Page renders are saved there too, but they are tracked artifacts and counted as those"""
+        incoming_dir = os.path.join(settings.TEMP_STORAGE_PATH, "incoming")
+        if not os.path.isdir(incoming_dir):
+            return []
+        with self._lock:
+            tracked = set(self._artifacts)
+        return [entry.path for entry in os.scandir(incoming_dir) if entry.is_file() and entry.path not in tracked]
+
+    async def _expire_uploads(self, now: float) -> int:
+        """Drop idle resumable sessions, then staged files nobody has written to within UPLOAD_TTL_HOURS
+        (left by those sessions, by uploads cut off mid-stream, or by a restart); returns files deleted"""
+        from app.services.upload_session_manager import upload_session_manager
+
+        ttl = settings.UPLOAD_TTL_HOURS * 3600
+        for batch_id in await upload_session_manager.expire_idle(ttl):
+            app_logger.info(f"[LIFECYCLE] Expired idle upload session {batch_id}")
+
+        # A live session's part file can sit untouched while the client sends its other files
+        live_parts = await upload_session_manager.part_paths()
+        deleted = await asyncio.to_thread(self._expire_staged, now - ttl, live_parts)
+        self.expired_uploads += deleted
+        return deleted
+
+    def _expire_staged(self, cutoff: float, live_parts: Set[str]) -> int:
+        """Delete staged files last written before cutoff, other than live part files; returns how many"""
+        deleted = 0
+        for path in self._incoming_files():
+            if path in live_parts:
+                continue
+            try:
+                # Every chunk written bumps the mtime, so this only catches files nobody is writing
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    deleted += 1
+            except FileNotFoundError:
+                # Completed and moved into the blob store meanwhile
+                continue
+        return deleted
+
+    async def _batch_in_use(self, batch_id: Optional[str]) -> bool:
+        """A batch is in use while it is being processed or someone is watching it"""
+        if not batch_id:
+            return False
+
+        from app.services.pipeline_engine import pipeline_engine
+        from app.services.websocket_manager import websocket_manager
+        from app.routers.process import processing_status
+
+        if pipeline_engine.is_active(batch_id) or await websocket_manager.has_connections(batch_id):
+            return True
+        return (await processing_status.get(batch_id, {})).get("status") == "processing"
+
+    def _evict_artifact(self, path: str) -> int:
+        freed = self.release(path)
+        self.evicted_artifacts += 1
+        return freed
+
+    async def _evict_batch(self, batch_id: str) -> int:
+        """Drop a batch's files, artifacts and state everywhere; returns the bytes freed"""
+        from app.utils.file_manager import FileManager
+        from app.routers.upload import batch_storage, validation_storage
+        from app.services.pipeline_engine import pipeline_engine
+        from app.services.queue_manager import queue_manager
+        from app.services.job_registry import job_registry
+
+        freed = await asyncio.to_thread(FileManager.cleanup_temp_files, batch_id)
+        await pipeline_engine.forget_batch(batch_id)
+        await queue_manager.delete_batch(batch_id)
+        await job_registry.forget(batch_id)
+        await batch_storage.pop(batch_id)
+        await validation_storage.pop(batch_id)
+
+        with self._lock:
+            batch_artifacts = [p for p, a in self._artifacts.items() if a["batch_id"] == batch_id]
+        for path in batch_artifacts:
+            freed += await asyncio.to_thread(self.release, path)
+
+        self.evicted_batches += 1
+        app_logger.info(f"[LIFECYCLE] Evicted batch {batch_id}")
+        return freed
+
+    @staticmethod
+    def _size(path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+# Global instance
+storage_lifecycle = StorageLifecycleManager()
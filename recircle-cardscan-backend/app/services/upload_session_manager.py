@@ -0,0 +1,286 @@
+import os
+import time
+import hashlib
+import aiofiles
+from typing import Dict, List, Optional, Set, Tuple
+from datetime import datetime
+from fastapi import HTTPException
+from app.core.stage_metrics import stage_metrics
+from app.core.state_backend import MISSING, state_backend
+from app.utils.file_validator import FileValidator
+from app.utils.file_manager import FileManager
+
+class ChunkTooLarge(ValueError):
+    """A chunk request carried more bytes than the per-chunk limit"""
+
+class UploadSessionManager:
+    """Tracks resumable uploads: declared files, received byte ranges and completion.
+
+    Sessions live in the shared state backend, so a client's chunks can land on any API
+    worker: the session's totals are one entry and each declared file is its own field,
+    both changed only through atomic updates. Part files are written under TEMP_STORAGE_PATH,
+    which the workers share.
+    """
+
+    SESSIONS = "upload_sessions"
+    FILES = "upload_files"
+
+    async def create_session(self, batch_id: str) -> Dict:
+        """Open a new resumable upload session for a batch"""
+        def create() -> Dict:
+            state_backend.delete_fields(self.FILES, batch_id)
+            state_backend.set(self.SESSIONS, batch_id, {
+                "batch_id": batch_id,
+                "file_count": 0,
+                "total_bytes": 0,
+                "finalized": False,
+                "created_at": datetime.now().isoformat(),
+                "last_activity": time.time()
+            })
+            return self._session_summary(batch_id)
+
+        return await state_backend.run(create)
+
+    async def has_session(self, batch_id: str) -> bool:
+        return await state_backend.run(state_backend.contains, self.SESSIONS, batch_id)
+
+    async def register_file(self, batch_id: str, file_id: str, filename: str, size: int, content_type: str,
+                            max_files: int, max_total_bytes: int) -> Dict:
+        """Declare a file that will be sent in chunks and reserve its space on disk.
+
+        The session's file count and byte total are checked and updated in one atomic update,
+        so concurrent declarations - on any worker - can't both squeeze past a limit.
+        """
+        final_path = FileManager.incoming_path(file_id, filename)
+        part_path = f"{final_path}.part"
+
+        def reserve(session: Dict) -> Dict:
+            if session["finalized"]:
+                raise ValueError("Upload batch already finalized")
+            if session["file_count"] >= max_files:
+                raise ValueError(f"Maximum {max_files} files allowed")
+            if session["total_bytes"] + size > max_total_bytes:
+                raise ValueError(f"Total batch size exceeds {max_total_bytes // (1024 * 1024)}MB limit")
+            return {
+                **session,
+                "file_count": session["file_count"] + 1,
+                "total_bytes": session["total_bytes"] + size,
+                "last_activity": time.time()
+            }
+
+        def register() -> Dict:
+            session = state_backend.update(self.SESSIONS, batch_id, reserve)
+            if session is MISSING:
+                raise ValueError("Upload batch not found")
+            entry = {
+                "file_id": file_id,
+                "filename": filename,
+                "file_type": content_type,
+                "size": size,
+                "part_path": part_path,
+                "file_path": final_path,
+                "ranges": [],
+                "status": "uploading",
+                "position": session["file_count"]
+            }
+            state_backend.set_field(self.FILES, batch_id, file_id, entry)
+
+            # Pre-size the part file so chunks can be written at any offset
+            with open(part_path, 'wb') as f:
+                f.truncate(size)
+            return self._file_summary(entry)
+
+        return await state_backend.run(register)
+
+    async def get_file(self, batch_id: str, file_id: str) -> Optional[Dict]:
+        return await state_backend.run(state_backend.get_field, self.FILES, batch_id, file_id)
+
+    async def get_file_status(self, batch_id: str, file_id: str) -> Optional[Dict]:
+        """Report which byte ranges of a file have been received"""
+        entry = await self.get_file(batch_id, file_id)
+        return self._file_summary(entry) if entry else None
+
+    async def get_session(self, batch_id: str) -> Optional[Dict]:
+        return await state_backend.run(self._session_summary, batch_id)
+
+    async def write_chunk(self, batch_id: str, file_id: str, offset: int, stream, max_chunk_bytes: int) -> Tuple[Dict, bool]:
+        """Write a chunk at offset; returns the file status and whether this chunk completed the file.
+
+        Bytes are counted as they arrive, so a request without Content-Length is held to
+        max_chunk_bytes too; a rejected chunk's bytes are never recorded as received.
+        """
+        file_entry = await self.get_file(batch_id, file_id)
+
+        written = 0
+        async with aiofiles.open(file_entry["part_path"], 'r+b') as out_file:
+            await out_file.seek(offset)
+            async for chunk in stream:
+                if written + len(chunk) > max_chunk_bytes:
+                    raise ChunkTooLarge(f"Chunk exceeds {max_chunk_bytes // (1024 * 1024)}MB limit")
+                if offset + written + len(chunk) > file_entry["size"]:
+                    raise ValueError(f"Chunk overruns declared size of {file_entry['size']} bytes")
+                await out_file.write(chunk)
+                written += len(chunk)
+
+        just_completed = False
+
+        def record(entry: Dict) -> Dict:
+            nonlocal just_completed
+            ranges = self._merge_range(entry["ranges"], offset, offset + written) if written else entry["ranges"]
+            # Only the chunk that closes the last gap completes the file
+            just_completed = entry["status"] == "uploading" and ranges == [[0, entry["size"]]]
+            return {**entry, "ranges": ranges, "status": "assembling" if just_completed else entry["status"]}
+
+        def record_chunk() -> Dict:
+            entry = state_backend.update_field(self.FILES, batch_id, file_id, record)
+            self._touch(batch_id)
+            return entry
+
+        entry = await state_backend.run(record_chunk)
+
+        if just_completed:
+            entry = await self._complete_file(batch_id, file_id)
+
+        return self._file_summary(entry), just_completed
+
+    async def finalize(self, batch_id: str) -> Dict:
+        """Close the session once every declared file is complete"""
+        def finalize() -> Dict:
+            files = state_backend.get_fields(self.FILES, batch_id).values()
+            pending = [f["filename"] for f in files if f["status"] not in ("completed", "rejected")]
+            if pending:
+                raise ValueError(f"{len(pending)} files still incomplete: {', '.join(pending[:5])}")
+            state_backend.update(self.SESSIONS, batch_id, lambda session: {**session, "finalized": True})
+            return self._session_summary(batch_id)
+
+        return await state_backend.run(finalize)
+
+    async def expire_idle(self, ttl_seconds: float) -> List[str]:
+        """Drop sessions with no activity for ttl_seconds and delete their unfinished part files;
+        returns the expired batch ids. Completed files are already in the blob store and stay."""
+        def expire() -> List[str]:
+            cutoff = time.time() - ttl_seconds
+            expired = []
+            for batch_id in state_backend.keys(self.SESSIONS):
+                session = state_backend.get(self.SESSIONS, batch_id)
+                if not session or session["last_activity"] >= cutoff:
+                    continue
+                state_backend.delete(self.SESSIONS, batch_id)
+                for entry in state_backend.get_fields(self.FILES, batch_id).values():
+                    if entry["status"] != "completed" and os.path.exists(entry["part_path"]):
+                        os.remove(entry["part_path"])
+                state_backend.delete_fields(self.FILES, batch_id)
+                expired.append(batch_id)
+            return expired
+
+        return await state_backend.run(expire)
+
+    async def part_paths(self) -> Set[str]:
+        """Part files of every open session's unfinished files"""
+        def collect() -> Set[str]:
+            return {
+                entry["part_path"]
+                for batch_id in state_backend.keys(self.SESSIONS)
+                for entry in state_backend.get_fields(self.FILES, batch_id).values() if entry["status"] != "completed"
+            }
+
+        return await state_backend.run(collect)
+
+    async def completed_files(self, batch_id: str) -> List[Dict]:
+        """File info dicts for completed files, in the shape batch_storage uses"""
+        return [self._file_info(f) for f in await state_backend.run(self._files, batch_id) if f["status"] == "completed"]
+
+    async def _complete_file(self, batch_id: str, file_id: str) -> Dict:
+        """Move the assembled part file into place, probe its headers, hash it and store the blob"""
+        file_entry = await self.get_file(batch_id, file_id)
+        os.replace(file_entry["part_path"], file_entry["file_path"])
+
+        try:
+            with stage_metrics.timer("probe"):
+                probe = FileValidator.probe_file(file_entry["file_path"], file_entry["filename"])
+        except HTTPException:
+            os.remove(file_entry["file_path"])
+            await state_backend.run(state_backend.update_field, self.FILES, batch_id, file_id,
+                                    lambda entry: {**entry, "status": "rejected"})
+            raise
+
+        sha256 = hashlib.sha256()
+        async with aiofiles.open(file_entry["file_path"], 'rb') as f:
+            while True:
+                chunk = await f.read(1024 * 1024)
+                if not chunk:
+                    break
+                sha256.update(chunk)
+
+        file_info = FileManager.store_blob({
+            **self._file_info(file_entry),
+            "sha256": sha256.hexdigest(),
+            "file_type": probe["file_type"]
+        }, batch_id)
+
+        return await state_backend.run(state_backend.update_field, self.FILES, batch_id, file_id, lambda entry: {
+            **entry,
+            "sha256": file_info["sha256"],
+            "probe": probe,
+            "file_type": probe["file_type"],
+            "file_path": file_info["file_path"],
+            "status": "completed"
+        })
+
+    def _touch(self, batch_id: str) -> None:
+        state_backend.update(self.SESSIONS, batch_id, lambda session: {**session, "last_activity": time.time()})
+
+    def _files(self, batch_id: str) -> List[Dict]:
+        return sorted(state_backend.get_fields(self.FILES, batch_id).values(), key=lambda f: f["position"])
+
+    @staticmethod
+    def _merge_range(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+        """Insert [start, end) into a sorted list of disjoint ranges, merging overlaps"""
+        merged = []
+        for r_start, r_end in sorted(ranges + [[start, end]]):
+            if merged and r_start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], r_end)
+            else:
+                merged.append([r_start, r_end])
+        return merged
+
+    @staticmethod
+    def _file_info(entry: Dict) -> Dict:
+        return {
+            "file_id": entry["file_id"],
+            "filename": entry["filename"],
+            "file_type": entry["file_type"],
+            "size": entry["size"],
+            "sha256": entry.get("sha256"),
+            "file_path": entry["file_path"],
+            "probe": entry.get("probe")
+        }
+
+    @staticmethod
+    def _file_summary(entry: Dict) -> Dict:
+        received = sum(end - start for start, end in entry["ranges"])
+        return {
+            "file_id": entry["file_id"],
+            "filename": entry["filename"],
+            "size": entry["size"],
+            "received_bytes": received,
+            "received_ranges": [list(r) for r in entry["ranges"]],
+            "status": entry["status"]
+        }
+
+    def _session_summary(self, batch_id: str) -> Optional[Dict]:
+        session = state_backend.get(self.SESSIONS, batch_id)
+        if not session:
+            return None
+        files = [self._file_summary(f) for f in self._files(batch_id)]
+        return {
+            "batch_id": batch_id,
+            "finalized": session["finalized"],
+            "total_bytes": session["total_bytes"],
+            "completed_files": sum(1 for f in files if f["status"] == "completed"),
+            "total_files": len(files),
+            "files": files
+        }
+
+# Global instance
+upload_session_manager = UploadSessionManager()
@@ -1,14 +1,31 @@
 import asyncio
 import json
-from typing import Dict, List
+import time
+from typing import Dict, List, Optional
 from fastapi import WebSocket
+from app.core.state_backend import state_backend
+
+# How often each worker re-publishes its connection counts, and how long a count lasts without that
+CONNECTION_HEARTBEAT_SECONDS = 10
+CONNECTION_TTL_SECONDS = 30
 
 class WebSocketManager:
-    """Manage WebSocket connections for real-time updates"""
+    """Manage WebSocket connections for real-time updates
+
+    Each API worker holds its own sockets. Messages go out through the shared state backend,
+    so a client connected to one worker hears about files processed by another. Each worker
+    also publishes how many sockets it holds per batch, as its own field stamped with the
+    time, and re-stamps them on a heartbeat; a worker that dies stops stamping, so its counts
+    expire after CONNECTION_TTL_SECONDS instead of marking the batch watched forever.
+    """
+    
+    NAMESPACE = "ws_connections"
     
     def __init__(self):
         self._connections: Dict[str, List[WebSocket]] = {}
         self._lock = asyncio.Lock()
+        self._heartbeat: Optional[asyncio.Task] = None
+        state_backend.subscribe(self._send_local)
     
     async def connect(self, batch_id: str, websocket: WebSocket) -> None:
         """Add new WebSocket connection"""
@@ -18,6 +35,10 @@ class WebSocketManager:
             if batch_id not in self._connections:
                 self._connections[batch_id] = []
             self._connections[batch_id].append(websocket)
+        await self._publish_count(batch_id)
+        
+        if self._heartbeat is None:
+            self._heartbeat = asyncio.create_task(self._refresh_counts())
     
     async def disconnect(self, batch_id: str, websocket: WebSocket) -> None:
         """Remove WebSocket connection"""
@@ -29,9 +50,22 @@ class WebSocketManager:
                 # Clean up empty batch
                 if not self._connections[batch_id]:
                     del self._connections[batch_id]
+        await self._publish_count(batch_id)
+    
+    async def has_connections(self, batch_id: str) -> bool:
+        """Check if anyone is watching a batch, on any worker"""
+        if self._connections.get(batch_id):
+            return True
+        counts = await state_backend.run(state_backend.get_fields, self.NAMESPACE, batch_id)
+        cutoff = time.time() - CONNECTION_TTL_SECONDS
+        return any(count["connections"] > 0 and count["at"] > cutoff for count in counts.values())
     
     async def broadcast(self, batch_id: str, message: Dict) -> None:
-        """Broadcast message to all connections for batch"""
+        """Broadcast message to all connections for batch, whichever worker holds them"""
+        await state_backend.publish(batch_id, message)
+    
+    async def _send_local(self, batch_id: str, message: Dict) -> None:
+        """Send a published message to this worker's connections for the batch"""
         async with self._lock:
             if batch_id not in self._connections:
                 return
@@ -54,20 +88,17 @@ class WebSocketManager:
                     for dead_ws in dead_connections:
                         if dead_ws in self._connections[batch_id]:
                             self._connections[batch_id].remove(dead_ws)
+            await self._publish_count(batch_id)
     
     async def send_initial_status(self, batch_id: str, websocket: WebSocket) -> None:
         """Send initial status when client connects"""
         from app.routers.upload import batch_storage
-        from app.routers.process import file_status, file_lock
+        from app.routers.process import file_status
         
-        if batch_id in batch_storage:
-            files = batch_storage[batch_id]
-            
+        files = await batch_storage.get(batch_id)
+        if files is not None:
             # Get file status if available
-            current_status = {}
-            with file_lock:
-                if batch_id in file_status:
-                    current_status = file_status[batch_id]
+            current_status = await file_status.get(batch_id, {})
             
             await websocket.send_text(json.dumps({
                 "type": "initial_status",
@@ -76,10 +107,22 @@ class WebSocketManager:
                 "files": [{
                     "file_id": f["file_id"],
                     "filename": f["filename"],
-                    "status": current_status.get(f["file_id"], {}).get("status", "waiting")
+                    "status": current_status.get(f["file_id"], {}).get("status", "waiting"),
+                    "quality_issues": (f.get("quality") or {}).get("issues", [])
                 } for f in files],
                 "message": "Connected to WebSocket. Processing will start automatically."
             }))
+    
+    async def _publish_count(self, batch_id: str) -> None:
+        """Record how many sockets this worker holds for the batch (only this worker writes its field)"""
+        count = {"connections": len(self._connections.get(batch_id, [])), "at": time.time()}
+        await state_backend.run(state_backend.set_field, self.NAMESPACE, batch_id, state_backend.origin, count)
+    
+    async def _refresh_counts(self) -> None:
+        while True:
+            await asyncio.sleep(CONNECTION_HEARTBEAT_SECONDS)
+            for batch_id in list(self._connections):
+                await self._publish_count(batch_id)
 
 # Global instance
 websocket_manager = WebSocketManager()
\ No newline at end of file
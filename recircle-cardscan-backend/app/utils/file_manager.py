@@ -1,10 +1,16 @@
 import os
+import time
 import uuid
+import hashlib
 import aiofiles
-from fastapi import UploadFile
+from fastapi import UploadFile, HTTPException
 from app.config import settings
+from app.utils.file_validator import FileValidator
 from typing import Dict
 
+# Read uploads in 1MB chunks so no file is ever held in memory whole
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
 class FileManager:
     
     @staticmethod
@@ -20,32 +26,104 @@ class FileManager:
         return f"batch_{timestamp}"
     
     @staticmethod
-    async def save_uploaded_file(file: UploadFile, file_id: str) -> Dict:
-        """Save uploaded file to storage"""
-        # Create storage directory if not exists
-        os.makedirs(settings.TEMP_STORAGE_PATH, exist_ok=True)
+    def incoming_path(file_id: str, filename: str) -> str:
+        """Staging path for a file that is still being written, before it enters the blob store"""
+        incoming_dir = os.path.join(settings.TEMP_STORAGE_PATH, "incoming")
+        os.makedirs(incoming_dir, exist_ok=True)
         
         # Generate safe filename
-        file_extension = file.filename.split('.')[-1]
-        clean_filename = file.filename.replace('/', '_').replace('\\', '_')
-        safe_filename = f"{file_id}_{clean_filename}"
-        file_path = os.path.join(settings.TEMP_STORAGE_PATH, safe_filename)
+        clean_filename = filename.replace('/', '_').replace('\\', '_')
+        return os.path.join(incoming_dir, f"{file_id}_{clean_filename}")
+    
+    @staticmethod
+    def store_blob(file_info: Dict, batch_id: str) -> Dict:
+        """Move a staged file into the content-addressed blob store, point file_path at the blob and index it"""
+        from app.core.blob_store import blob_store
+        from app.core.file_index import file_index
+        
+        file_info["file_path"] = blob_store.put(
+            file_info["file_path"],
+            file_info["sha256"],
+            file_info["file_type"],
+            batch_id,
+            file_info["file_id"],
+            file_info["filename"]
+        )
+        file_index.add(batch_id, file_info)
+        return file_info
+    
+    @staticmethod
+    async def save_uploaded_file(file: UploadFile, file_id: str, batch_id: str, batch_bytes_used: int = 0) -> Dict:
+        """Stream uploaded file to storage, hashing and enforcing size limits as bytes arrive"""
+        from app.core.stage_metrics import stage_metrics
+        
+        file_path = FileManager.incoming_path(file_id, file.filename)
+        
+        max_file_bytes = settings.MAX_FILE_SIZE_MB * 1024 * 1024
+        max_batch_bytes = settings.MAX_BATCH_SIZE_MB * 1024 * 1024
+        sha256 = hashlib.sha256()
+        size = 0
+        started = time.perf_counter()
+        
+        # Save file asynchronously, one chunk at a time
+        try:
+            async with aiofiles.open(file_path, 'wb') as out_file:
+                while True:
+                    chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    
+                    size += len(chunk)
+                    if size > max_file_bytes:
+                        raise HTTPException(
+                            status_code=400,
+                            detail=f"File {file.filename} exceeds {settings.MAX_FILE_SIZE_MB}MB limit"
+                        )
+                    if batch_bytes_used + size > max_batch_bytes:
+                        raise HTTPException(
+                            status_code=400,
+                            detail=f"Total batch size exceeds {settings.MAX_BATCH_SIZE_MB}MB limit"
+                        )
+                    
+                    sha256.update(chunk)
+                    await out_file.write(chunk)
+        except Exception:
+            # Don't leave partial files behind when a limit aborts the stream
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+        stage_metrics.observe("upload", time.perf_counter() - started)
         
-        # Save file asynchronously
-        async with aiofiles.open(file_path, 'wb') as out_file:
-            content = await file.read()
-            await out_file.write(content)
+        # Check headers now so corrupt or mislabelled files never reach the pipeline
+        try:
+            with stage_metrics.timer("probe"):
+                probe = FileValidator.probe_file(file_path, file.filename)
+        except HTTPException:
+            os.remove(file_path)
+            raise
         
-        return {
+        return FileManager.store_blob({
             "file_id": file_id,
             "filename": file.filename,
-            "file_type": file.content_type,
-            "size": len(content),
-            "file_path": file_path
-        }
+            "file_type": probe["file_type"],
+            "size": size,
+            "sha256": sha256.hexdigest(),
+            "file_path": file_path,
+            "probe": probe
+        }, batch_id)
     
     @staticmethod
-    def cleanup_temp_files(batch_id: str) -> None:
-        """Delete temporary files after processing"""
-        # Implementation for cleanup
-        pass
\ No newline at end of file
+    def cleanup_temp_files(batch_id: str) -> int:
+        """Release a batch's stored files; blobs still referenced by other batches are kept. Returns the bytes freed"""
+        from app.core.blob_store import blob_store
+        from app.core.file_index import file_index, is_legacy_batch
+        freed = 0
+        if is_legacy_batch(batch_id):
+            # Uploads from before the blob store aren't blobs - nothing else can reference them
+            for entry in file_index.get_batch_files(batch_id):
+                if os.path.exists(entry["file_path"]):
+                    os.remove(entry["file_path"])
+                freed += entry["size"] or 0
+        freed += blob_store.release_batch(batch_id)
+        file_index.remove_batch(batch_id)
+        return freed
\ No newline at end of file
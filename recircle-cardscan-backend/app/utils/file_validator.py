@@ -1,6 +1,37 @@
 from fastapi import UploadFile, HTTPException
+from PIL import Image
 from app.config import settings
-from typing import List
+from typing import Dict, List, Optional
+import os
+
+# Leading bytes of each supported upload type
+MAGIC_SIGNATURES = {
+    b"\xff\xd8\xff": "image/jpeg",
+    b"\x89PNG\r\n\x1a\n": "image/png",
+    b"%PDF-": "application/pdf",
+}
+
+PROBE_HEADER_BYTES = 64
+EXIF_ORIENTATION_TAG = 0x0112
+
+# A PDF's %%EOF must fall within its last 1024 bytes - the same tolerance PDF readers apply
+PDF_EOF_MARKER = b"%%EOF"
+PDF_TRAILER_BYTES = 1024
+
+# JPEG start-of-scan and end-of-image markers. Entropy-coded data byte-stuffs every 0xFF, so the
+# first EOI after the first scan starts is the image's real end; anything after it (a motion photo's
+# video, MPF secondary images, editor metadata) is allowed
+JPEG_SOS = 0xDA
+JPEG_EOI = b"\xff\xd9"
+# Markers that carry no length field: TEM, RST0-7, SOI, EOI
+JPEG_STANDALONE_MARKERS = {0x01, *range(0xD0, 0xDA)}
+
+# PNG chunk header (length and type) and CRC; IEND is the last chunk, trailing bytes are allowed
+PNG_SIGNATURE_BYTES = 8
+PNG_CHUNK_HEADER_BYTES = 8
+PNG_CRC_BYTES = 4
+
+SCAN_CHUNK_BYTES = 1024 * 1024
 
 class FileValidator:
     
@@ -10,6 +41,118 @@ class FileValidator:
         ext = filename.split('.')[-1].lower()
         return ext in settings.allowed_extensions_list
     
+    @staticmethod
+    def detect_file_type(header: bytes) -> Optional[str]:
+        """Identify a supported file type from its magic bytes"""
+        for signature, mime_type in MAGIC_SIGNATURES.items():
+            if header.startswith(signature):
+                return mime_type
+        return None
+    
+    @staticmethod
+    def probe_file(file_path: str, filename: Optional[str] = None) -> Dict:
+        """Check type, completeness, dimensions and orientation from the file's structure, without decoding pixels"""
+        name = filename or os.path.basename(file_path)
+        
+        with open(file_path, 'rb') as f:
+            header = f.read(PROBE_HEADER_BYTES)
+            file_type = FileValidator.detect_file_type(header)
+            if not file_type:
+                raise HTTPException(status_code=400, detail=f"Unrecognised file content: {name}")
+            
+            # A file cut off mid-upload never reaches its end-of-file marker
+            if not FileValidator._is_complete(f, file_type):
+                raise HTTPException(status_code=400, detail=f"Truncated or corrupt file: {name}")
+        
+        probe = {"file_type": file_type, "width": None, "height": None, "orientation": 1}
+        if file_type == "application/pdf":
+            return probe
+        
+        try:
+            # Image.open is lazy - it parses headers and leaves pixel data undecoded
+            with Image.open(file_path) as image:
+                probe["width"], probe["height"] = image.size
+                probe["format"] = image.format
+                probe["mode"] = image.mode
+                probe["orientation"] = image.getexif().get(EXIF_ORIENTATION_TAG, 1)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Unreadable image {name}: {e}")
+        
+        megapixels = probe["width"] * probe["height"] / 1_000_000
+        if megapixels > settings.MAX_IMAGE_MEGAPIXELS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Image {name} is {megapixels:.0f}MP, limit is {settings.MAX_IMAGE_MEGAPIXELS}MP"
+            )
+        if min(probe["width"], probe["height"]) < settings.MIN_IMAGE_DIMENSION:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Image {name} is too small ({probe['width']}x{probe['height']})"
+            )
+        
+        return probe
+    
+    @staticmethod
+    def _is_complete(f, file_type: str) -> bool:
+        """Whether the file runs through its format's end marker"""
+        if file_type == "image/jpeg":
+            return FileValidator._jpeg_complete(f)
+        if file_type == "image/png":
+            return FileValidator._png_complete(f)
+        
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - PDF_TRAILER_BYTES))
+        return PDF_EOF_MARKER in f.read()
+    
+    @staticmethod
+    def _jpeg_complete(f) -> bool:
+        """Walk the marker segments to the first scan, then look for the EOI that ends it"""
+        f.seek(2)
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return False
+            # Any number of 0xFF fill bytes may precede a marker
+            while marker[1] == 0xFF:
+                marker = marker[1:] + f.read(1)
+                if len(marker) < 2:
+                    return False
+            if marker[1] in JPEG_STANDALONE_MARKERS:
+                if marker == JPEG_EOI:
+                    # An image with no scan at all
+                    return False
+                continue
+            length = int.from_bytes(f.read(2), "big")
+            if length < 2:
+                return False
+            f.seek(length - 2, os.SEEK_CUR)
+            if marker[1] == JPEG_SOS:
+                break
+        
+        # Chunks overlap by a byte so an EOI split across two reads is still found
+        previous = b""
+        while True:
+            chunk = f.read(SCAN_CHUNK_BYTES)
+            if not chunk:
+                return False
+            if JPEG_EOI in previous + chunk:
+                return True
+            previous = chunk[-1:]
+    
+    @staticmethod
+    def _png_complete(f) -> bool:
+        """Skip from chunk header to chunk header until IEND, without reading chunk data"""
+        f.seek(0, os.SEEK_END)
+        file_size = f.tell()
+        position = PNG_SIGNATURE_BYTES
+        while position + PNG_CHUNK_HEADER_BYTES <= file_size:
+            f.seek(position)
+            header = f.read(PNG_CHUNK_HEADER_BYTES)
+            if header[4:] == b"IEND":
+                return True
+            position += PNG_CHUNK_HEADER_BYTES + int.from_bytes(header[:4], "big") + PNG_CRC_BYTES
+        return False
+    
     @staticmethod
     async def validate_file_size(file: UploadFile, max_size_mb: int = 20) -> bool:
         """Check if individual file size is within limit (20MB default)"""
@@ -28,8 +171,8 @@ class FileValidator:
         return file_size <= max_size_bytes
     
     @staticmethod
-    async def validate_batch_size(files: List[UploadFile]) -> None:
-        """Check if number of files and total batch size exceeds limits"""
+    def validate_batch_size(files: List[UploadFile]) -> None:
+        """Check if number of files exceeds limit (byte limits are enforced while streaming to disk)"""
         from app.utils.logger import app_logger
         
         # Check file count limit
@@ -38,20 +181,4 @@ class FileValidator:
             app_logger.error(f"[UPLOAD] {error_msg}")
             raise HTTPException(status_code=400, detail=error_msg)
         
-        # Check total batch size (20MB limit)
-        max_batch_size_bytes = 20 * 1024 * 1024  # 20MB
-        total_size = 0
-        
-        for file in files:
-            content = await file.read()
-            total_size += len(content)
-            await file.seek(0)  # Reset file pointer
-        
-        total_size_mb = total_size / (1024 * 1024)
-        
-        if total_size > max_batch_size_bytes:
-            error_msg = f"Total batch size {total_size_mb:.1f}MB exceeds 20MB limit"
-            app_logger.error(f"[UPLOAD] {error_msg}")
-            raise HTTPException(status_code=400, detail=error_msg)
-        
-        app_logger.info(f"[UPLOAD] Batch validation passed: {len(files)} files, {total_size_mb:.1f}MB total")
\ No newline at end of file
+        app_logger.info(f"[UPLOAD] Batch validation passed: {len(files)} files")
\ No newline at end of file
@@ -0,0 +1,87 @@
+"""
+Image transforms run in the image pool's worker processes.
+Each takes and returns a PIL image of the same size and must stay importable at module level.
+"""
+
+from typing import Sequence
+import cv2
+import numpy as np
+from PIL import Image
+
+# OCR enhancement steps, each skippable when a photo doesn't need it (see app.utils.image_quality)
+ENHANCEMENT_STEPS = ("brightness", "contrast", "sharpen")
+
+# OCR enhancement factors: brightness +20%, contrast +30%, sharpness x1.5, then a 150% unsharp mask
+BRIGHTNESS = 1.2
+CONTRAST = 1.3
+SHARPNESS = 1.5
+UNSHARP_THRESHOLD = 3
+
+# Pillow's luma weights in 16-bit fixed point, for the mean the contrast step pivots on
+LUMA = np.array([[19595, 38470, 7471]], np.float32) / 65536
+
+# Pillow's SMOOTH filter, the degenerate image Sharpness extrapolates away from
+SMOOTH = np.array([[1, 1, 1], [1, 5, 1], [1, 1, 1]], np.float32) / 13
+
+# Pillow's GaussianBlur(radius=1) is three box passes of radius 0.25 each way. Its fixed-point weights,
+# 2796202 and 11184811 / 2**24 rather than exactly 1/6 and 2/3, decide a sum landing on an exact half:
+# up when the centre is at least twice its neighbours, otherwise down. Skewing the weights by BOX_TIE
+# gives cv2's float filter the same sign at a half while moving no other sum across a rounding boundary
+BOX_TIE = 5e-5
+BOX = np.array([[1 / 6 - 4 * BOX_TIE, 4 / 6 + 2 * BOX_TIE, 1 / 6 - 4 * BOX_TIE]], np.float32)
+BOX_PASSES = 3
+
+def to_rgb(image: Image.Image) -> Image.Image:
+    """Decode the image as RGB"""
+    return image.convert('RGB') if image.mode != 'RGB' else image
+
+def enhance_for_ocr(image: Image.Image, steps: Sequence[str] = ENHANCEMENT_STEPS) -> Image.Image:
+    """Brighten, raise contrast and sharpen, then unsharp mask for text clarity - or the given subset.
+
+    Reproduces Pillow's Brightness(1.2) -> Contrast(1.3) -> Sharpness(1.5) -> UnsharpMask(1, 150, 3)
+    chain, rounding included, on one uint8 array worked in place: two lookup tables cover brightness
+    and contrast, and sharpen, blur and unsharp mask share one extra buffer and a difference buffer
+    rather than each step allocating full-size RGBX images.
+    """
+    levels = np.arange(256, dtype=np.float64)
+
+    # Brightness and contrast blend towards a flat image and truncate - per level, so a table does it.
+    # The first table is also the one copy out of the image, into the array everything else works in
+    brightened = np.minimum(np.floor(levels * BRIGHTNESS), 255) if "brightness" in steps else levels
+    pixels = cv2.LUT(np.asarray(to_rgb(image)), brightened.astype(np.uint8))
+    if "contrast" in steps:
+        mean = int(cv2.mean(cv2.transform(pixels, LUMA))[0] + 0.5)
+        contrasted = np.clip(np.floor(mean + CONTRAST * (levels - mean)), 0, 255)
+        cv2.LUT(pixels, contrasted.astype(np.uint8), dst=pixels)
+    if "sharpen" in steps:
+        _sharpen(pixels)
+    return Image.fromarray(pixels)
+
+def _sharpen(pixels: np.ndarray) -> None:
+    """Sharpness(1.5) then UnsharpMask(1, 150, 3), in place"""
+    # Sharpness: extrapolate away from the smoothed image, which keeps the original border pixels.
+    # The blend is always a multiple of 0.5, so -0.25 turns rounding into Pillow's truncation
+    work = cv2.filter2D(pixels, -1, SMOOTH)
+    work[0], work[-1], work[:, 0], work[:, -1] = pixels[0], pixels[-1], pixels[:, 0], pixels[:, -1]
+    cv2.addWeighted(pixels, SHARPNESS, work, 1 - SHARPNESS, -0.25, dst=pixels)
+
+    # Unsharp mask against the blur, now in the work buffer: horizontal passes first, as Pillow does
+    cv2.filter2D(pixels, -1, BOX, dst=work, delta=BOX_TIE, borderType=cv2.BORDER_REPLICATE)
+    for kernel, passes in ((BOX, BOX_PASSES - 1), (BOX.T, BOX_PASSES)):
+        for _ in range(passes):
+            cv2.filter2D(work, -1, kernel, dst=work, delta=BOX_TIE, borderType=cv2.BORDER_REPLICATE)
+
+    # Pixels more than the threshold above the blur move up by 1.5x the difference, then those below
+    # move down. Pixels already raised are further above the blur, so the second pass never sees them
+    diff = cv2.subtract(pixels, work)
+    _unsharp(pixels, diff, cv2.add)
+    cv2.subtract(work, pixels, dst=diff)
+    _unsharp(pixels, diff, cv2.subtract)
+
+def _unsharp(pixels: np.ndarray, diff: np.ndarray, apply) -> None:
+    """Move pixels by 1.5x their one-sided difference from the blur (truncated, as Pillow's integer
+    percent does) where it exceeds the threshold; the saturating uint8 add or subtract clips"""
+    cv2.threshold(diff, UNSHARP_THRESHOLD, 255, cv2.THRESH_TOZERO, dst=diff)
+    apply(pixels, diff, dst=pixels)
+    np.right_shift(diff, 1, out=diff)
+    apply(pixels, diff, dst=pixels)
@@ -0,0 +1,70 @@
+"""
+Cheap image statistics from a downsampled thumbnail, used to decide how much preprocessing a photo needs
+and whether it is worth sending to Gemini at all.
+Measuring on a fixed-size thumbnail keeps the numbers comparable across camera resolutions.
+"""
+
+from typing import Dict, List
+import cv2
+import numpy as np
+from PIL import Image
+from app.config import settings
+
+# Longest side of the thumbnail the statistics are measured on
+THUMBNAIL_SIZE = 512
+
+# Luminance from which a pixel counts as blown out
+CLIPPED_LEVEL = 250
+
+# Clipped fraction of the frame beyond which it's taken for a white background rather than glare
+GLARE_BACKGROUND = 0.5
+
+def measure(image_path: str) -> Dict[str, float]:
+    """Luminance statistics of a thumbnail: mean, the 1st and 99th percentiles (so sparse text on a light
+    card still counts) and the spread between them, the 0.1th percentile (the darkest ink), the fraction
+    of clipped highlights, and Laplacian variance as a measure of sharpness"""
+    with Image.open(image_path) as image:
+        # JPEGs decode straight to a reduced-size greyscale image, skipping most of the work
+        image.draft('L', (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        thumbnail = image.convert('L')
+    thumbnail.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    gray = np.asarray(thumbnail)
+
+    histogram = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+    darkest, shadows, highlights = np.searchsorted(np.cumsum(histogram) / gray.size, [0.001, 0.01, 0.99])
+    return {
+        "luminance": round(float(gray.mean()), 1),
+        "shadows": int(shadows),
+        "highlights": int(highlights),
+        "spread": int(highlights - shadows),
+        "darkest": int(darkest),
+        "clipped": round(float(histogram[CLIPPED_LEVEL:].sum()) / gray.size, 4),
+        "sharpness": round(float(cv2.Laplacian(gray, cv2.CV_64F).var()), 1)
+    }
+
+def plan_enhancement(stats: Dict[str, float]) -> List[str]:
+    """The enhancement steps (see app.utils.image_ops) a photo with these statistics needs"""
+    steps = []
+    if stats["luminance"] < settings.OCR_DARK_LUMINANCE:
+        steps.append("brightness")
+    if stats["spread"] < settings.OCR_LOW_CONTRAST_SPREAD:
+        steps.append("contrast")
+    if stats["sharpness"] < settings.OCR_SHARP_LAPLACIAN_VARIANCE:
+        steps.append("sharpen")
+    return steps
+
+def assess(stats: Dict[str, float]) -> List[str]:
+    """Reasons a photo with these statistics is likely unreadable - empty if it looks usable"""
+    issues = []
+    if stats["sharpness"] < settings.QUALITY_MIN_SHARPNESS:
+        issues.append("blurry")
+    if stats["highlights"] < settings.QUALITY_MIN_HIGHLIGHTS:
+        # Even the brightest part of the frame - the card - is close to black
+        issues.append("underexposed")
+    elif stats["darkest"] > settings.QUALITY_MAX_DARKEST:
+        # No ink left: the text has washed out with the card
+        issues.append("overexposed")
+    # A blown-out patch on the card; once most of the frame is clipped it's white paper or background
+    if settings.QUALITY_MAX_GLARE <= stats["clipped"] < GLARE_BACKGROUND:
+        issues.append("glare")
+    return issues
@@ -0,0 +1,43 @@
+"""
+Pipeline Worker
+Runs the processing pipeline outside the API. With PIPELINE_MODE=enqueue the API only records
+uploaded files in the job store and reports status; each worker claims files from there, runs
+them through the pipeline stages and publishes progress through the shared state backend.
+Workers run on the API's host: the job store and the uploaded files are in its TEMP_STORAGE_PATH.
+
+Usage: python -m app.worker
+"""
+
+import asyncio
+import signal
+from app.config import settings
+from app.core.image_pool import image_pool
+from app.core.state_backend import state_backend
+from app.services.pipeline_engine import pipeline_engine
+from app.utils.logger import app_logger
+
+async def run() -> None:
+    if settings.STATE_BACKEND.lower() == "memory":
+        raise SystemExit("The pipeline worker needs a shared STATE_BACKEND (sqlite or redis) so the API can see its results")
+
+    await state_backend.start()
+    worker = asyncio.create_task(pipeline_engine.run_worker())
+    app_logger.info(f"[WORKER] Started {pipeline_engine.owner}, polling the job store every {settings.WORKER_POLL_SECONDS}s")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await stop.wait()
+    app_logger.info("[WORKER] Stopping - unfinished files go back to the queue")
+    worker.cancel()
+    await pipeline_engine.stop()
+    image_pool.shutdown()
+    await state_backend.stop()
+
+def main():
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Enhancement Kernel Benchmark
+Checks the fused OpenCV enhancement against the Pillow chain it replaced, pixel for pixel, then
+reports throughput and peak memory of each on synthetic card photos
+
+Usage: python benchmark_enhance.py [--images 4] [--megapixels 12]
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+import numpy as np
+from PIL import Image, ImageEnhance, ImageFilter
+from app.utils.image_ops import enhance_for_ocr
+from benchmark_image_pool import make_photo
+
+def enhance_with_pil(image: Image.Image) -> Image.Image:
+    """The chain enhance_for_ocr used to run, one full-size image per step"""
+    image = image.convert('RGB') if image.mode != 'RGB' else image
+    image = ImageEnhance.Brightness(image).enhance(1.2)
+    image = ImageEnhance.Contrast(image).enhance(1.3)
+    image = ImageEnhance.Sharpness(image).enhance(1.5)
+    return image.filter(ImageFilter.UnsharpMask(radius=1, percent=150, threshold=3))
+
+KERNELS = {"pillow chain": enhance_with_pil, "fused kernel": enhance_for_ocr}
+
+def check_equivalence(paths) -> None:
+    """Identical output on the photos, on noise (which lands on every rounding tie) and on greyscale"""
+    rng = np.random.default_rng(0)
+    images = [Image.open(path) for path in paths]
+    images.append(Image.fromarray(rng.integers(0, 256, (600, 800, 3), dtype=np.uint8)))
+    images.append(Image.fromarray(np.clip(rng.normal(40, 30, (600, 800, 3)), 0, 255).astype(np.uint8)))
+    images.append(Image.open(paths[0]).convert('L'))
+
+    for image in images:
+        expected = np.asarray(enhance_with_pil(image))
+        actual = np.asarray(enhance_for_ocr(image))
+        differing = np.count_nonzero(expected != actual)
+        assert differing == 0, f"{differing} values differ on a {image.mode} {image.width}x{image.height} image"
+    print(f"Equivalence: identical output on {len(images)} images")
+
+def peak_rss_kb() -> int:
+    with open("/proc/self/status") as status:
+        return next(int(line.split()[1]) for line in status if line.startswith("VmHWM"))
+
+def measure(name: str, path: str) -> int:
+    """Child process: extra peak memory (KB) of one enhancement over the decoded image"""
+    image = Image.open(path)
+    image.load()
+    # Reset the high-water mark so decoding the photo isn't counted
+    with open("/proc/self/clear_refs", "w") as clear_refs:
+        clear_refs.write("5")
+    before = peak_rss_kb()
+    KERNELS[name](image)
+    return peak_rss_kb() - before
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fused enhancement kernel against the Pillow chain")
+    parser.add_argument("--images", type=int, default=4)
+    parser.add_argument("--megapixels", type=float, default=12)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(args.images):
+            path = os.path.join(tmp, f"card_{i}.jpg")
+            make_photo(path, args.megapixels, i)
+            paths.append(path)
+        check_equivalence(paths)
+
+        images = [Image.open(path) for path in paths]
+        for image in images:
+            image.load()
+        pixels = images[0].width * images[0].height
+        print(f"Images: {args.images} x {args.megapixels}MP ({pixels * 3 / 2**20:.0f}MB of RGB each)")
+
+        # A fresh process per measurement, so one kernel's freed memory can't hide the other's peak
+        context = multiprocessing.get_context("spawn")
+        for name, kernel in KERNELS.items():
+            start = time.perf_counter()
+            for image in images:
+                kernel(image)
+            elapsed = time.perf_counter() - start
+            with context.Pool(1) as pool:
+                extra_kb = pool.apply(measure, (name, paths[0]))
+            print(f"{name:14s} {elapsed:7.2f}s  {args.images / elapsed:6.2f} images/s  "
+                  f"peak memory +{extra_kb / 1024:6.0f}MB ({extra_kb * 1024 / pixels:4.1f} bytes/pixel)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Image Pool Benchmark
+Enhances synthetic card photos inline on the event loop and through the image pool, reporting
+wall time, throughput and the longest the event loop went without running a tick. Then, with
+every worker busy at once, splits each pool call into the worker's own time and the time its
+encoded result spends crossing the pool's result pipe back to the API process, and measures how
+fast that pipe can carry blobs at all - the number of workers it would take to saturate it.
+
+Usage: python benchmark_image_pool.py [--images 8] [--megapixels 12] [--workers 0]
+"""
+
+import argparse
+import asyncio
+import io
+import multiprocessing
+import os
+import tempfile
+import time
+import numpy as np
+from PIL import Image, ImageDraw
+from app.core.image_pool import ImagePool, _run_transform
+from app.utils.image_ops import enhance_for_ocr
+
+def make_photo(path: str, megapixels: float, seed: int) -> None:
+    """A 3:2 photo of a card-like scene: shaded background, a light card and lines of dark text"""
+    width = int((megapixels * 1_000_000 * 1.5) ** 0.5)
+    height = int(width / 1.5)
+    rng = np.random.default_rng(seed)
+    shade = np.linspace(60, 140, width, dtype=np.float32)[None, :, None]
+    pixels = (shade + rng.normal(0, 6, (height, width, 3))).clip(0, 255).astype(np.uint8)
+
+    image = Image.fromarray(pixels)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([width // 6, height // 5, width * 5 // 6, height * 4 // 5], fill=(225, 222, 215))
+    for line in range(12):
+        y = height // 4 + line * height // 22
+        draw.rectangle([width // 5, y, width // 5 + int(rng.integers(width // 6, width // 2)), y + height // 60], fill=(30, 30, 35))
+    image.save(path, quality=92)
+
+class LoopLag:
+    """Records the longest gap between event loop ticks while running"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.max_lag = 0.0
+        self._task = None
+
+    async def _tick(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.max_lag = max(self.max_lag, time.perf_counter() - started - self.interval)
+
+    def __enter__(self):
+        self._task = asyncio.get_running_loop().create_task(self._tick())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+def encode_inline(path: str) -> bytes:
+    """What the Gemini service did before the pool: enhance, then the client library's WebP encode"""
+    encoded = io.BytesIO()
+    enhance_for_ocr(Image.open(path)).save(encoded, format="webp", lossless=True)
+    return encoded.getvalue()
+
+async def run_inline(paths):
+    start = time.perf_counter()
+    with LoopLag() as lag:
+        for path in paths:
+            # Let the lag ticker run between images, as other requests would
+            await asyncio.sleep(0.01)
+            encode_inline(path)
+    return time.perf_counter() - start, lag.max_lag
+
+async def run_pool(pool: ImagePool, paths):
+    # First call pays for spawning the workers; keep it out of the timing
+    await asyncio.gather(*(pool.blob(enhance_for_ocr, paths[0]) for _ in range(pool.workers)))
+    start = time.perf_counter()
+    with LoopLag() as lag:
+        await asyncio.gather(*(pool.blob(enhance_for_ocr, path) for path in paths))
+    return time.perf_counter() - start, lag.max_lag
+
+def timed_transform(path: str):
+    """Worker side of the pool call, stamped: (blob, seconds in the worker, CPU seconds it used,
+    wall clock when it returned). On a host with fewer cores than workers the wall time stretches,
+    the CPU time is what a worker takes with a core to itself"""
+    started, cpu_started = time.perf_counter(), time.process_time()
+    data = _run_transform(enhance_for_ocr, path)
+    return data, time.perf_counter() - started, time.process_time() - cpu_started, time.time()
+
+async def run_transfer(pool: ImagePool, paths):
+    """Every worker busy at once; per call, the worker's time and the result's trip back through the pipe"""
+    loop = asyncio.get_running_loop()
+
+    async def call(path):
+        data, worker_seconds, cpu_seconds, returned_at = await loop.run_in_executor(pool._pool(), timed_transform, path)
+        return len(data), worker_seconds, cpu_seconds, time.time() - returned_at
+
+    start = time.perf_counter()
+    calls = await asyncio.gather(*(call(path) for path in paths))
+    return time.perf_counter() - start, calls
+
+def pipe_reader(conn, rounds: int) -> None:
+    for _ in range(rounds):
+        conn.recv_bytes()
+
+def pipe_ceiling(blob_bytes: int, rounds: int = 20) -> float:
+    """Bytes per second one process can receive blobs of this size through a pipe"""
+    receiving, sending = multiprocessing.Pipe(duplex=False)
+    reader = multiprocessing.get_context("spawn").Process(target=pipe_reader, args=(receiving, rounds))
+    reader.start()
+    blob = os.urandom(blob_bytes)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        sending.send_bytes(blob)
+    reader.join()
+    return blob_bytes * rounds / (time.perf_counter() - start)
+
+async def main_async(args) -> None:
+    workers = args.workers or os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(args.images):
+            path = os.path.join(tmp, f"card_{i}.jpg")
+            make_photo(path, args.megapixels, i)
+            paths.append(path)
+
+        # Same pixels either way
+        pool = ImagePool(workers)
+        expected = np.asarray(enhance_for_ocr(Image.open(paths[0])))
+        blob = await pool.blob(enhance_for_ocr, paths[0])
+        actual = np.asarray(Image.open(io.BytesIO(blob["data"])))
+        assert np.array_equal(expected, actual), "pool output differs from inline output"
+
+        print(f"Images: {args.images} x {args.megapixels}MP, pool workers: {workers} ({os.cpu_count()} cores)")
+        results = [
+            ("inline enhance + encode", await run_inline(paths)),
+            ("pool blob (enhance + encode)", await run_pool(pool, paths)),
+        ]
+        transfer_elapsed, calls = await run_transfer(pool, paths)
+        pool.shutdown()
+
+    for name, (elapsed, lag) in results:
+        print(f"{name:34s} {elapsed:7.2f}s  {args.images / elapsed:6.2f} images/s  longest loop stall {lag * 1000:8.1f}ms")
+
+    blob_bytes = sum(call[0] for call in calls) / len(calls)
+    worker_seconds = sum(call[1] for call in calls) / len(calls)
+    cpu_seconds = sum(call[2] for call in calls) / len(calls)
+    transfer_seconds = sum(call[3] for call in calls) / len(calls)
+    ceiling = pipe_ceiling(int(blob_bytes))
+    # With a core each, a worker turns out one blob per cpu_seconds; the pipe saturates when they outpace it together
+    worker_rate = blob_bytes / cpu_seconds
+    print(f"\nAll {workers} workers busy: {args.images} images in {transfer_elapsed:.2f}s")
+    print(f"  blob size {blob_bytes / 1e6:.1f}MB, worker time {worker_seconds * 1000:.0f}ms ({cpu_seconds * 1000:.0f}ms CPU), "
+          f"result transfer {transfer_seconds * 1000:.1f}ms ({transfer_seconds / (worker_seconds + transfer_seconds):.1%} of each call)")
+    print(f"  pipe carries {ceiling / 1e6:.0f}MB/s; {workers} workers with a core each fill it at {workers * worker_rate / 1e6:.0f}MB/s, "
+          f"it would take {ceiling / worker_rate:.0f} to saturate it")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark image transforms inline vs in the image pool")
+    parser.add_argument("--images", type=int, default=8)
+    parser.add_argument("--megapixels", type=float, default=12)
+    parser.add_argument("--workers", type=int, default=0, help="0 = one per core")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+QueueManager Benchmark
+Drives concurrent batches through the same queue calls the pipeline makes per file
+and reports wall time and throughput
+
+Usage: python benchmark_queue_manager.py [--batches 10] [--files 300]
+"""
+
+import argparse
+import asyncio
+import time
+from app.services.queue_manager import QueueManager
+
+# Status changes the pipeline records for each file, in order
+FILE_STAGES = ["processing", "validating", "extracting", "processing_data"]
+
+async def run_batch(manager: QueueManager, batch_id: str, files: int, timings: list) -> None:
+    """Upload then process every file in one batch, the way the pipeline engine does"""
+    start = time.perf_counter()
+    await manager.initialize_batch(batch_id, [])
+
+    file_ids = [f"{batch_id}_f{i}" for i in range(files)]
+    for file_id in file_ids:
+        await manager.add_file(batch_id, {"file_id": file_id, "filename": f"{file_id}.jpg", "file_path": f"/tmp/{file_id}.jpg"})
+
+    record = {"name": "A", "phone": "1", "email": "a@b.c", "company": "C", "designation": "D", "address": "X"}
+    for file_id in file_ids:
+        for status in FILE_STAGES:
+            await manager.update_input_status(batch_id, file_id, status)
+            await manager.get_batch_summary(batch_id)
+        await manager.set_file_fields(batch_id, file_id, validation={"is_business_card": True}, extracted_records=[record])
+        await manager.add_to_output_queue(batch_id, file_id, record, 0.1)
+        await manager.get_file_pair(batch_id, file_id)
+        await manager.get_batch_summary(batch_id)
+
+    timings.append(time.perf_counter() - start)
+
+async def run_batches(manager: QueueManager, batches: int, files: int, timings: list) -> None:
+    await asyncio.gather(*(run_batch(manager, f"batch_{i}", files, timings) for i in range(batches)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark QueueManager under concurrent batches")
+    parser.add_argument("--batches", type=int, default=10)
+    parser.add_argument("--files", type=int, default=300)
+    args = parser.parse_args()
+
+    manager = QueueManager()
+    timings = []
+
+    start = time.perf_counter()
+    asyncio.run(run_batches(manager, args.batches, args.files, timings))
+    elapsed = time.perf_counter() - start
+
+    # add_file + 4 x (status + summary) + fields + output + pair + summary per file
+    ops = args.batches * args.files * (1 + len(FILE_STAGES) * 2 + 4)
+    print(f"Batches: {args.batches} x {args.files} files")
+    print(f"Wall time: {elapsed:.3f}s")
+    print(f"Slowest batch: {max(timings):.3f}s, fastest: {min(timings):.3f}s")
+    print(f"Throughput: {ops / elapsed:,.0f} queue ops/s")
+
+    for i in range(args.batches):
+        summary = asyncio.run(manager.get_batch_summary(f"batch_{i}"))
+        assert summary["completed"] == args.files, summary
+        assert len(asyncio.run(manager.get_all_outputs(f"batch_{i}"))) == args.files
+
+if __name__ == "__main__":
+    main()